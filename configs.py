@@ -14,11 +14,35 @@ class Settings(BaseSettings):
 
     REDIS_URL: str = ""
     REDIS_DB: int = 0
+    REDIS_CLUSTER: bool = False  # Whether REDIS_URL is a node of Redis Cluster. Only for project data.
     CACHE_REDIS_DB: int = 14
+    # Max connections per process of each role. A command waits up to REDIS_POOL_TIMEOUT for a free one.
+    REDIS_MAX_CONNECTIONS: int = 50
+    CACHE_REDIS_MAX_CONNECTIONS: int = 20
+    PUBSUB_REDIS_MAX_CONNECTIONS: int = 10
+    REDIS_POOL_TIMEOUT: float = 5  # seconds
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # seconds. Idle connections are checked by PING before use.
 
     S3_BUCKET: str = ""
+    S3_ENDPOINT_URL: str = ""  # Local stand-in such as MinIO or moto server. Empty for AWS.
+    S3_MAX_POOL_CONNECTIONS: int = 32
+    S3_MAX_ATTEMPTS: int = 5  # Including the first attempt
+    S3_MULTIPART_THRESHOLD: int = 16_777_216  # 16MB in bytes
+    S3_MULTIPART_CHUNKSIZE: int = 16_777_216  # 16MB in bytes
+    S3_MAX_CONCURRENCY: int = 4
+
+    ARCHIVE_CHUNK_SIZE: int = 1_048_576  # 1MB in bytes. Download chunk size of zip archives
+    ARCHIVE_SPOOL_MAX_BYTES: int = 8_388_608  # 8MB in bytes. Larger archives are spooled to disk.
+    ARCHIVE_WORKERS: int = 4  # Threads decompressing members in parallel. 1 to disable.
+    ARCHIVE_PARALLEL_THRESHOLD: int = 262_144  # 256KB. Min compressed size of a member to decompress in parallel
+    ARCHIVE_BATCH_BYTES: int = 4_194_304  # 4MB. Redis writes are sent in batches of this size
+    TEMPLATE_CACHE_DIR: str = ""  # Defaults to <tmp>/ide-template-cache
+    TEMPLATE_CACHE_MAX_BYTES: int = 2_147_483_648  # 2GB in bytes
     PROJECT_SIZE_LIMIT: int = 536_870_912  # 512MB in bytes
 
+    ACTIVITY_FLUSH_INTERVAL: int = 10  # seconds
+    SIZE_RECONCILE_INTERVAL: int = 0  # seconds. Recompute total file sizes periodically. 0 to disable.
+
     TEST_CLUSTER: str = ""
     TEST_TASK_TYPE: str = ""
     TEST_TASKDEF: str = ""
@@ -1,17 +1,60 @@
+import functools
+import string
 from typing import Any
 
+_formatter = string.Formatter()
+
+
+def partial_format(template: str, **kwargs) -> str:
+    """Format only the given fields of ``template``, and keep the others as fields.
+    Literal braces, such as Redis hash tags, stay escaped, so the result is still a template.
+
+    >>> partial_format("{{crs:{course_id}:{ptc_id}}}", course_id=1)
+    '{{crs:1:{ptc_id}}}'
+    """
+
+    parts = []
+    for literal, field, spec, conversion in _formatter.parse(template):
+        parts.append(literal.replace("{", "{{").replace("}", "}}"))
+        if field is None:
+            continue
+        if field in kwargs:
+            parts.append(format(kwargs[field], spec or "").replace("{", "{{").replace("}", "}}"))
+        else:
+            parts.append("{" + field + (f"!{conversion}" if conversion else "") + (f":{spec}" if spec else "") + "}")
+    return "".join(parts)
+
+
+@functools.lru_cache(maxsize=4096)
+def resolve(template: str) -> str:
+    """Return the key itself if no field is left in ``template``. Otherwise, return the template."""
+
+    if any(field is not None for _, field, _, _ in _formatter.parse(template)):
+        return template
+    return template.format()
+
 
 class KeyBase:
+    """Keys are the attributes named ``KEY_*``, returned with the prefix.
+    Keys named ``KEY_USER_*`` have ``USER_PREFIX`` instead, if it is set.
+
+    Prefixes are templates of ``str.format``. A key still having fields, such as ``{ptc_id}``,
+    is returned as a template to be formatted by the caller. Otherwise, it is returned as is.
+    """
+
     PREFIX = ""
+    USER_PREFIX = ""
 
     def __getattribute__(self, name: str) -> Any:
         value = super().__getattribute__(name)
 
         if name.startswith("KEY_"):
-            return self.PREFIX + value
+            prefix = self.USER_PREFIX if self.USER_PREFIX and name.startswith("KEY_USER_") else self.PREFIX
+            return resolve(prefix + value)
         return value
 
 
 class LessonKeyBase(KeyBase):
     def __init__(self, course_id: int, lesson_id: int):
-        self.PREFIX = self.PREFIX.format(course_id=course_id, lesson_id=lesson_id)
+        self.PREFIX = partial_format(self.PREFIX, course_id=course_id, lesson_id=lesson_id)
+        self.USER_PREFIX = partial_format(self.USER_PREFIX, course_id=course_id, lesson_id=lesson_id)
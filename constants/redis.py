@@ -1,31 +1,77 @@
 from constants.base import LessonKeyBase
 
 SIZE_LIMIT = 134_217_728  # bytes == 128 MB
+ROSTER_TTL = 6 * 3600  # seconds. Roster is rebuilt from DB after expiration.
+FEEDBACK_TTL = 6 * 3600  # seconds. Feedback board is rebuilt from DB after expiration.
+FEEDBACK_VIEW_TTL = 300  # seconds. Feedback list cached per viewer
+
+# S3 에 존재하지 않는 object. 잠시 동안 같은 object 를 다시 요청하지 않는다.
+S3_MISSING_KEY = "s3:missing:{object_key}"  # STRING: 1
+S3_MISSING_TTL = 30  # seconds
+
+# 유저별 최근 활동 시각. 주기적으로 DB 에 반영된 후 비워진다.
+ACTIVITY_KEY = "activity:recent"  # ZSET: course_id:lesson_id:ptc_id: timestamp
+ACTIVITY_FLUSH_CHUNK = 500  # activities written into DB by an UPDATE
 
 
 class RedisKey(LessonKeyBase):
     """
-    Some keys are encoded by `server.utils.etc.text_encode`,
-    and some of them are also hashed by `server.utils.etc.get_hashed` after encoded.
+    File names are stored as plain UTF-8 strings by `server.utils.etc.key_encode`,
+    so that their lexicographic order is the same as the order of the paths.
+    Some keys are also hashed by `server.utils.etc.get_hashed` after encoded.
+
+    Keys have a hash tag, the part in braces, so that Redis Cluster stores keys of the same tag
+    in the same slot: lesson keys per lesson, and user keys (``KEY_USER_*``) per participant.
+    Thus, a script or a transaction should only use keys of one lesson, or of one participant.
     """
 
-    PREFIX = "crs:{course_id}:{lesson_id}:"
+    PREFIX = "{{crs:{course_id}:{lesson_id}}}:"
+    USER_PREFIX = "{{crs:{course_id}:{lesson_id}:{ptc_id}}}:"
 
     # 템플릿 파일명 리스트
-    KEY_TEMPLATE_FILE_LIST = "template:files"  # ZSET: enc(filename): size
+    KEY_TEMPLATE_FILE_LIST = "template:files"  # ZSET: filename: size
     # 템플릿 파일 내용
-    KEY_TEMPLATE_FILE_CONTENT = "template:files:{hash}"  # STRING(binary): hash(enc(filename)): content
+    KEY_TEMPLATE_FILE_CONTENT = "template:files:{hash}"  # STRING(binary): hash(filename): content
+    # 템플릿 파일 타입
+    KEY_TEMPLATE_FILE_TYPE = "template:files:types"  # HASH: hash(filename): file type
+
+    # 수업 참여자 명단
+    KEY_LESSON_ROSTER = "roster"  # HASH: ptc_id: member info (json)
+    # 수업 내 프로젝트 접근 권한
+    KEY_LESSON_ROSTER_PERM = "roster:perm"  # HASH: project_id:viewer_id: permission
+
+    # 수업 피드백 board. 피드백 스레드별 문서와 열람 가능한 유저별 피드백 목록
+    KEY_LESSON_FEEDBACK_BUILT = "feedback:built"  # STRING: generation of the board
+    KEY_LESSON_FEEDBACK = "feedback"  # HASH: feedback_id: thread (json)
+    KEY_LESSON_FEEDBACK_COMMENTS = "feedback:{feedback_id}:comments"  # HASH: comment_id: comment (json)
+    KEY_LESSON_FEEDBACK_VIEWER = "feedback:viewer:{ptc_id}"  # SET: feedback_id
+    KEY_LESSON_FEEDBACK_FILE = "feedback:file:{ptc_id}:{hash}"  # SET: feedback_id. hash(filename) of owner's file
+    # 유저별로 캐시된 피드백 목록과, 각 피드백 스레드를 포함하는 목록들
+    KEY_LESSON_FEEDBACK_VIEW = "feedback:view:{ptc_id}:{scope}"  # STRING: generation and threads (json)
+    KEY_LESSON_FEEDBACK_DEPS = "feedback:{feedback_id}:views"  # SET: view keys
+    KEY_LESSON_FEEDBACK_SEQ = "feedback:seq"  # STRING (number). Increased whenever views are invalidated
 
     # 유저별 총 파일 사이즈
-    KEY_USER_CUR_SIZE = "{ptc_id}:size"  # STRING (number)
+    KEY_USER_CUR_SIZE = "size"  # STRING (number)
     # 유저별 이전 커서 위치
-    KEY_USER_PREV_CURSOR = "{ptc_id}:csr:last"  # HASH: target_user_id.filename: cursor_info
+    KEY_USER_PREV_CURSOR = "csr:last"  # HASH: target_user_id.filename: cursor_info
 
     # 유저별 파일명 리스트
-    KEY_USER_FILE_LIST = "{ptc_id}:files"  # ZSET: enc(filename): size
+    KEY_USER_FILE_LIST = "files"  # ZSET: filename: size
+    # 유저별 파일명 인덱스. 사전순 range 조회(ZRANGEBYLEX)로 디렉터리 하위 파일을 찾는 데 사용
+    KEY_USER_DIR_INDEX = "files:index"  # ZSET: filename: 0
+    # 유저별 파일 트리 revision. 파일 리스트가 변경될 때마다 증가
+    KEY_USER_TREE_REV = "files:rev"  # STRING (number)
+    # 유저별 파일 revision. 파일 내용이 변경될 때마다 증가
+    KEY_USER_FILE_REV = "files:revs"  # HASH: hash(filename): revision
+    # 유저별 파일 타입. 바이너리 파일은 디코딩하지 않고 읽는다.
+    KEY_USER_FILE_TYPE = "files:types"  # HASH: hash(filename): file type
     # 유저별 파일 내용
-    KEY_USER_FILE_CONTENT = "{ptc_id}:files:{hash}"  # STRING(binary): hash(enc(filename)): content
+    KEY_USER_FILE_CONTENT = "files:{hash}"  # STRING(binary): hash(filename): content
 
     DUMMY_DIR_MARK = "_"  # Dummy file to keep track of empty directory
     DUMMY_DIR_MARK_CONTENT = " "  # Dummy content for dummy file
     NEW_FILE_CONTENT = " "  # Prevent error from being raised due to setting empty string.
+
+    FILE_TYPE_TEXT = "text"  # UTF-8 text
+    FILE_TYPE_BINARY = "binary"
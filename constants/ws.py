@@ -57,7 +57,11 @@ WS_MONITOR_EVENTS = [
     # WSEvent.TIME_SYNC_ACK,
 ]
 
-ROOM_TYPE = "room-{type}"  # session key to store room names to remember what rooms the user enterred.
+DIR_INFO_MAX_CHUNK = 1000  # Max entries per DIR_INFO message when the tree is streamed
+FILE_READ_CHUNK = 1_048_576  # Default bytes per FILE_READ message when the file is read in chunks
+FILE_READ_MAX_CHUNK = 4_194_304  # Max bytes per FILE_READ message
+
+ROOM_TYPE = "room-{type}"  # session key to store rooms ({room: ident}) to remember what rooms the user enterred.
 
 
 class Room:
@@ -0,0 +1,95 @@
+"""Measure time to build a memoize cache key per call.
+
+Compares the previous derivation, which inspected the signature on every call, with the
+precomputed ``KeySpec`` and with an explicit key builder. No Redis connection is made::
+
+    python -m scripts.bench_cache_keys
+    python -m scripts.bench_cache_keys --number 200000
+"""
+
+import argparse
+import hashlib
+import inspect
+import timeit
+
+from server.helpers.cache import Cache
+from server.models.course import PROJ_PERM, Participant, UserProject
+
+
+class _Controller:
+    course_id = 1
+    lesson_id = 2
+
+    def check_permission(self, check_perm, viewer, target_ptc, target_proj):
+        pass
+
+    def ptc_info(self, ptc_id):
+        pass
+
+
+def legacy_cache_key(cache: Cache, f, ignore_args: list, *args, **kwargs) -> str:
+    """Key derivation before ``KeySpec``, kept for comparison"""
+
+    arg_names = [p.name for p in inspect.signature(f).parameters.values()]
+    new_args = []
+    add = []
+    for _arg, _name in zip(args, arg_names):
+        if _name == "self":
+            if cache.instance_attr_names:
+                for name in cache.instance_attr_names:
+                    add.append(f"{getattr(args[0], name, None)}")
+            continue
+
+        if _name not in ignore_args:
+            new_args.append(_arg)
+
+    md5 = hashlib.md5()
+    md5.update(f"{new_args}{kwargs}{add}".encode())
+    return f"cache:{f.__module__}:{f.__qualname__}:{md5.hexdigest()}"
+
+
+def bench(label: str, func, number: int):
+    seconds = min(timeit.repeat(func, number=number, repeat=5))
+    print(f"{label:<40} {seconds / number * 1e6:8.3f} us/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100_000, help="calls per measurement")
+    args = parser.parse_args()
+
+    cache = Cache(instance_attr_names=["course_id", "lesson_id"])
+    ctrl = _Controller()
+    viewer = Participant(id=10, course_id=1, user_id=100)
+    target = Participant(id=20, course_id=1, user_id=200)
+    project = UserProject(id=30, lesson_id=2, participant_id=20)
+
+    cases = {
+        "check_permission": (
+            _Controller.check_permission,
+            (ctrl, PROJ_PERM.READ, viewer, target, project),
+            lambda self, check_perm, viewer, target_ptc, target_proj: (
+                check_perm,
+                viewer.id,
+                target_ptc.id,
+                target_proj.id,
+            ),
+        ),
+        "ptc_info": (_Controller.ptc_info, (ctrl, 20), lambda self, ptc_id: (ptc_id,)),
+    }
+
+    for name, (f, call_args, key) in cases.items():
+        spec = cache.make_key_spec(f)
+        key_spec = cache.make_key_spec(f, key=key)
+
+        print(f"[{name}]")
+        bench("before: signature per call", lambda: legacy_cache_key(cache, f, [], *call_args), args.number)
+        bench("after: precomputed signature", lambda: cache._build_key(spec, *call_args), args.number)
+        bench("after: explicit key builder", lambda: cache._build_key(key_spec, *call_args), args.number)
+
+        # The precomputed derivation must produce the same keys as before.
+        assert cache._build_key(spec, *call_args) == legacy_cache_key(cache, f, [], *call_args)
+
+
+if __name__ == "__main__":
+    main()
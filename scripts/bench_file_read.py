@@ -0,0 +1,108 @@
+"""Measure FILE_READ of a binary-heavy project from Redis.
+
+Compares the previous read, which tried a decoding client first and fell back to a second bytes
+client on ``UnicodeDecodeError``, with ``RedisController.get_file`` and ``get_file_range``, which
+read bytes once and decode only text files by their stored type.
+
+A synthetic project is written under a scratch lesson, and removed at the end::
+
+    python -m scripts.bench_file_read
+    python -m scripts.bench_file_read --files 200 --binary-ratio 0.8 --size 65536
+"""
+
+import argparse
+import os
+import random
+import time
+
+import redis
+
+from configs import settings
+from constants.redis import RedisKey
+from server.controllers.file import RedisController
+from server.helpers.redis_ import r
+from server.utils.etc import get_hashed
+
+# Lesson and participant not used by any course. IDs are never negative.
+SCRATCH_COURSE_ID = 0
+SCRATCH_LESSON_ID = 0
+SCRATCH_PTC_ID = -1
+
+
+def make_project(redis_ctrl: RedisController, files: int, binary_ratio: float, size: int) -> list[str]:
+    """Store a synthetic project, and return its file names."""
+
+    names = []
+    for i in range(files):
+        if random.random() < binary_ratio:
+            name, content = f"assets/{i}.bin", b"\x89PNG\r\n\x1a\n" + os.urandom(size)
+        else:
+            name, content = f"src/{i}.py", ("print('안녕하세요')\n" * (size // 24 + 1))[:size]
+        redis_ctrl.store_file(name, content, ptc_id=SCRATCH_PTC_ID)
+        names.append(name)
+    return names
+
+
+def legacy_get_file(r_text: redis.StrictRedis, r_raw: redis.StrictRedis, file_key: str) -> str | bytes:
+    """Read before file types, kept for comparison"""
+
+    try:
+        return r_text.get(file_key)
+    except UnicodeDecodeError:
+        return r_raw.get(file_key)
+
+
+def bench(label: str, func, names: list[str], repeat: int):
+    best = min(_timed(func, names) for _ in range(repeat))
+    print(f"{label:<44} {best * 1e3:9.2f} ms / {len(names)} files")
+
+
+def _timed(func, names: list[str]) -> float:
+    start = time.perf_counter()
+    for name in names:
+        func(name)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=100, help="number of files")
+    parser.add_argument("--binary-ratio", type=float, default=0.8, help="ratio of binary files")
+    parser.add_argument("--size", type=int, default=32 * 1024, help="bytes per file")
+    parser.add_argument("--repeat", type=int, default=5, help="measurements, the best is printed")
+    args = parser.parse_args()
+
+    redis_key = RedisKey(SCRATCH_COURSE_ID, SCRATCH_LESSON_ID)
+    redis_ctrl = RedisController(redis_key=redis_key, r_=r)
+    r_text = redis.StrictRedis.from_url(settings.REDIS_URL, db=settings.REDIS_DB, decode_responses=True)
+    r_raw = redis.StrictRedis.from_url(settings.REDIS_URL, db=settings.REDIS_DB)
+
+    names = make_project(redis_ctrl, args.files, args.binary_ratio, args.size)
+    file_key = lambda name: redis_key.KEY_USER_FILE_CONTENT.format(ptc_id=SCRATCH_PTC_ID, hash=get_hashed(name))
+
+    try:
+        print(f"[{args.files} files, {args.binary_ratio:.0%} binary, {args.size} bytes each]")
+        bench(
+            "before: decode, then bytes client on failure",
+            lambda name: legacy_get_file(r_text, r_raw, file_key(name)),
+            names,
+            args.repeat,
+        )
+        bench("after: get_file", lambda name: redis_ctrl.get_file(name, SCRATCH_PTC_ID), names, args.repeat)
+        bench(
+            "after: get_file_range (whole file)",
+            lambda name: redis_ctrl.get_file_range(name, 0, args.size + 8, ptc_id=SCRATCH_PTC_ID),
+            names,
+            args.repeat,
+        )
+    finally:
+        pipe = r.pipeline(transaction=False)
+        for name in names:
+            pipe.delete(file_key(name))
+        pipe.delete(redis_key.KEY_USER_FILE_TYPE.format(ptc_id=SCRATCH_PTC_ID))
+        pipe.delete(redis_key.KEY_USER_FILE_REV.format(ptc_id=SCRATCH_PTC_ID))
+        pipe.execute()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Migrate file names stored in Redis from ``text_encode`` to ``key_encode``.
+
+File lists (``*:files``) used to store base64 encoded names, and file contents were stored under
+the hash of the encoded name. This rewrites every file list with plain names, moves the contents
+to the hash of the new name, and drops directory indexes so that they are rebuilt on next access.
+
+Run this before deploying the server that reads plain names::
+
+    python -m scripts.migrate_file_keys --dry-run
+    python -m scripts.migrate_file_keys
+"""
+
+import argparse
+
+import redis
+
+from configs import settings
+from server.utils.etc import get_hashed, key_encode, text_decode
+
+MIGRATED_KEY = "migrate:file-keys"  # SET: list keys already migrated
+
+
+def migrate_list(r: redis.StrictRedis, list_key: str, dry_run: bool = False) -> int:
+    """Migrate a file list and its contents.
+
+    Args:
+        r (redis.StrictRedis): Redis client
+        list_key (str): key of the file list, such as ``crs:1:2:3:files``
+        dry_run (bool, optional): only print what would be done. Defaults to False.
+
+    Returns:
+        int: the number of migrated file names
+    """
+
+    members = list(r.zscan_iter(list_key, score_cast_func=int))
+    if not members:
+        return 0
+
+    pipe = r.pipeline(transaction=True)
+    new_members = {}
+    for enc_name, size in members:
+        name = key_encode(text_decode(enc_name))
+        new_members[name] = size
+
+        old_content_key = f"{list_key}:{get_hashed(enc_name)}"
+        new_content_key = f"{list_key}:{get_hashed(name)}"
+        if dry_run:
+            print(f"  {enc_name} -> {name!r}")
+        elif r.exists(old_content_key):
+            pipe.rename(old_content_key, new_content_key)
+
+    if dry_run:
+        return len(new_members)
+
+    ttl = r.pttl(list_key)
+    pipe.delete(list_key, f"{list_key}:index")
+    pipe.zadd(list_key, new_members)
+    if ttl > 0:
+        pipe.pexpire(list_key, ttl)
+    pipe.sadd(MIGRATED_KEY, list_key)
+    pipe.execute()
+
+    return len(new_members)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=settings.REDIS_URL, help="Redis URL. Defaults to REDIS_URL.")
+    parser.add_argument("--db", type=int, default=settings.REDIS_DB, help="Redis DB. Defaults to REDIS_DB.")
+    parser.add_argument("--dry-run", action="store_true", help="Print changes without applying them.")
+    args = parser.parse_args()
+
+    r = redis.StrictRedis.from_url(args.url, db=args.db, decode_responses=True)
+
+    total = 0
+    for list_key in r.scan_iter(match="crs:*:files", count=1000):
+        if r.sismember(MIGRATED_KEY, list_key):
+            continue
+
+        print(list_key)
+        total += migrate_list(r, list_key, dry_run=args.dry_run)
+
+    print(f"{'Found' if args.dry_run else 'Migrated'} {total} file names.")
+
+
+if __name__ == "__main__":
+    main()
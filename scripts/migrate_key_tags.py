@@ -0,0 +1,76 @@
+"""Migrate Redis keys of lessons to hash-tagged keys.
+
+Lesson keys move from ``crs:{course_id}:{lesson_id}:...`` to ``{crs:{course_id}:{lesson_id}}:...``,
+and user keys from ``crs:{course_id}:{lesson_id}:{ptc_id}:...`` to
+``{crs:{course_id}:{lesson_id}:{ptc_id}}:...``. TTLs are kept by RENAME. Cached feedback views
+and their dependency sets hold key names in their values, so they are deleted to be cached again.
+
+Run this on the standalone Redis before deploying the server that reads tagged keys, and before
+moving the data to Redis Cluster. Run ``scripts.migrate_file_keys`` first, if not done yet::
+
+    python -m scripts.migrate_key_tags --dry-run
+    python -m scripts.migrate_key_tags
+"""
+
+import argparse
+import re
+
+import redis
+
+from configs import settings
+
+# crs:{course_id}:{lesson_id}:{rest}, where rest of user keys starts with {ptc_id}:
+OLD_KEY = re.compile(r"^crs:(\d+):(\d+):(?:(\d+):)?(.+)$")
+# Values of these keys are key names.
+DERIVED_KEY = re.compile(r"^feedback:(view:.+|\d+:views)$")
+
+
+def new_key(key: str) -> str | None:
+    """Return the hash-tagged key of ``key``. None if it is not a key of lessons."""
+
+    match = OLD_KEY.match(key)
+    if not match:
+        return None
+
+    course_id, lesson_id, ptc_id, rest = match.groups()
+    if ptc_id:
+        return f"{{crs:{course_id}:{lesson_id}:{ptc_id}}}:{rest}"
+    return f"{{crs:{course_id}:{lesson_id}}}:{rest}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=settings.REDIS_URL, help="Redis URL. Defaults to REDIS_URL.")
+    parser.add_argument("--db", type=int, default=settings.REDIS_DB, help="Redis DB. Defaults to REDIS_DB.")
+    parser.add_argument("--dry-run", action="store_true", help="Print changes without applying them.")
+    args = parser.parse_args()
+
+    r = redis.StrictRedis.from_url(args.url, db=args.db, decode_responses=True)
+
+    moved = deleted = 0
+    for key in r.scan_iter(match="crs:*", count=1000):
+        tagged = new_key(key)
+        if tagged is None:
+            continue
+
+        if DERIVED_KEY.match(OLD_KEY.match(key).group(4)):
+            print(f"{key} (deleted)")
+            if not args.dry_run:
+                r.delete(key)
+            deleted += 1
+            continue
+
+        print(f"{key} -> {tagged}")
+        # If the server already wrote the tagged key, it is newer. Drop the old one.
+        if not args.dry_run and not r.renamenx(key, tagged):
+            r.delete(key)
+        moved += 1
+
+    if args.dry_run:
+        print(f"Found {moved} keys to migrate, and {deleted} cached views to delete.")
+    else:
+        print(f"Migrated {moved} keys, and deleted {deleted} cached views.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import asyncio
 import importlib
 
 from fastapi import FastAPI
@@ -7,6 +8,7 @@ from fastapi.templating import Jinja2Templates
 
 from configs import settings
 from server import models, routers, websockets
+from server.helpers import periodic
 from server.helpers.sentry import init_sentry
 from server.websockets import create_websocket
 from server.utils import jinja
@@ -47,3 +49,27 @@ for model_mod in models.__all__:
 
 for ws_mod in websockets.__all__:
     ws = importlib.import_module(f".websockets.{ws_mod}", package=__name__)
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    from server.controllers.file import RedisController
+    from server.controllers.project import PingController
+
+    # Keep references to the tasks not to be garbage collected
+    app.state.background_tasks = [
+        # Write activities recorded by ACTIVITY_PING into DB
+        asyncio.create_task(
+            periodic.run_periodically(settings.ACTIVITY_FLUSH_INTERVAL, PingController.flush_recent_activity)
+        ),
+    ]
+
+    # Repair total file sizes modified outside of RedisController
+    if settings.SIZE_RECONCILE_INTERVAL > 0:
+        app.state.background_tasks.append(
+            asyncio.create_task(
+                periodic.run_periodically(
+                    settings.SIZE_RECONCILE_INTERVAL, RedisController.reconcile_total_file_sizes
+                )
+            )
+        )
@@ -1,7 +1,7 @@
 from server.controllers.base import BaseController
 from server.models.course import Course, Participant
 from server.utils.exceptions import AccessCourseFailException
-from server.helpers.cache import course_cache
+from server.helpers.cache import TAG_PTC, course_cache
 
 
 class CourseBaseController(BaseController):
@@ -40,11 +40,20 @@ class CourseUserController(CourseBaseController):
 
         self._participant = participant
 
-    @course_cache.memoize(timeout=300)
+    @course_cache.memoize(
+        timeout=300,
+        key=lambda self, ptc_id: (ptc_id,),
+        tags=lambda ptc, self, ptc_id: [TAG_PTC.format(ptc_id=ptc_id)],
+    )
     def get_ptc(self, ptc_id: int) -> Participant:
         return self.db.query(Participant).filter(Participant.id == ptc_id).first()
 
-    @course_cache.memoize(timeout=300)
+    @course_cache.memoize(
+        timeout=300,
+        stale_ttl=60,
+        key=lambda self, user_id: (user_id,),
+        tags=lambda ptc, self, user_id: [TAG_PTC.format(ptc_id=ptc.id)] if ptc else [],
+    )
     def get_ptc_by_user_id(self, user_id: int) -> Participant:
         return (
             self.db.query(Participant)
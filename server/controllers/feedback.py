@@ -2,60 +2,33 @@ from collections import defaultdict
 from typing import Any
 
 from sqlalchemy import and_
-from sqlalchemy.orm import contains_eager, joinedload
-from server.controllers.lesson import LessonBaseController
+from sqlalchemy.orm import joinedload
 
+from server.controllers.feedback_board import FeedbackBoard
 from server.controllers.project import ProjectController, ProjectFileController
 from server.models.course import PROJ_PERM, Participant, UserProject
 from server.models.feedback import CodeReference, Comment, Feedback, FeedbackViewerMap
 from server.utils import serializer
 from server.utils.exceptions import FeedbackNotAuthException, FeedbackNotFoundException
-from server.helpers.cache import lesson_cache
 
 class FeedbackController(ProjectController):
-    def _invalidate_cache(self, owner_id: int, filename: str):
-        lesson_cache.delete_memoize(FeedbackController.get_all_feedbacks, self)
-        lesson_cache.delete_memoize(FeedbackController.get_feedbacks, self, owner_id, filename)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.feedback_board = FeedbackBoard(self.course_id, self.lesson_id, self.redis_ctrl.redis_key, db=self.db)
 
-    @lesson_cache.memoize(300)
     def get_all_feedbacks(self) -> list[dict[str, Any]]:
         """Return all feedback information on a lesson."""
 
-        rows: list[UserProject] = (
-            self.db.query(UserProject)
-            .filter(UserProject.lesson_id == self.lesson_id)
-            # CodeReference
-            .join(CodeReference, CodeReference.project_id == UserProject.id)
-            # Feedback
-            .join(Feedback, Feedback.code_ref_id == CodeReference.id)
-            # Must have a permission
-            .join(
-                FeedbackViewerMap,
-                and_(
-                    FeedbackViewerMap.participant_id == self.my_participant.id,
-                    FeedbackViewerMap.feedback_id == Feedback.id,
-                ),
-            )
-            # Outer join Comment
-            .join(Comment, and_(Comment.feedback_id == Feedback.id, Comment.deleted.is_(False)), isouter=True)
-            .options(joinedload(UserProject.participant))
-            .options(
-                contains_eager(UserProject.code_references)
-                .contains_eager(CodeReference.feedbacks)
-                .contains_eager(Feedback.comments)
-                .contains_eager(Comment.participant)
-            )
-            .all()
-        )
+        threads = self.feedback_board.threads(self.my_participant.id)
 
-        resp: list[dict[str, Any]] = []
+        # Group by project owner
+        owners: dict[int, list[dict[str, Any]]] = {}
+        for thread in threads:
+            owners.setdefault(thread["owner"]["ownerId"], []).append(thread)
 
-        for project in rows:
-            resp.append(self._build_dict_v2(owner=project.participant, project=project, refs=project.code_references))
+        return [self._build_dict_v2(_threads[0]["owner"], _threads) for _threads in owners.values()]
 
-        return resp
-
-    @lesson_cache.memoize(300)
     def get_feedbacks(self, owner_id: int | None, filename: str | None) -> dict:
         """Return all feedback information on specific file.
 
@@ -73,82 +46,29 @@ class FeedbackController(ProjectController):
         )
         target_ptc, target_proj = proj_file_ctrl.get_target_info(target_ptc_id=owner_id, check_perm=PROJ_PERM.READ)
 
-        # Query
-        rows = (
-            self.db.query(CodeReference)
-            # CodeReference
-            .filter(CodeReference.project_id == target_proj.id)
-            .filter(CodeReference.file == filename)
-            # Feedback
-            .join(Feedback, Feedback.code_ref_id == CodeReference.id)
-            # Must have a permission
-            .join(FeedbackViewerMap, FeedbackViewerMap.feedback_id == Feedback.id)
-            .filter(FeedbackViewerMap.participant_id == self.my_participant.id)
-            # outer join Comment
-            .join(Comment, and_(Comment.feedback_id == Feedback.id, Comment.deleted.is_(False)), isouter=True)
-            .options(
-                contains_eager(CodeReference.feedbacks)
-                .contains_eager(Feedback.comments)
-                .joinedload(Comment.participant)
-            )
-            .all()
-        )
+        threads = self.feedback_board.threads(self.my_participant.id, owner_id=target_ptc.id, filename=filename)
 
-        return self._build_dict_v2(target_ptc, target_proj, rows)
+        owner = {"ownerId": target_ptc.id, "ownerNickname": target_ptc.nickname, "projectId": target_proj.id}
+        return self._build_dict_v2(owner, threads)
 
-    def _build_dict_v2(self, owner: Participant, project: UserProject, refs: list[CodeReference]) -> dict[str, Any]:
-        """Build response dictionary (version 2)"""
+    def _build_dict_v2(self, owner: dict[str, Any], threads: list[dict[str, Any]]) -> dict[str, Any]:
+        """Build response dictionary (version 2) from feedback threads of a project"""
 
         result = {
-            "ownerId": owner.id,
-            "ownerNickname": owner.nickname,
-            "projectId": project.id,
+            **owner,
             "feedbacks": [],
             "comments": [],
         }
 
-        if not refs:
-            result["refs"] = []
-            return result
+        refs: dict[int, dict[str, Any]] = {}
+        for thread in threads:
+            ref = refs.setdefault(thread["ref"]["id"], {**thread["ref"], "feedbacks": []})
+            ref["feedbacks"].append(thread["feedback"])
 
-        # Query permission
-        fb_ids = []
-        for ref in refs:
-            for fb in ref.feedbacks:
-                fb_ids.append(fb.id)
+            result["feedbacks"].append(thread["feedback"])
+            result["comments"].extend(thread["comments"])
 
-        perms: list[FeedbackViewerMap] = (
-            self.db.query(FeedbackViewerMap)
-            .filter(FeedbackViewerMap.feedback_id.in_(fb_ids))
-            .filter(FeedbackViewerMap.valid.is_(True))
-            .all()
-        )
-        perm_dict = defaultdict(list)
-        for perm in perms:
-            perm_dict[perm.feedback_id].append(perm.participant_id)
-
-        # Build response
-        _refs = []
-        for ref in refs:
-            _feedbacks = []
-            for fb in ref.feedbacks:
-                _cmt = []
-                for cmt in fb.comments:
-                    _cmt.append(serializer.comment(cmt, cmt.participant))
-
-                _f = serializer.feedback(fb, None, perm_dict[fb.id])
-                _f["file"] = ref.file
-                _f["line"] = ref.line
-                _feedbacks.append(_f)
-                result["comments"].extend(_cmt)
-
-            result["feedbacks"].extend(_feedbacks)
-
-            _r = serializer.code_ref_simple(ref)
-            _r["feedbacks"] = _feedbacks
-            _refs.append(_r)
-
-        result["refs"] = _refs
+        result["refs"] = list(refs.values())
         return result
 
     def _build_dict(self, owner: Participant, project: UserProject, refs: list[CodeReference]) -> dict[str, Any]:
@@ -273,15 +193,16 @@ class FeedbackController(ProjectController):
         )
 
         result_acl = []
-        for target_ptc in acl_ptcs:
-            result_acl.append(target_ptc.id)
-            row = FeedbackViewerMap(feedback_id=feedback.id, participant_id=target_ptc.id)
+        for acl_ptc in acl_ptcs:
+            result_acl.append(acl_ptc.id)
+            row = FeedbackViewerMap(feedback_id=feedback.id, participant_id=acl_ptc.id)
             self.db.add(row)
 
         self.db.commit()
 
-        # Cache invalidation
-        self._invalidate_cache(owner_id, filename)
+        # Update feedback board
+        self.feedback_board.put_thread(feedback, result_acl)
+        self.feedback_board.put_comment(comment, self.my_participant)
 
         return dict(
             feedback=feedback,
@@ -360,8 +281,8 @@ class FeedbackController(ProjectController):
 
         self.db.commit()
 
-        # Cache invalidation
-        self._invalidate_cache(owner_id, feedback.code_reference.file)
+        # Update feedback board
+        self.feedback_board.put_thread(feedback, result_acl, revoked=acl_valid_ptc)
 
         return {
             "feedback": feedback,
@@ -406,7 +327,6 @@ class FeedbackController(ProjectController):
 
         feedback: Feedback = row[0]
         perm: FeedbackViewerMap = row[1]
-        code_ref = feedback.code_reference
 
         if not feedback:
             raise FeedbackNotFoundException("존재하지 않는 피드백입니다.")
@@ -419,8 +339,8 @@ class FeedbackController(ProjectController):
 
         acl = [perm.participant_id for perm in feedback.viewer_map]
 
-        # Cache invalidation
-        self._invalidate_cache(code_ref.project.participant_id, code_ref.file)
+        # Update feedback board
+        self.feedback_board.put_comment(cmt, self.my_participant)
 
         return dict(
             feedback=feedback,
@@ -463,9 +383,9 @@ class FeedbackController(ProjectController):
 
         acl = [perm.participant_id for perm in cmt.feedback.viewer_map]
 
-        # Cache invalidation
-        code_ref = cmt.feedback.code_reference
-        self._invalidate_cache(code_ref.project.participant_id, code_ref.file)
+        # Update feedback board
+        if dirty:
+            self.feedback_board.put_comment(cmt, self.my_participant)
 
         return dict(
             feedback=cmt.feedback,
@@ -0,0 +1,336 @@
+import json
+from collections import defaultdict
+from typing import Any, Iterable
+from uuid import uuid4
+
+from redis.client import Pipeline, StrictRedis
+from redis.cluster import ClusterPipeline, RedisCluster
+from sqlalchemy.orm import Session, contains_eager, joinedload, selectinload
+
+from constants.redis import FEEDBACK_TTL, FEEDBACK_VIEW_TTL, RedisKey
+from server.helpers.redis_ import r
+from server.models.course import Participant, UserProject
+from server.models.feedback import CodeReference, Comment, Feedback
+from server.utils import serializer
+from server.utils.etc import get_hashed
+
+# Update a feedback thread and its viewers only if the board is already built (KEYS[1] exists).
+# Otherwise, the next read builds the whole board from DB, including this change.
+# KEYS: built mark, threads, file set, viewer sets to grant, viewer sets to revoke
+# ARGV: feedback ID, thread (json), the number of viewer sets to grant
+_put_thread_if_built = r.register_script(
+    """
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl == -2 then
+    return 0
+end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('SADD', KEYS[3], ARGV[1])
+local n_grant = tonumber(ARGV[3])
+for i = 4, #KEYS do
+    if i < 4 + n_grant then
+        redis.call('SADD', KEYS[i], ARGV[1])
+    else
+        redis.call('SREM', KEYS[i], ARGV[1])
+    end
+end
+if ttl > 0 then
+    for i = 2, #KEYS do
+        redis.call('PEXPIRE', KEYS[i], ttl)
+    end
+end
+return 1
+"""
+)
+
+# Set or delete (if ARGV[2] is empty) a comment only if the board is already built.
+# KEYS: built mark, comments of the feedback
+# ARGV: comment ID, comment (json)
+_put_comment_if_built = r.register_script(
+    """
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl == -2 then
+    return 0
+end
+if ARGV[2] == '' then
+    redis.call('HDEL', KEYS[2], ARGV[1])
+else
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+    if ttl > 0 then
+        redis.call('PEXPIRE', KEYS[2], ttl)
+    end
+end
+return 1
+"""
+)
+
+# Cache a view only if no view has been invalidated since it was read (KEYS[1] is ARGV[1]),
+# and register it to the threads it depends on.
+# KEYS: invalidation sequence, view, dependency sets
+# ARGV: sequence when read, view (json), TTL of view, TTL of dependency sets
+_store_view = r.register_script(
+    """
+if (redis.call('GET', KEYS[1]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+for i = 3, #KEYS do
+    redis.call('SADD', KEYS[i], KEYS[2])
+    redis.call('EXPIRE', KEYS[i], ARGV[4])
+end
+return 1
+"""
+)
+
+# Delete views depending on the threads, and the views specified.
+# KEYS: invalidation sequence, dependency sets, views
+# ARGV: the number of dependency sets
+_invalidate_views = r.register_script(
+    """
+redis.call('INCR', KEYS[1])
+local n_deps = tonumber(ARGV[1])
+for i = 2, n_deps + 1 do
+    for _, view in ipairs(redis.call('SMEMBERS', KEYS[i])) do
+        redis.call('DEL', view)
+    end
+    redis.call('DEL', KEYS[i])
+end
+for i = n_deps + 2, #KEYS do
+    redis.call('DEL', KEYS[i])
+end
+return 1
+"""
+)
+
+
+class FeedbackBoard:
+    """Denormalized read model of the feedbacks in a lesson.
+
+    Each feedback thread is stored as a document with its owner and code reference, and its
+    comments are stored apart so that a comment is added without rewriting the thread.
+    Feedback IDs are indexed by viewer and by file. Thus, listing feedbacks is a set
+    intersection and a multi-get, without any SQL. Like ``LessonRoster``, the board is built
+    from DB once and updated incrementally.
+
+    The lists are also cached per viewer. Each cached list is registered to the threads it
+    contains, so a change of a thread deletes exactly the lists showing it, for all viewers.
+    """
+
+    def __init__(
+        self,
+        course_id: int,
+        lesson_id: int,
+        redis_key: RedisKey,
+        db: Session | None = None,
+        r_: StrictRedis | RedisCluster | Pipeline | ClusterPipeline = r,
+    ):
+        self.course_id = course_id
+        self.lesson_id = lesson_id
+        self.redis_key = redis_key
+        self.db = db
+        self.r = r_
+
+    @property
+    def built_key(self) -> str:
+        return self.redis_key.KEY_LESSON_FEEDBACK_BUILT
+
+    @property
+    def thread_key(self) -> str:
+        return self.redis_key.KEY_LESSON_FEEDBACK
+
+    def comment_key(self, feedback_id: int) -> str:
+        return self.redis_key.KEY_LESSON_FEEDBACK_COMMENTS.format(feedback_id=feedback_id)
+
+    def viewer_key(self, ptc_id: int) -> str:
+        return self.redis_key.KEY_LESSON_FEEDBACK_VIEWER.format(ptc_id=ptc_id)
+
+    def file_key(self, owner_id: int, filename: str) -> str:
+        return self.redis_key.KEY_LESSON_FEEDBACK_FILE.format(ptc_id=owner_id, hash=get_hashed(filename))
+
+    def view_key(self, viewer_id: int, owner_id: int | None = None, filename: str | None = None) -> str:
+        scope = f"{owner_id}:{get_hashed(filename)}" if owner_id and filename else "all"
+        return self.redis_key.KEY_LESSON_FEEDBACK_VIEW.format(ptc_id=viewer_id, scope=scope)
+
+    def deps_key(self, feedback_id: int) -> str:
+        return self.redis_key.KEY_LESSON_FEEDBACK_DEPS.format(feedback_id=feedback_id)
+
+    @property
+    def seq_key(self) -> str:
+        return self.redis_key.KEY_LESSON_FEEDBACK_SEQ
+
+    def build(self):
+        """Build the board from DB and store it into Redis."""
+
+        feedbacks: list[Feedback] = (
+            self.db.query(Feedback)
+            .join(CodeReference, CodeReference.id == Feedback.code_ref_id)
+            .join(UserProject, UserProject.id == CodeReference.project_id)
+            .filter(UserProject.lesson_id == self.lesson_id)
+            .options(
+                contains_eager(Feedback.code_reference)
+                .contains_eager(CodeReference.project)
+                .joinedload(UserProject.participant)
+            )
+            .options(joinedload(Feedback.participant))
+            .options(selectinload(Feedback.viewer_map))
+            .options(selectinload(Feedback.comments).joinedload(Comment.participant))
+            .all()
+        )
+
+        threads = {}
+        comments = {}
+        viewers = defaultdict(list)
+        files = defaultdict(list)
+        stale_viewers = set()  # Everyone who has ever been granted, to remove revoked ones
+        for fb in feedbacks:
+            acl = sorted(perm.participant_id for perm in fb.viewer_map if perm.valid)
+            stale_viewers.update(perm.participant_id for perm in fb.viewer_map)
+
+            threads[fb.id] = json.dumps(serializer.feedback_thread(fb, acl))
+            comments[fb.id] = {
+                cmt.id: json.dumps(serializer.comment(cmt, cmt.participant)) for cmt in fb.comments if not cmt.deleted
+            }
+            for ptc_id in acl:
+                viewers[ptc_id].append(fb.id)
+            files[self.file_key(fb.code_reference.project.participant_id, fb.code_reference.file)].append(fb.id)
+
+        pipe = self.r.pipeline()
+        # One key per DEL, as a pipeline of Redis Cluster does not delete multiple keys at once.
+        for key in (
+            self.built_key,
+            self.thread_key,
+            *[self.viewer_key(ptc_id) for ptc_id in stale_viewers],
+            *[self.comment_key(fb_id) for fb_id in threads],
+            *files,
+        ):
+            pipe.delete(key)
+        if threads:
+            pipe.hset(self.thread_key, mapping=threads)
+            pipe.expire(self.thread_key, FEEDBACK_TTL)
+        for fb_id, _comments in comments.items():
+            if _comments:
+                pipe.hset(self.comment_key(fb_id), mapping=_comments)
+                pipe.expire(self.comment_key(fb_id), FEEDBACK_TTL)
+        for ptc_id, fb_ids in viewers.items():
+            pipe.sadd(self.viewer_key(ptc_id), *fb_ids)
+            pipe.expire(self.viewer_key(ptc_id), FEEDBACK_TTL)
+        for file_key, fb_ids in files.items():
+            pipe.sadd(file_key, *fb_ids)
+            pipe.expire(file_key, FEEDBACK_TTL)
+        # Mark as built at last. Views cached from the previous board are ignored by the new generation.
+        pipe.set(self.built_key, uuid4().hex, ex=FEEDBACK_TTL)
+        pipe.execute()
+
+    def threads(self, viewer_id: int, owner_id: int | None = None, filename: str | None = None) -> list[dict[str, Any]]:
+        """Return feedback threads that ``viewer_id`` can see, with their comments, ordered by feedback ID.
+        If the board is not built yet, build it.
+
+        Args:
+            viewer_id (int): viewer's participant ID
+            owner_id (int | None, optional): if specified with ``filename``, only the threads on the file.
+            filename (str | None, optional): filename of ``owner_id``'s project
+
+        Returns:
+            list[dict[str, Any]]: ``{"owner", "ref", "feedback", "comments"}`` of each thread
+        """
+
+        view_key = self.view_key(viewer_id, owner_id, filename)
+
+        pipe = self.r.pipeline(transaction=False)
+        pipe.get(self.built_key)
+        pipe.get(view_key)
+        pipe.get(self.seq_key)
+        generation, view, seq = pipe.execute()
+
+        if generation and view:
+            view = json.loads(view)
+            if view["generation"] == generation:
+                return view["threads"]
+
+        if not generation:
+            self.build()
+            generation = self.r.get(self.built_key)
+
+        threads = self._load_threads(viewer_id, owner_id, filename)
+
+        _store_view(
+            keys=[self.seq_key, view_key, *[self.deps_key(thread["feedback"]["id"]) for thread in threads]],
+            args=[seq or "0", json.dumps({"generation": generation, "threads": threads}), FEEDBACK_VIEW_TTL, FEEDBACK_TTL],
+            client=self.r,
+        )
+        return threads
+
+    def _load_threads(self, viewer_id: int, owner_id: int | None, filename: str | None) -> list[dict[str, Any]]:
+        """Read threads from the board"""
+
+        if owner_id and filename:
+            fb_ids = self.r.sinter(self.viewer_key(viewer_id), self.file_key(owner_id, filename))
+        else:
+            fb_ids = self.r.smembers(self.viewer_key(viewer_id))
+
+        if not fb_ids:
+            return []
+
+        fb_ids = sorted(fb_ids, key=int)
+        pipe = self.r.pipeline(transaction=False)
+        pipe.hmget(self.thread_key, fb_ids)
+        for fb_id in fb_ids:
+            pipe.hgetall(self.comment_key(fb_id))
+        threads, *comments = pipe.execute()
+
+        result = []
+        for thread, _comments in zip(threads, comments):
+            if thread is None:  # Expired while reading
+                continue
+
+            thread = json.loads(thread)
+            thread["comments"] = [json.loads(_comments[cmt_id]) for cmt_id in sorted(_comments, key=int)]
+            result.append(thread)
+
+        return result
+
+    def put_thread(self, feedback: Feedback, acl: Iterable[int], revoked: Iterable[int] = ()):
+        """Update the feedback thread and its viewers
+
+        Args:
+            feedback (Feedback): created or modified feedback
+            acl (Iterable[int]): participant IDs who can see the feedback
+            revoked (Iterable[int], optional): participant IDs who cannot see the feedback anymore. Defaults to ().
+        """
+
+        acl = sorted(set(acl))
+        revoked = set(revoked) - set(acl)
+        ref = feedback.code_reference
+
+        keys = [
+            self.built_key,
+            self.thread_key,
+            self.file_key(ref.project.participant_id, ref.file),
+            *[self.viewer_key(ptc_id) for ptc_id in acl],
+            *[self.viewer_key(ptc_id) for ptc_id in revoked],
+        ]
+        thread = json.dumps(serializer.feedback_thread(feedback, acl))
+
+        # Views showing the thread, and views of the viewers to whom the thread appears or disappears
+        views = []
+        for ptc_id in [*acl, *revoked]:
+            views.extend([self.view_key(ptc_id), self.view_key(ptc_id, ref.project.participant_id, ref.file)])
+
+        pipe = self.r.pipeline()
+        _put_thread_if_built(keys=keys, args=[feedback.id, thread, len(acl)], client=pipe)
+        _invalidate_views(keys=[self.seq_key, self.deps_key(feedback.id), *views], args=[1], client=pipe)
+        pipe.execute()
+
+    def put_comment(self, comment: Comment, writer: Participant | None = None):
+        """Update the comment. Deleted comment is removed from the board."""
+
+        value = "" if comment.deleted else json.dumps(serializer.comment(comment, writer))
+
+        pipe = self.r.pipeline()
+        _put_comment_if_built(
+            keys=[self.built_key, self.comment_key(comment.feedback_id)],
+            args=[comment.id, value],
+            client=pipe,
+        )
+        _invalidate_views(keys=[self.seq_key, self.deps_key(comment.feedback_id)], args=[1], client=pipe)
+        pipe.execute()
@@ -1,18 +1,222 @@
 import os
-import tempfile
 import zipfile
+from contextlib import ExitStack
 from io import IOBase
 
 from botocore.errorfactory import ClientError
 from redis.client import Pipeline, StrictRedis
+from redis.cluster import ClusterPipeline, RedisCluster
+from redis.exceptions import NoScriptError
 
 from configs import settings
-from constants.redis import SIZE_LIMIT, RedisKey
+from constants.redis import S3_MISSING_KEY, S3_MISSING_TTL, SIZE_LIMIT, RedisKey
 from constants.s3 import S3Key
-from server.helpers import s3, sentry
-from server.helpers.redis_ import r, r_bytes
-from server.utils.etc import get_hashed, text_decode, text_encode
-from server.utils.exceptions import FileAlreadyExistsException, ProjectFileException
+from server.helpers import archive, s3, sentry
+from server.helpers.redis_ import RAW, r
+from server.utils.etc import get_hashed, is_binary, key_decode, key_encode, text_encode
+from server.utils.exceptions import (
+    FileAlreadyExistsException,
+    FileCRUDException,
+    ProjectFileException,
+    ProjectObjectNotFoundException,
+)
+from server.utils.tree import chunks
+
+# Max number of files updated by one script call, not to block Redis for long
+SIZE_SCRIPT_BATCH = 1000
+
+# Attempts of a tree script, while files under the directory keep changing
+TREE_SCRIPT_RETRIES = 5
+
+# Bytes read from the head of a bulk file to tell whether it is binary
+BINARY_SNIFF_BYTES = 8192
+
+# Common to the scripts below, which keep the total file size (KEYS[3]) equal to the sum of the
+# scores of the file list (KEYS[1]). If the total does not exist, e.g. evicted, it is rebuilt first.
+_ENSURE_TOTAL_SIZE = """
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    local total = 0
+    local items = redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES')
+    for i = 2, #items, 2 do
+        total = total + tonumber(items[i])
+    end
+    redis.call('SET', KEYS[3], string.format('%d', total))
+end
+"""
+
+# Common to the tree scripts below. If a lex range of the directory index (KEYS[2]) is given by
+# ARGV[1] and ARGV[2], files in the range must be the files given by the caller, in the same order.
+# Otherwise, e.g. a file was added under the directory meanwhile, -1 is returned to retry.
+# Content keys of the files are declared by the caller, as Redis Cluster requires all keys to be.
+_CHECK_SUBTREE = """
+local function subtree_changed(first, step)
+    if ARGV[1] == '' then
+        return false
+    end
+    local names = redis.call('ZRANGEBYLEX', KEYS[2], ARGV[1], ARGV[2])
+    if #names ~= (#ARGV - 2) / step then
+        return true
+    end
+    for i, name in ipairs(names) do
+        if name ~= ARGV[first + (i - 1) * step] then
+            return true
+        end
+    end
+    return false
+end
+"""
+
+# Add files, or update their sizes.
+# KEYS: file list, directory index, total size
+# ARGV: (encoded name, size) of each file
+_add_files = r.register_script(
+    _ENSURE_TOTAL_SIZE
+    + """
+local delta = 0
+for i = 1, #ARGV, 2 do
+    local name, size = ARGV[i], ARGV[i + 1]
+    local old = redis.call('ZSCORE', KEYS[1], name)
+    redis.call('ZADD', KEYS[1], size, name)
+    redis.call('ZADD', KEYS[2], 0, name)
+    delta = delta + tonumber(size) - (tonumber(old) or 0)
+end
+return redis.call('INCRBY', KEYS[3], string.format('%d', delta))
+"""
+)
+
+# Remove files from file list.
+# KEYS: file list, directory index, total size
+# ARGV: encoded name of each file
+_remove_files = r.register_script(
+    _ENSURE_TOTAL_SIZE
+    + """
+local delta = 0
+for i = 1, #ARGV do
+    local old = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    redis.call('ZREM', KEYS[1], ARGV[i])
+    redis.call('ZREM', KEYS[2], ARGV[i])
+    delta = delta - (tonumber(old) or 0)
+end
+return redis.call('INCRBY', KEYS[3], string.format('%d', delta))
+"""
+)
+
+# Rename files atomically, e.g. a file or files under a directory.
+# KEYS: file list, directory index, total size, (content key, new content key) of each file
+# ARGV: lex range of the directory (or two empty strings), (encoded name, new encoded name) of each file
+_rename_tree = r.register_script(
+    _ENSURE_TOTAL_SIZE
+    + _CHECK_SUBTREE
+    + """
+if subtree_changed(3, 2) then
+    return -1
+end
+local delta = 0
+for i = 1, #ARGV / 2 - 1 do
+    local name, new_name = ARGV[i * 2 + 1], ARGV[i * 2 + 2]
+    local content_key, new_content_key = KEYS[i * 2 + 2], KEYS[i * 2 + 3]
+
+    redis.call('ZREM', KEYS[2], name)
+    local size = redis.call('ZSCORE', KEYS[1], name)
+    if size and name ~= new_name then
+        -- The file of the new name is overwritten.
+        delta = delta - (tonumber(redis.call('ZSCORE', KEYS[1], new_name)) or 0)
+        redis.call('ZREM', KEYS[1], name)
+        redis.call('ZADD', KEYS[1], size, new_name)
+        redis.call('ZADD', KEYS[2], 0, new_name)
+        if redis.call('EXISTS', content_key) == 1 then
+            redis.call('RENAME', content_key, new_content_key)
+        end
+    end
+end
+redis.call('INCRBY', KEYS[3], string.format('%d', delta))
+return #ARGV / 2 - 1
+"""
+)
+
+# Delete files under a directory atomically.
+# KEYS: file list, directory index, total size, content key of each file
+# ARGV: lex range of the directory, encoded name of each file
+_delete_tree = r.register_script(
+    _ENSURE_TOTAL_SIZE
+    + _CHECK_SUBTREE
+    + """
+if subtree_changed(3, 1) then
+    return -1
+end
+local delta = 0
+for i = 3, #ARGV do
+    delta = delta - (tonumber(redis.call('ZSCORE', KEYS[1], ARGV[i])) or 0)
+    redis.call('ZREM', KEYS[1], ARGV[i])
+    redis.call('ZREM', KEYS[2], ARGV[i])
+    redis.call('DEL', KEYS[i + 1])
+end
+redis.call('INCRBY', KEYS[3], string.format('%d', delta))
+return #ARGV - 2
+"""
+)
+
+# Recompute the total file size from the file list.
+# KEYS: file list, (unused), total size
+_reset_total_size = r.register_script(
+    """
+redis.call('DEL', KEYS[3])
+"""
+    + _ENSURE_TOTAL_SIZE
+    + """
+return redis.call('GET', KEYS[3])
+"""
+)
+
+
+# Increase revision. If the revision does not exist, e.g. evicted, seed it from current time
+# in microseconds, so that a revision is never reused.
+# KEYS: revision key (STRING), or revision hash (HASH) if ARGV is given
+# ARGV: fields of the revision hash
+_bump_revision = r.register_script(
+    """
+redis.replicate_commands()
+local function seed()
+    local t = redis.call('TIME')
+    return t[1] .. string.format('%06d', t[2])
+end
+
+if #ARGV == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        return redis.call('INCR', KEYS[1])
+    end
+    local rev = seed()
+    redis.call('SET', KEYS[1], rev)
+    return rev
+end
+
+local rev
+for i = 1, #ARGV do
+    if redis.call('HEXISTS', KEYS[1], ARGV[i]) == 1 then
+        rev = redis.call('HINCRBY', KEYS[1], ARGV[i], 1)
+    else
+        rev = seed()
+        redis.call('HSET', KEYS[1], ARGV[i], rev)
+    end
+end
+return rev
+"""
+)
+
+
+# Read a byte range of file content with its total size and type at once.
+# Run by EVALSHA with ``RAW`` options, so that the content is not decoded.
+# KEYS: file content, file types
+# ARGV: start, end (inclusive), hash(filename)
+_read_range = r.register_script(
+    """
+return {
+    redis.call('GETRANGE', KEYS[1], ARGV[1], ARGV[2]),
+    redis.call('STRLEN', KEYS[1]),
+    redis.call('HGET', KEYS[2], ARGV[3]),
+}
+"""
+)
 
 
 class RedisController:
@@ -21,7 +225,7 @@ class RedisController:
         course_id: int | None = None,
         lesson_id: int | None = None,
         redis_key: RedisKey | None = None,
-        r_: StrictRedis | Pipeline = r,
+        r_: StrictRedis | RedisCluster | Pipeline | ClusterPipeline = r,
     ):
 
         self.r = r_
@@ -38,7 +242,7 @@ class RedisController:
         return self
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
-        if isinstance(self.r, Pipeline):
+        if isinstance(self.r, (Pipeline, ClusterPipeline)):
             self.r.execute()
 
     def update_base_key(
@@ -48,39 +252,60 @@ class RedisController:
     ):
         self.redis_key = RedisKey(course_id, lesson_id)
 
+    def _file_keys(self, hashed_name: str, ptc_id: int | None = None) -> tuple[str, str]:
+        """Return keys of file content and file types. If ``ptc_id`` is None, template's."""
+
+        if ptc_id:
+            return (
+                self.redis_key.KEY_USER_FILE_CONTENT.format(ptc_id=ptc_id, hash=hashed_name),
+                self.redis_key.KEY_USER_FILE_TYPE.format(ptc_id=ptc_id),
+            )
+        return (
+            self.redis_key.KEY_TEMPLATE_FILE_CONTENT.format(hash=hashed_name),
+            self.redis_key.KEY_TEMPLATE_FILE_TYPE,
+        )
+
     def store_file(
         self,
         filename: str,
-        content: str | int,
+        content: str | bytes | int,
         ptc_id: int | None = None,
         hashed=False,
+        file_type: str | None = None,
     ):
         """Store file content into Redis
 
         Args:
             filename (str): filename to store as key
-            content (str | int): content to store as value
+            content (str | bytes | int): content to store as value
             ptc_id (int | None, optional): owner participant's ID. Defaults to None.
             hashed (bool, optional): whether the filename is hashed or encoded. Defaults to False.
+            file_type (str | None, optional): ``FILE_TYPE_*`` of the content. If None, bytes content
+                is inspected, and the others are text. Defaults to None.
         """
 
         if not hashed:
             filename = get_hashed(filename)
 
-        if ptc_id:
-            file_key = self.redis_key.KEY_USER_FILE_CONTENT.format(ptc_id=ptc_id, hash=filename)
-        else:
-            file_key = self.redis_key.KEY_TEMPLATE_FILE_CONTENT.format(hash=filename)
+        if file_type is None:
+            binary = isinstance(content, bytes) and is_binary(content)
+            file_type = self.redis_key.FILE_TYPE_BINARY if binary else self.redis_key.FILE_TYPE_TEXT
 
+        file_key, type_key = self._file_keys(filename, ptc_id)
         self.r.set(file_key, content)
+        self.r.hset(type_key, filename, file_type)
+
+        if ptc_id:
+            self.bump_file_revision(ptc_id, filename)
 
     def get_file(
         self,
         filename: str,
         ptc_id: int | None = None,
         hashed: bool = False,
-    ) -> str:
-        """Return file content from Redis.
+    ) -> str | bytes | None:
+        """Return file content from Redis. It is transferred once as bytes, and decoded only if
+        it is text. Binary files, or files of unknown type not decodable, are returned as bytes.
 
         Args:
             filename (str): filename to read
@@ -91,18 +316,101 @@ class RedisController:
         if not hashed:
             filename = get_hashed(filename)
 
-        if ptc_id:
-            file_key = self.redis_key.KEY_USER_FILE_CONTENT.format(ptc_id=ptc_id, hash=filename)
-        else:
-            file_key = self.redis_key.KEY_TEMPLATE_FILE_CONTENT.format(hash=filename)
+        file_key, type_key = self._file_keys(filename, ptc_id)
+
+        pipe = self.r.pipeline(transaction=False)
+        pipe.hget(type_key, filename)
+        pipe.execute_command("GET", file_key, **RAW)
+        file_type, content = pipe.execute()
+
+        if content is None or file_type == self.redis_key.FILE_TYPE_BINARY:
+            return content
+
+        try:
+            return content.decode()
+        except UnicodeDecodeError:  # Type is unknown
+            return content
+
+    def get_bulk_object_key(self, filename: str, ptc_id: int | None = None, hashed: bool = False) -> str | None:
+        """Return S3 object key of a bulk file, which is stored instead of its content."""
+
+        if not hashed:
+            filename = get_hashed(filename)
+
+        file_key, _ = self._file_keys(filename, ptc_id)
+        return self.r.get(file_key)
+
+    def get_file_type(self, filename: str, ptc_id: int | None = None, hashed: bool = False) -> str | None:
+        """Return ``FILE_TYPE_*`` of the file, or None if unknown."""
+
+        if not hashed:
+            filename = get_hashed(filename)
 
+        _, type_key = self._file_keys(filename, ptc_id)
+        return self.r.hget(type_key, filename)
+
+    def drop_file_type(self, ptc_id: int, *hashed_names: str):
+        """Remove types of deleted files"""
+
+        if hashed_names:
+            self.r.hdel(self.redis_key.KEY_USER_FILE_TYPE.format(ptc_id=ptc_id), *hashed_names)
+
+    def move_file_type(self, ptc_id: int, renamed: dict[str, str]):
+        """Move types of renamed files
+
+        Args:
+            ptc_id (int): owner participant ID
+            renamed (dict[str, str]): new hashed name by old hashed name
+        """
+
+        if not renamed:
+            return
+
+        type_key = self.redis_key.KEY_USER_FILE_TYPE.format(ptc_id=ptc_id)
+        file_types = self.r.hmget(type_key, list(renamed))
+
+        pipe = self.r.pipeline()
+        pipe.hdel(type_key, *renamed)
+        mapping = {new: file_type for new, file_type in zip(renamed.values(), file_types) if file_type}
+        if mapping:
+            pipe.hset(type_key, mapping=mapping)
+        pipe.execute()
+
+    def get_file_range(
+        self,
+        filename: str,
+        start: int,
+        end: int,
+        ptc_id: int | None = None,
+        hashed: bool = False,
+    ) -> tuple[bytes, int, str | None]:
+        """Return a byte range of file content from Redis.
+
+        Args:
+            filename (str): filename to read
+            start (int): first byte position
+            end (int): last byte position, inclusive
+            ptc_id (int | None, optional): owner participant ID. Defaults to None.
+            hashed (bool, optional): whether the filename is hashed or encoded. Defaults to False.
+
+        Returns:
+            tuple[bytes, int, str | None]: content in the range, the total size in bytes,
+                and ``FILE_TYPE_*`` of the file or None if unknown
+        """
+
+        if not hashed:
+            filename = get_hashed(filename)
+
+        # ``Script.__call__`` does not take ``RAW`` options, so run it by EVALSHA directly.
+        # EVAL loads the script into the script cache, e.g. after Redis restarted.
+        file_key, type_key = self._file_keys(filename, ptc_id)
+        args = [2, file_key, type_key, start, end, filename]
         try:
-            content: str = self.r.get(file_key)
-        except UnicodeDecodeError:
-            # XXX: :(
-            content: bytes = r_bytes.get(file_key)
+            data, total, file_type = self.r.execute_command("EVALSHA", _read_range.sha, *args, **RAW)
+        except NoScriptError:
+            data, total, file_type = self.r.execute_command("EVAL", _read_range.script, *args, **RAW)
 
-        return content
+        return data, total, file_type.decode() if file_type else None
 
     def delete_file(
         self,
@@ -124,42 +432,17 @@ class RedisController:
         if encoded:
             enc_filename = filename
         else:
-            enc_filename = text_encode(filename)
+            enc_filename = key_encode(filename)
 
         # Pop from file list
         self.pop_file_list(filename=enc_filename, ptc_id=ptc_id, encoded=True)
 
         # Remove file content
-        file_key = self.redis_key.KEY_USER_FILE_CONTENT.format(ptc_id=ptc_id, hash=get_hashed(enc_filename))
+        hashed_name = get_hashed(enc_filename)
+        file_key = self.redis_key.KEY_USER_FILE_CONTENT.format(ptc_id=ptc_id, hash=hashed_name)
         self.r.delete(file_key)
-
-    def _rename_file(
-        self,
-        filename: str,
-        new_filename: str,
-        ptc_id: int,
-        hashed: bool = False,
-    ) -> bool:
-        """Rename file content key
-
-        Args:
-            filename (str): filename to rename
-            new_filename (str): new filename
-            ptc_id (int): owner's participant ID
-            hashed (bool, optional): whether the filename is hashed or encoded. Defaults to False.
-
-        Returns:
-            bool: renamed or not (because hte name already exists)
-        """
-
-        if not hashed:
-            filename = get_hashed(filename)
-            new_filename = get_hashed(new_filename)
-
-        file_key = self.redis_key.KEY_USER_FILE_CONTENT.format(ptc_id=ptc_id, hash=filename)
-        new_file_key = self.redis_key.KEY_USER_FILE_CONTENT.format(ptc_id=ptc_id, hash=new_filename)
-
-        return bool(self.r.renamenx(file_key, new_file_key))
+        self.drop_file_revision(ptc_id, hashed_name)
+        self.drop_file_type(ptc_id, hashed_name)
 
     def get_file_size_len(
         self,
@@ -211,7 +494,7 @@ class RedisController:
 
         # If filename is raw plain text, encode it
         if not encoded:
-            filename = text_encode(filename)
+            filename = key_encode(filename)
 
         try:
             return int(self.r.zscore(list_key, filename))
@@ -239,8 +522,18 @@ class RedisController:
         dummy_file = os.path.join(dirname, self.redis_key.DUMMY_DIR_MARK)
         return self.has_file(filename=dummy_file, ptc_id=ptc_id, encoded=False)
 
-    def get_total_file_size(self, ptc_id: int):
-        """Return participant's total file size
+    def _size_keys(self, ptc_id: int) -> list[str]:
+        """Return KEYS of the scripts maintaining the total file size."""
+
+        return [
+            self.redis_key.KEY_USER_FILE_LIST.format(ptc_id=ptc_id),
+            self.redis_key.KEY_USER_DIR_INDEX.format(ptc_id=ptc_id),
+            self.redis_key.KEY_USER_CUR_SIZE.format(ptc_id=ptc_id),
+        ]
+
+    def get_total_file_size(self, ptc_id: int) -> int:
+        """Return participant's total file size.
+        It is maintained along with the file list, so this is a single GET.
 
         Args:
             ptc_id (int): participant ID
@@ -248,31 +541,17 @@ class RedisController:
 
         key = self.redis_key.KEY_USER_CUR_SIZE.format(ptc_id=ptc_id)
         try:
-            return int(self.r.get(key) or 0)
-        except ValueError:
+            return int(self.r.get(key))
+        except (TypeError, ValueError):  # Not exists or broken
             return self.set_total_file_size(ptc_id=ptc_id)
 
-    def increase_total_file_size(
-        self,
-        amount: int,
-        ptc_id: int,
-    ) -> int:
-        """Increase total file size by amount
-
-        Args:
-            amount (int): increase amount. It can be negative.
-            ptc_id (int): target participant ID
-        """
-
-        key = self.redis_key.KEY_USER_CUR_SIZE.format(ptc_id=ptc_id)
-        return self.r.incrby(key, amount)
-
     def set_total_file_size(
         self,
         ptc_id: int,
     ) -> int:
         """Set total size bytes to ``size_key`` in Redis.
         Total size equals to the sum of the scores of ``list_key`` items.
+        It is computed atomically in Redis, so a concurrent modification is never lost.
 
         Args:
             ptc_id (int): owner of the files
@@ -281,15 +560,31 @@ class RedisController:
              please make sure files that are in AWS S3 is considered too.
         """
 
-        list_key = self.redis_key.KEY_USER_FILE_LIST.format(ptc_id=ptc_id)
-        size_key = self.redis_key.KEY_USER_CUR_SIZE.format(ptc_id=ptc_id)
+        return int(_reset_total_size(keys=self._size_keys(ptc_id), client=self.r))
 
-        total = 0
-        for _, size in self.r.zscan_iter(list_key, score_cast_func=int):
-            total += size
+    @staticmethod
+    def reconcile_total_file_sizes(client: StrictRedis | RedisCluster = r, count: int = 500) -> int:
+        """Recompute all total file sizes from their file lists.
+        Totals are maintained atomically, so this only repairs ones modified outside of this controller.
 
-        self.r.set(size_key, total)
-        return total
+        Args:
+            client (StrictRedis | RedisCluster, optional): Redis client. Defaults to r.
+                On Redis Cluster, all primaries are scanned.
+            count (int, optional): SCAN count hint. Defaults to 500.
+
+        Returns:
+            int: the number of corrected totals
+        """
+
+        corrected = 0
+        # e.g. {crs:1:2:3}:size. Lesson keys have no key named 'size'.
+        for size_key in client.scan_iter(match="{crs:*}:size", count=count):
+            base = size_key[: -len("size")]
+            keys = [base + "files", base + "files:index", size_key]
+            old = client.get(size_key)
+            if old is not None and str(_reset_total_size(keys=keys, client=client)) != old:
+                corrected += 1
+        return corrected
 
     def append_file_list(
         self,
@@ -299,6 +594,7 @@ class RedisController:
         encoded=False,
     ):
         """Add new filename into file list. If ``ptc_id`` is None, it is appended to template list.
+        Total file size of the participant is updated together.
 
         Args:
             filename (str): filename to add
@@ -308,14 +604,14 @@ class RedisController:
         """
 
         if not encoded:
-            filename = text_encode(filename)
+            filename = key_encode(filename)
 
-        if ptc_id:
-            list_key = self.redis_key.KEY_USER_FILE_LIST.format(ptc_id=ptc_id)
-        else:
-            list_key = self.redis_key.KEY_TEMPLATE_FILE_LIST
+        if not ptc_id:
+            self.r.zadd(self.redis_key.KEY_TEMPLATE_FILE_LIST, {filename: size})
+            return
 
-        self.r.zadd(list_key, {filename: size})
+        _add_files(keys=self._size_keys(ptc_id), args=[filename, size], client=self.r)
+        self.bump_tree_revision(ptc_id)
 
     def set_file_size(
         self,
@@ -337,7 +633,7 @@ class RedisController:
         ptc_id: int,
         encoded: bool = False,
     ):
-        """Pop filename from file list.
+        """Pop filename from file list. Total file size is updated together.
 
         Args:
             filename (str): filename to add
@@ -346,11 +642,91 @@ class RedisController:
         """
 
         if not encoded:
-            filename = text_encode(filename)
+            filename = key_encode(filename)
 
-        list_key = self.redis_key.KEY_USER_FILE_LIST.format(ptc_id=ptc_id)
+        _remove_files(keys=self._size_keys(ptc_id), args=[filename], client=self.r)
+        self.bump_tree_revision(ptc_id)
+
+    def bump_tree_revision(self, ptc_id: int) -> int | None:
+        """Increase revision of the file tree. Call this after the file list is modified.
+
+        Args:
+            ptc_id (int): owner participant's ID
+
+        Returns:
+            int | None: new revision. None if this controller is on a pipeline.
+        """
+
+        rev_key = self.redis_key.KEY_USER_TREE_REV.format(ptc_id=ptc_id)
+        rev = _bump_revision(keys=[rev_key], client=self.r)
+        return None if isinstance(self.r, Pipeline) else int(rev)
+
+    def get_tree_revision(self, ptc_id: int) -> int:
+        """Return current revision of the file tree.
+
+        Args:
+            ptc_id (int): owner participant's ID
+        """
+
+        rev = self.r.get(self.redis_key.KEY_USER_TREE_REV.format(ptc_id=ptc_id))
+        if rev is None:
+            return self.bump_tree_revision(ptc_id)
+        return int(rev)
 
-        self.r.zrem(list_key, filename)
+    def bump_file_revision(self, ptc_id: int, *hashed_names: str) -> int | None:
+        """Increase revisions of the files. Call this after file contents are modified.
+
+        Args:
+            ptc_id (int): owner participant's ID
+            hashed_names (str): hashed filenames
+
+        Returns:
+            int | None: new revision of the last file. None if this controller is on a pipeline.
+        """
+
+        revs_key = self.redis_key.KEY_USER_FILE_REV.format(ptc_id=ptc_id)
+        rev = _bump_revision(keys=[revs_key], args=hashed_names, client=self.r)
+        return None if isinstance(self.r, Pipeline) else int(rev)
+
+    def drop_file_revision(self, ptc_id: int, *hashed_names: str):
+        """Remove revisions of the files that no longer exist.
+
+        Args:
+            ptc_id (int): owner participant's ID
+            hashed_names (str): hashed filenames
+        """
+
+        self.r.hdel(self.redis_key.KEY_USER_FILE_REV.format(ptc_id=ptc_id), *hashed_names)
+
+    def get_file_revision(self, filename: str, ptc_id: int, hashed: bool = False) -> int:
+        """Return current revision of the file content.
+
+        Args:
+            filename (str): target filename
+            ptc_id (int): owner participant's ID
+            hashed (bool, optional): whether the filename is hashed or encoded. Defaults to False.
+        """
+
+        if not hashed:
+            filename = get_hashed(filename)
+
+        rev = self.r.hget(self.redis_key.KEY_USER_FILE_REV.format(ptc_id=ptc_id), filename)
+        if rev is None:
+            return self.bump_file_revision(ptc_id, filename)
+        return int(rev)
+
+    def get_file_list_with_size(self, ptc_id: int) -> list[tuple[str, int]]:
+        """Return cached files and their sizes from Redis.
+
+        Args:
+            ptc_id (int): owner participant's ID
+
+        Returns:
+            list[tuple[str, int]]: (filename, size) pairs
+        """
+
+        list_key = self.redis_key.KEY_USER_FILE_LIST.format(ptc_id=ptc_id)
+        return list(self.r.zscan_iter(list_key, score_cast_func=int))
 
     def get_file_list(
         self,
@@ -380,8 +756,8 @@ class RedisController:
 
         if settings.DEBUG:
             for _en in enc_file_names:
-                print(text_decode(_en))
-                
+                print(key_decode(_en))
+
         return enc_file_names
 
         # FIXME: 현재로서는 구현이 안되어 일관성이 부족하여, 주석 처리
@@ -401,6 +777,154 @@ class RedisController:
 
         # return enc_file_names if cached else []
 
+    def ensure_dir_index(self, ptc_id: int):
+        """Build directory index from file list if they do not match. For example,
+        files stored before the index was introduced are not indexed.
+
+        Args:
+            ptc_id (int): owner participant's ID
+        """
+
+        list_key = self.redis_key.KEY_USER_FILE_LIST.format(ptc_id=ptc_id)
+        index_key = self.redis_key.KEY_USER_DIR_INDEX.format(ptc_id=ptc_id)
+
+        pipe = self.r.pipeline()
+        pipe.zcard(list_key)
+        pipe.zcard(index_key)
+        list_size, index_size = pipe.execute()
+
+        if list_size == index_size:
+            return
+
+        names = {enc_filename: 0 for enc_filename, _ in self.r.zscan_iter(list_key)}
+
+        pipe = self.r.pipeline()
+        pipe.delete(index_key)
+        if names:
+            pipe.zadd(index_key, names)
+        pipe.execute()
+
+    @staticmethod
+    def _subtree_range(dirname: str) -> tuple[str, str]:
+        """Return the lex range of the directory index, for all names starting with 'dirname/'."""
+
+        dirname = key_encode(dirname.strip("/"))
+        # As '0' follows '/', 'dirname0' is the upper bound.
+        return f"[{dirname}/", f"({dirname}0"
+
+    def get_subtree(self, dirname: str, ptc_id: int) -> list[str]:
+        """Return all filenames (encoded) under the directory using the directory index.
+
+        Args:
+            dirname (str): directory name
+            ptc_id (int): owner participant's ID
+        """
+
+        self.ensure_dir_index(ptc_id)
+
+        index_key = self.redis_key.KEY_USER_DIR_INDEX.format(ptc_id=ptc_id)
+        return self.r.zrangebylex(index_key, *self._subtree_range(dirname))
+
+    def rename_directory(self, dirname: str, new_dirname: str, ptc_id: int) -> int:
+        """Rename all files under the directory atomically.
+
+        Args:
+            dirname (str): directory name to rename
+            new_dirname (str): new directory name
+            ptc_id (int): owner participant's ID
+
+        Returns:
+            int: the number of renamed files
+
+        Raises:
+            FileCRUDException: When files under the directory keep changing
+        """
+
+        dirname = key_encode(dirname.strip("/"))
+        new_dirname = key_encode(new_dirname.strip("/"))
+
+        # The script renames the files only if they are still all files under the directory.
+        for _ in range(TREE_SCRIPT_RETRIES):
+            names = [
+                (enc_filename, new_dirname + enc_filename[len(dirname) :])
+                for enc_filename in self.get_subtree(dirname, ptc_id)
+            ]
+            renamed = self._rename_files(ptc_id, names, subtree=self._subtree_range(dirname))
+            if renamed >= 0:
+                return renamed
+
+        raise FileCRUDException("디렉토리의 파일이 변경되고 있습니다. 잠시 후 다시 시도해주세요.")
+
+    def _rename_files(self, ptc_id: int, names: list[tuple[str, str]], subtree: tuple[str, str] = ("", "")) -> int:
+        """Rename files with their contents in one script. All keys are of the participant,
+        so that they are in one slot of Redis Cluster.
+
+        Args:
+            ptc_id (int): owner participant's ID
+            names (list[tuple[str, str]]): (encoded name, new encoded name) of each file
+            subtree (tuple[str, str], optional): lex range of the directory, if the files are all files
+                under the directory. Then, the files are renamed only if they are still so.
+
+        Returns:
+            int: the number of renamed files. -1 if files under the directory have changed.
+        """
+
+        keys = self._size_keys(ptc_id)
+        args = []
+        for enc_filename, new_enc_filename in names:
+            keys.append(self.redis_key.KEY_USER_FILE_CONTENT.format(ptc_id=ptc_id, hash=get_hashed(enc_filename)))
+            keys.append(self.redis_key.KEY_USER_FILE_CONTENT.format(ptc_id=ptc_id, hash=get_hashed(new_enc_filename)))
+            args.extend([enc_filename, new_enc_filename])
+
+        if not args:
+            return 0
+
+        renamed = _rename_tree(keys=keys, args=[*subtree, *args], client=self.r)
+        if renamed < 0:
+            return renamed
+
+        self.bump_tree_revision(ptc_id)
+        self.drop_file_revision(ptc_id, *map(get_hashed, args[::2]))
+        self.bump_file_revision(ptc_id, *map(get_hashed, args[1::2]))
+        self.move_file_type(ptc_id, dict(zip(map(get_hashed, args[::2]), map(get_hashed, args[1::2]))))
+        return renamed
+
+    def delete_directory(self, dirname: str, ptc_id: int) -> int:
+        """Delete all files under the directory atomically.
+
+        Args:
+            dirname (str): directory name to delete
+            ptc_id (int): owner participant's ID
+
+        Returns:
+            int: the number of deleted files
+
+        Raises:
+            FileCRUDException: When files under the directory keep changing
+        """
+
+        # The script deletes the files only if they are still all files under the directory.
+        for _ in range(TREE_SCRIPT_RETRIES):
+            keys = self._size_keys(ptc_id)
+            args = []
+            for enc_filename in self.get_subtree(dirname, ptc_id):
+                keys.append(self.redis_key.KEY_USER_FILE_CONTENT.format(ptc_id=ptc_id, hash=get_hashed(enc_filename)))
+                args.append(enc_filename)
+
+            if not args:
+                return 0
+
+            deleted = _delete_tree(keys=keys, args=[*self._subtree_range(dirname), *args], client=self.r)
+            if deleted >= 0:
+                break
+        else:
+            raise FileCRUDException("디렉토리의 파일이 변경되고 있습니다. 잠시 후 다시 시도해주세요.")
+
+        self.bump_tree_revision(ptc_id)
+        self.drop_file_revision(ptc_id, *map(get_hashed, args))
+        self.drop_file_type(ptc_id, *map(get_hashed, args))
+        return deleted
+
     def create_file(
         self,
         filename: str,
@@ -419,7 +943,7 @@ class RedisController:
             mark_directory (bool): whether to mark file's directory as directory by adding dummy key. Defaults to True.
         """
 
-        enc_filename = text_encode(filename)
+        enc_filename = key_encode(filename)
 
         if self.has_file(filename=enc_filename, ptc_id=ptc_id, encoded=True):
             raise FileAlreadyExistsException("이미 존재하는 파일입니다.")
@@ -431,27 +955,15 @@ class RedisController:
             self.mark_as_directory(filename=filename, ptc_id=ptc_id)
 
     def rename_file(self, filename: str, new_filename: str, ptc_id: int):
-        """Rename specific filename.
+        """Rename specific filename atomically, with its content.
 
-        1. Add new filename into file list
-        2. Remove previous one from file list
-        3. Rename previous file content key to new one
+        Args:
+            filename (str): filename to rename
+            new_filename (str): new filename
+            ptc_id (int): owner participant's ID
         """
 
-        enc_filename = text_encode(filename)
-        new_enc_filename = text_encode(new_filename)
-
-        prev_size = self.get_file_size_score(filename=enc_filename, ptc_id=ptc_id, encoded=True)
-
-        with RedisController(redis_key=self.redis_key, r_=self.r.pipeline()) as pipe:
-            # Add new filename into file list
-            pipe.append_file_list(filename=new_enc_filename, size=prev_size, ptc_id=ptc_id, encoded=True)
-
-            # Remove previous one from file list
-            pipe.pop_file_list(filename=enc_filename, ptc_id=ptc_id, encoded=True)
-
-            # Rename file content key
-            pipe._rename_file(filename=enc_filename, new_filename=new_enc_filename, ptc_id=ptc_id, hashed=False)
+        self._rename_files(ptc_id, [(key_encode(filename), key_encode(new_filename))])
 
     def mark_as_directory(self, filename: str, ptc_id: int):
         """Mark directory of filename as a directory by adding dummy file in the file list.
@@ -532,15 +1044,40 @@ class S3Controller:
         body: IOBase,
         bucket: str | None = None,
     ) -> str:
-        s3.put_object(body=body, key=object_key, bucket=bucket)
+        s3.upload_stream(body=body, key=object_key, bucket=bucket)
 
     @staticmethod
-    def get_s3_object_content(
+    def get_s3_object_range(
         object_key: str,
+        start: int,
+        end: int,
         bucket: str | None = None,
-    ) -> bytes:
-        obj = s3.get_object(object_key, bucket)
-        return obj["Body"].read()
+    ) -> tuple[bytes, int]:
+        """Return a byte range of S3 object.
+
+        Args:
+            object_key (str): S3 object key
+            start (int): first byte position
+            end (int): last byte position, inclusive
+            bucket (str | None, optional): bucket name. Defaults to None.
+
+        Raises:
+            ProjectFileException: When the range is not satisfiable
+
+        Returns:
+            tuple[bytes, int]: content in the range, and the total size of the object in bytes
+        """
+
+        try:
+            content, obj = s3.read_object(object_key, bucket, range=(start, end))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "InvalidRange":
+                raise ProjectFileException("파일 범위를 벗어났습니다.")
+            raise
+
+        # Content-Range: bytes 0-1023/146515
+        total = int(obj["ContentRange"].rsplit("/", 1)[1])
+        return content, total
 
     @staticmethod
     def delete_s3_object(
@@ -559,9 +1096,8 @@ class S3Controller:
     ):
         """Extract zip file from redis, and then store it into Redis
 
-        1. Download zipped template file from AWS S3
-        2. Extract it
-        3. Read all extracted files and save data to Redis
+        1. Download zipped file from AWS S3. Template is read from local cache if not modified.
+        2. Decompress each member and save data to Redis
             When a file size is more than limit, save the file to S3, and then
             store S3 object key in Redis instead of file content.
         ※ 파일 개수 혹은 용량 등에 대한 문제들은 업로드 시점에 처리해 줘야 함
@@ -572,89 +1108,133 @@ class S3Controller:
             overwrite (bool, optional): If the key already exists, do/don't overwrite. Defaults to True.
 
         Raises:
-            LessonTemplateException: When S3 object is not exists
-            LessonTemplateException: When extraction failed
+            ProjectObjectNotFoundException: When S3 object does not exist
+            ProjectFileException: When download or extraction failed
         """
 
         if ptc_id:
             object_key = object_key or self.s3_key.KEY_USER_PROJECT.format(ptc_id=ptc_id)
             r_list_key = self.redis_key.KEY_USER_FILE_LIST.format(ptc_id=ptc_id)
+            r_index_key = self.redis_key.KEY_USER_DIR_INDEX.format(ptc_id=ptc_id)
+            r_type_key = self.redis_key.KEY_USER_FILE_TYPE.format(ptc_id=ptc_id)
             r_file_key_func = lambda hash: self.redis_key.KEY_USER_FILE_CONTENT.format(ptc_id=ptc_id, hash=hash)
-            r_size_key = self.redis_key.KEY_USER_CUR_SIZE.format(ptc_id=ptc_id)
         else:
             r_list_key = self.redis_key.KEY_TEMPLATE_FILE_LIST
+            r_index_key = None
+            r_type_key = self.redis_key.KEY_TEMPLATE_FILE_TYPE
             r_file_key_func = lambda hash: self.redis_key.KEY_TEMPLATE_FILE_CONTENT.format(hash=hash)
-            r_size_key = None
-
-        # S3 에서 다운로드 후 Redis 에 저장
-        try:
-            zip_file = s3.get_object(object_key)
-        except ClientError:
-            sentry.exc()
-            raise ProjectFileException("프로젝트가 존재하지 않습니다.")
 
-        with tempfile.TemporaryDirectory() as tmp_dir:  # str
-            tmp_zip_fd, tmp_zip_path = tempfile.mkstemp(dir=tmp_dir)
-            os.write(tmp_zip_fd, zip_file["Body"].read())
-            os.fsync(tmp_zip_fd)  # Flush
+        # 최근에 존재하지 않았던 object 인 경우, 다시 요청하지 않는다.
+        missing_key = S3_MISSING_KEY.format(object_key=object_key)
+        if r.exists(missing_key):
+            raise ProjectObjectNotFoundException("프로젝트가 존재하지 않습니다.")
 
-            # 압축 해제
+        with ExitStack() as stack:
+            # S3 에서 다운로드. 존재 여부를 먼저 확인하지 않고, 404 를 처리한다.
+            # 템플릿은 여러 수업에서 공유되고 반복해서 사용되므로, 로컬 캐시를 사용한다.
             try:
-                unzip_dir = os.path.join(tmp_dir, "unzip")
-                os.mkdir(unzip_dir)
-                with zipfile.ZipFile(tmp_zip_path, "r") as zip_ref:
-                    zip_ref.extractall(unzip_dir)
-            except ValueError:  # extraction failed
+                if ptc_id:
+                    zip_ref = stack.enter_context(archive.download(object_key))
+                else:
+                    zip_ref = archive.template_cache.open(object_key)
+            except ClientError as e:
+                if s3.is_not_found(e):
+                    r.set(missing_key, 1, ex=S3_MISSING_TTL)
+                    raise ProjectObjectNotFoundException("프로젝트가 존재하지 않습니다.")
+                sentry.exc()
+                raise ProjectFileException("프로젝트를 불러올 수 없습니다.")
+            except (zipfile.BadZipFile, ValueError):  # extraction failed
                 sentry.exc()
                 raise ProjectFileException("프로젝트를 사용할 수 없습니다.")
 
-            # 임시 파일들을 모두 읽고, 각각 Redis 에 저장
-            for root, _, files in os.walk(unzip_dir):
-                # /tmp/asdf/project_root/file.py -> project_root/file.py
-                project_path = root.replace(unzip_dir, "").strip("/")  # Path from Project root
-
-                for unzipped_file in files:
-                    unzipped_file_path = os.path.join(root, unzipped_file)  # Absolute path
-                    project_file_path = os.path.join(project_path, unzipped_file)  # file path from project root
-                    enc_project_file_path = text_encode(project_file_path)
-                    hashed_name = get_hashed(enc_project_file_path)
-                    _r_file_key = r_file_key_func(hashed_name)
-
-                    # 파일 리스트 저장
-                    size = os.stat(unzipped_file_path).st_size
-                    r.zadd(r_list_key, {enc_project_file_path: size})
-
-                    # 기존 파일 사이즈 확인
-                    if r_size_key:
-                        old_size = r.strlen(_r_file_key) or 0
-
-                    # 파일 저장
-                    with open(unzipped_file_path, "rb") as fp:
-                        content: bytes = fp.read()
-
-                        # If no content, add one space to store it in Redis
-                        if size <= 0:
-                            content = self.redis_key.NEW_FILE_CONTENT
-
-                        if size <= SIZE_LIMIT:
-                            r.set(name=_r_file_key, value=content, ex=ttl, nx=not overwrite)
-                        else:
-                            # 파일이 너무 큰 경우, S3 에 해당 파일 업로드
-                            _bulk_file_key = self.s3_key.KEY_BULK_FILE.format(
-                                ptc_id=ptc_id or 0, filename=enc_project_file_path
-                            )
-
-                            if not s3.is_exists(_bulk_file_key):
-                                # S3 에 없는 경우, 해당 파일만 따로 업로드
-                                s3.put_object(fp, _bulk_file_key)
-
-                            # Redis 에 object path 저장
-                            r.set(name=_r_file_key, value=_bulk_file_key, ex=ttl)
-
-                    # 총 파일 사이즈 업데이트
-                    if r_size_key:
-                        r.incrby(r_size_key, size - old_size)
+            members = [member for member in zip_ref.infolist() if not member.is_dir()]
+            # file path from project root
+            enc_names = {member.filename: key_encode(member.filename.strip("/")) for member in members}
+            file_keys = {filename: r_file_key_func(get_hashed(enc_name)) for filename, enc_name in enc_names.items()}
+            # 파일 종류. 내용을 읽는 쪽에서 디코딩 여부를 미리 알 수 있도록 함께 저장한다.
+            file_types: dict[str, str] = {}
+            type_of = lambda binary: self.redis_key.FILE_TYPE_BINARY if binary else self.redis_key.FILE_TYPE_TEXT
+
+            # 압축 해제하며 각 파일을 Redis 에 저장. 큰 파일은 여러 스레드에서 미리 압축 해제하고,
+            # Redis 쓰기는 pipeline 으로 모아서 보낸다.
+            pipe = r.pipeline(transaction=False)
+            batch_bytes = 0
+            contents = archive.iter_contents(
+                zip_ref,
+                [member for member in members if member.file_size <= SIZE_LIMIT],
+                max_workers=settings.ARCHIVE_WORKERS,
+                parallel_threshold=settings.ARCHIVE_PARALLEL_THRESHOLD,
+            )
+            for member, content in contents:
+                # If no content, add one space to store it in Redis
+                if member.file_size <= 0:
+                    content = self.redis_key.NEW_FILE_CONTENT
+
+                pipe.set(name=file_keys[member.filename], value=content, ex=ttl, nx=not overwrite)
+                file_types[get_hashed(enc_names[member.filename])] = type_of(is_binary(content))
+                batch_bytes += len(content)
+                if batch_bytes >= settings.ARCHIVE_BATCH_BYTES:
+                    pipe.execute()
+                    batch_bytes = 0
+            pipe.execute()
+
+            # 파일이 너무 큰 경우, S3 에 해당 파일 업로드
+            for member in members:
+                if member.file_size <= SIZE_LIMIT:
+                    continue
+
+                _r_file_key = file_keys[member.filename]
+                _bulk_file_key = self.s3_key.KEY_BULK_FILE.format(
+                    ptc_id=ptc_id or 0, filename=text_encode(member.filename.strip("/"))
+                )
+
+                # Redis 에 이미 object path 가 있다면 업로드되어 있으므로 덮어쓰지 않는다.
+                # 그 외에는 S3 에 없는 경우에만 해당 파일만 따로 업로드
+                if overwrite or not r.exists(_r_file_key):
+                    if not s3.is_exists(_bulk_file_key):
+                        with zip_ref.open(member) as fp:
+                            s3.upload_stream(fp, _bulk_file_key)
+
+                    # 큰 파일은 앞부분만 보고 판단한다.
+                    with zip_ref.open(member) as fp:
+                        head = fp.read(BINARY_SNIFF_BYTES)
+                    file_types[get_hashed(enc_names[member.filename])] = type_of(is_binary(head, partial=True))
+
+                    # Redis 에 object path 저장
+                    r.set(name=_r_file_key, value=_bulk_file_key, ex=ttl)
+
+            # 파일 리스트 저장. 파일 내용이 모두 저장된 후에 추가한다.
+            # 사용자 파일 리스트는 총 파일 사이즈와 함께 Lua 스크립트로 갱신한다.
+            if members and ptc_id:
+                size_keys = RedisController(redis_key=self.redis_key, r_=r)._size_keys(ptc_id)
+                items = [(enc_names[member.filename], member.file_size) for member in members]
+                for chunk in chunks(items, SIZE_SCRIPT_BATCH):
+                    _add_files(
+                        keys=size_keys,
+                        args=[value for item in chunk for value in item],
+                        client=pipe,
+                    )
+            elif members:
+                pipe.zadd(r_list_key, {enc_names[member.filename]: member.file_size for member in members})
+
+            if overwrite:
+                if ptc_id:  # Types of files not in the archive are dropped.
+                    pipe.delete(r_type_key)
+                if file_types:
+                    pipe.hset(r_type_key, mapping=file_types)
+            else:
+                for hashed_name, file_type in file_types.items():
+                    pipe.hsetnx(r_type_key, hashed_name, file_type)
+            pipe.execute()
 
             # Set TTL
             if ttl:
                 r.expire(r_list_key, ttl)
+                r.expire(r_type_key, ttl)
+                if r_index_key:
+                    r.expire(r_index_key, ttl)
+
+            if ptc_id:
+                # Contents may be restored to older ones. Reset file revisions to be seeded again.
+                r.delete(self.redis_key.KEY_USER_FILE_REV.format(ptc_id=ptc_id))
+                RedisController(redis_key=self.redis_key, r_=r).bump_tree_revision(ptc_id)
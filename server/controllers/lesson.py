@@ -1,14 +1,14 @@
-from sqlalchemy import and_
 from sqlalchemy.orm import Session, joinedload
 
-from constants.ws import WSEvent, Room
-from server import sio
+from constants.ws import Room
 from server.controllers.course import CourseBaseController, CourseUserController
 from server.controllers.file import RedisController, S3Controller
+from server.controllers.roster import LessonRoster
 from server.models.course import Lesson, Participant, UserProject
 from server.websockets import session as ws_session
+from server.websockets.presence import presence
 from server.utils import serializer
-from server.helpers.cache import course_cache, lesson_cache
+from server.helpers.cache import TAG_LESSON, TAG_PTC, lesson_cache
 
 
 class LessonBaseController(CourseBaseController):
@@ -27,8 +27,14 @@ class LessonBaseController(CourseBaseController):
 
         self.redis_ctrl = RedisController(self.course_id, self.lesson_id)
         self.s3_ctrl = S3Controller(self.course_id, self.lesson_id, self.redis_ctrl.redis_key)
-
-    @lesson_cache.memoize(timeout=60)
+        self.roster = LessonRoster(self.course_id, self.lesson_id, self.redis_ctrl.redis_key, db=self.db)
+
+    @lesson_cache.memoize(
+        timeout=60,
+        stale_ttl=60,
+        key=lambda self, lesson_id: (lesson_id,),
+        tags=lambda lesson, self, lesson_id: [TAG_LESSON.format(lesson_id=lesson_id)],
+    )
     def get_lesson(self, lesson_id: int):
         return self.db.query(Lesson).options(joinedload(Lesson.file)).filter(Lesson.id == lesson_id).first()
 
@@ -44,24 +50,6 @@ class LessonBaseController(CourseBaseController):
 
         return self._lesson
 
-    @lesson_cache.memoize(timeout=60)
-    def get_all_participant(self) -> list[Participant, UserProject]:
-        """Return all participants and their projects in the course"""
-
-        return (
-            self.db.query(Participant, UserProject)
-            .filter(Participant.course_id == self.course_id)
-            .join(
-                UserProject,
-                and_(
-                    UserProject.participant_id == Participant.id,
-                    UserProject.lesson_id == self.lesson_id,
-                ),
-                isouter=True,
-            )
-            .all()
-        )
-
 
 class LessonUserController(CourseUserController, LessonBaseController):
     def __init__(
@@ -91,7 +79,12 @@ class LessonUserController(CourseUserController, LessonBaseController):
 
         return cls(user_id=user_id, course_id=course_id, lesson_id=lesson_id, db=db)
 
-    @lesson_cache.memoize(timeout=300)
+    @lesson_cache.memoize(
+        timeout=300,
+        stale_ttl=60,
+        key=lambda self, ptc_id: (ptc_id,),
+        tags=lambda proj, self, ptc_id: [TAG_PTC.format(ptc_id=ptc_id)],
+    )
     def get_proj_by_ptc_id(self, ptc_id: int) -> UserProject:
         return (
             self.db.query(UserProject)
@@ -117,7 +110,8 @@ class LessonUserController(CourseUserController, LessonBaseController):
         """Update Participant.active
 
         1. Change ``active``
-        2. If status changed, send broadcast message
+        2. If status changed, update the lesson roster and queue broadcast message.
+            Changes are coalesced by ``presence``.
         """
 
         toggled = self.my_participant.active != active
@@ -126,25 +120,12 @@ class LessonUserController(CourseUserController, LessonBaseController):
             self.my_participant.active = active
             self.db.add(self.my_participant)
             self.db.commit()
+            self.roster.update_member(self.my_participant, self.my_project)
 
+            # Broadcast the change with other changes in the lesson at once
             data = serializer.participant(self.my_participant, self.my_project)
             room = Room.LESSON.format(course_id=self.course_id, lesson_id=self.lesson_id)
-
-            await sio.emit(
-                WSEvent.PARTICIPANT_STATUS,
-                data=data,
-                room=room,
-                uuid=f"ptc-{self.my_participant.id}",
-            )
+            presence.push(room, prev_active=not active, data=data)
 
             # Invalidate cache
-            course_cache.delete_memoize(
-                CourseUserController.get_ptc_by_user_id,
-                self,  # alternative to CourseUserController object
-                self.my_participant.user_id,
-            )
-            course_cache.delete_memoize(
-                CourseUserController.get_ptc,
-                self,  # alternative to CourseUserController object
-                self.my_participant.id,
-            )
+            lesson_cache.invalidate_tags(TAG_PTC.format(ptc_id=self.my_participant.id))
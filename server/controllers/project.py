@@ -1,36 +1,63 @@
 from __future__ import annotations
 
+import datetime
 import io
 import os
+import time
 
-from sqlalchemy import and_
+from sqlalchemy import and_, case, tuple_
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
 
 from configs import settings
-from constants.redis import SIZE_LIMIT
-from constants.s3 import S3Key
-from server.controllers.lesson import LessonBaseController, LessonUserController
+from constants.redis import ACTIVITY_FLUSH_CHUNK, ACTIVITY_KEY, SIZE_LIMIT, RedisKey
+from constants.ws import FILE_READ_CHUNK, FILE_READ_MAX_CHUNK
+from server.controllers.lesson import LessonUserController
+from server.controllers.roster import LessonRoster
 from server.controllers.template import LessonTemplateController
-from server.helpers import s3
-from server.helpers.cache import ptc_cache, lesson_cache
+from server.helpers.cache import TAG_PROJECT, TAG_PTC, ptc_cache, lesson_cache
+from server.helpers.db import get_db
+from server.helpers.redis_ import r
 from server.models.course import PROJ_PERM, Participant, ProjectViewer, UserProject
 from server.models.feedback import CodeReference
-from server.utils.etc import text_decode, text_encode
+from server.utils import tree
+from server.utils.etc import key_encode, text_encode, utf8_trim
 from server.utils.exceptions import (
     FileAlreadyExistsException,
     ForbiddenProjectException,
     ParticipantNotFoundException,
     ProjectFileException,
     ProjectNotFoundException,
+    ProjectObjectNotFoundException,
     TotalSizeExceededException,
 )
-from server.utils.time_utils import utc_dt_now
 from server.websockets import session as ws_session
 
+# Remove activities whose scores are not newer than the given ones.
+# KEYS: ACTIVITY_KEY
+# ARGV: (member, score) of each activity
+_remove_flushed = r.register_script(
+    """
+local removed = 0
+for i = 1, #ARGV, 2 do
+    local score = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if score and tonumber(score) <= tonumber(ARGV[i + 1]) then
+        removed = removed + redis.call('ZREM', KEYS[1], ARGV[i])
+    end
+end
+return removed
+"""
+)
+
 
 class PingController(LessonUserController):
     async def update_recent_activity(self, target_ptc_id: int | None):
+        """Record activity on the target's project.
+
+        Only the timestamp is recorded into Redis here. ``flush_recent_activity`` writes
+        the recorded activities into DB at once periodically.
+        """
+
         if not target_ptc_id:
             target_ptc_id = self.my_participant.id
 
@@ -45,30 +72,74 @@ class PingController(LessonUserController):
 
             # Check permission and raise exception if no perm or other cases
             proj_file_ctrl.get_target_info(target_ptc_id, PROJ_PERM.READ)
+        elif not self.my_project:
+            # Accessing my project that has not been created yet
+            proj_ctrl = ProjectController(
+                course_id=self.course_id,
+                lesson_id=self.lesson_id,
+                user_id=self.user_id,
+                participant=self.my_participant,
+                db=self.db,
+            )
+            proj_ctrl.create_if_not_exists()
 
-            target_user_id = self.get_ptc(target_ptc_id).user_id
-        else:
-            # Accessing my project
-            target_user_id = self.user_id
-
-        target_proj_ctrl = ProjectController(
-            course_id=self.course_id,
-            lesson_id=self.lesson_id,
-            user_id=target_user_id,
-            db=self.db,
+        member = f"{self.course_id}:{self.lesson_id}:{target_ptc_id}"
+        r.zadd(ACTIVITY_KEY, {member: time.time()})
+
+        # Update the participant's status
+        await self.update_ptc_status(active=True)
+
+    @staticmethod
+    def flush_recent_activity() -> int:
+        """Write activities recorded by ``update_recent_activity`` into
+        ``UserProject.recent_activity_at`` and ``UserProject.active`` at once.
+
+        Returns:
+            int: the number of flushed activities
+        """
+
+        # Recorded activities are removed only after written into DB, not to lose them on failure
+        activities = r.zrange(ACTIVITY_KEY, 0, -1, withscores=True)
+        if not activities:
+            return 0
+
+        recent: dict[tuple[int, int, int], datetime.datetime] = {}
+        for member, ts in activities:
+            course_id, lesson_id, ptc_id = map(int, member.split(":"))
+            recent[(course_id, lesson_id, ptc_id)] = datetime.datetime.utcfromtimestamp(ts)
+
+        db = get_db()
+
+        # Projects that are going to be active. They should be updated in the lesson roster too.
+        activated: list[UserProject] = (
+            db.query(UserProject)
+            .filter(UserProject.active.is_(False))
+            .filter(tuple_(UserProject.lesson_id, UserProject.participant_id).in_([k[1:] for k in recent]))
+            .options(joinedload(UserProject.participant))
+            .all()
         )
 
-        if not target_proj_ctrl.my_project:
-            target_proj_ctrl.create_if_not_exists()
+        # A single UPDATE per chunk, setting each project's timestamp by CASE
+        for keys in tree.chunks(list(recent), ACTIVITY_FLUSH_CHUNK):
+            whens = [
+                (and_(UserProject.lesson_id == k[1], UserProject.participant_id == k[2]), recent[k]) for k in keys
+            ]
+            db.query(UserProject).filter(
+                tuple_(UserProject.lesson_id, UserProject.participant_id).in_([k[1:] for k in keys])
+            ).update({"recent_activity_at": case(*whens), "active": True}, synchronize_session=False)
+        db.commit()
 
-        target_proj_ctrl.my_project.recent_activity_at = utc_dt_now()
-        target_proj_ctrl.my_project.active = True
-        self.db.add(target_proj_ctrl.my_project)
+        # Remove the written activities, unless pinged again in the meantime
+        for chunk in tree.chunks(activities, ACTIVITY_FLUSH_CHUNK):
+            _remove_flushed(keys=[ACTIVITY_KEY], args=[v for activity in chunk for v in activity])
 
-        # Update the participant's status
-        await self.update_ptc_status(active=True)
+        for proj in activated:
+            proj.active = True
+            ptc = proj.participant
+            roster = LessonRoster(ptc.course_id, proj.lesson_id, RedisKey(ptc.course_id, proj.lesson_id))
+            roster.update_member(ptc, proj)
 
-        self.db.commit()
+        return len(recent)
 
 
 class ProjectController(LessonUserController):
@@ -79,9 +150,8 @@ class ProjectController(LessonUserController):
             self.db.add(self._project)
             self.db.flush()
 
-            lesson_cache.delete_memoize(LessonBaseController.get_all_participant, self)
-            lesson_cache.delete_memoize(LessonUserController.get_proj_by_ptc_id, self, self.my_participant.id)
-            lesson_cache.delete_memoize(ProjectFileController._ptc_info, self, self.my_participant.id)
+            self.roster.update_member(self.my_participant, self._project)
+            lesson_cache.invalidate_tags(TAG_PTC.format(ptc_id=self.my_participant.id))
 
         # 수업 템플릿 코드 적용
         if not self.my_project.template_applied:
@@ -94,132 +164,15 @@ class ProjectController(LessonUserController):
         self.db.commit()
         return self.my_project
 
-    @lesson_cache.memoize(timeout=300)
-    def _accessible_to(
-        self,
-        course_id: int,
-        ptc_id: int,
-        is_teacher: bool,
-    ) -> list[tuple[Participant, UserProject, ProjectViewer]]:
-        """Return user's accessible project owner list."""
-
-        if is_teacher:
-            # 선생인 경우, 전체 학생의 레코드 반환
-            # ProjectViewer 에서 권한을 명시할 수 있으므로, 이 테이블을 join
-            query = (
-                self.db.query(Participant, UserProject, ProjectViewer)
-                .filter(Participant.course_id == course_id)  # 자신이 속한 수업의 유저들
-                .filter(Participant.id != ptc_id)  # 자신 제외
-                .join(UserProject, UserProject.participant_id == Participant.id)  # 유저의 프로젝트
-                .join(
-                    ProjectViewer,
-                    and_(
-                        ProjectViewer.project_id == UserProject.id,
-                        ProjectViewer.viewer_id == ptc_id,
-                    ),
-                    isouter=True,
-                )  # 유저의 권한
-            )
-        else:
-            # 학생인 경우, ``ProjectViewer.viewer`` 값이 자기 자신인 레코드를 이용
-            query = (
-                self.db.query(Participant, UserProject, ProjectViewer)
-                .join(UserProject, UserProject.participant_id == Participant.id)  # 유저의 프로젝트
-                .join(ProjectViewer, ProjectViewer.project_id == UserProject.id)  # 유저의 권한
-                .filter(ProjectViewer.viewer_id == ptc_id)  # 자신이 볼 수 있는 프로젝트
-            )
-
-            # 학생인 경우, 항상 선생을 포함한다.
-            teacher_query = (
-                self.db.query(Participant, UserProject, ProjectViewer)
-                .filter(Participant.course_id == course_id)
-                .filter(Participant.role == Participant.KEY_TEACHER)
-                .join(UserProject, UserProject.participant_id == Participant.id)
-                .join(
-                    ProjectViewer,
-                    and_(
-                        ProjectViewer.project_id == UserProject.id,
-                        ProjectViewer.viewer_id == ptc_id,
-                    ),
-                    isouter=True,
-                )
-            )
-            query = query.union(teacher_query)
-
-        return query.all()
+    def accessible_to(self) -> list[tuple[dict, int | None]]:
+        """Return user's accessible project owners from the lesson roster."""
 
-    def accessible_to(self) -> list[tuple[Participant, UserProject, ProjectViewer]]:
-        return self._accessible_to(
-            self.course_id,
-            self.my_participant.id,
-            self.my_participant.is_teacher,
-        )
-
-    @lesson_cache.memoize(timeout=300)
-    def _accessed_by(
-        self,
-        course_id: int,
-        ptc_id: int,
-        project_id: int | None,
-        is_teacher: bool,
-    ) -> list[Participant, UserProject, ProjectViewer]:
-        """Return user list who can access my project"""
-
-        if not project_id:
-            return []
-
-        if is_teacher:
-            # 선생인 경우, 전체 학생의 레코드 반환.
-            # ProjectViewer 에서 권한을 명시할 수 있으므로, 이 테이블을 join
-            query = (
-                self.db.query(Participant, UserProject, ProjectViewer)
-                .filter(Participant.course_id == course_id)
-                .filter(Participant.id != ptc_id)
-                .join(UserProject, UserProject.participant_id == Participant.id)
-                .join(
-                    ProjectViewer,
-                    and_(
-                        ProjectViewer.viewer_id == Participant.id,
-                        ProjectViewer.project_id == project_id,
-                    ),
-                    isouter=True,
-                )
-            )
-        else:
-            # 학생인 경우, ``ProjectViewer.project_id`` 값이 자신의 프로젝트인 레코드 이용
-            query = (
-                self.db.query(Participant, UserProject, ProjectViewer)
-                .join(UserProject, UserProject.participant_id == Participant.id)
-                .join(ProjectViewer, ProjectViewer.viewer_id == Participant.id)
-                .filter(ProjectViewer.project_id == project_id)  # 자신의 프로젝트의 viewer
-            )
-
-            # 학생인 경우, 항상 선생을 포함한다.
-            teacher_query = (
-                self.db.query(Participant, UserProject, ProjectViewer)
-                .filter(Participant.course_id == course_id)
-                .filter(Participant.role == Participant.KEY_TEACHER)
-                .join(UserProject, UserProject.participant_id == Participant.id)
-                .join(
-                    ProjectViewer,
-                    and_(
-                        ProjectViewer.viewer_id == Participant.id,
-                        ProjectViewer.project_id == project_id,
-                    ),
-                    isouter=True,
-                )
-            )
-            query = query.union(teacher_query)
+        return self.roster.accessible_to(self.my_participant.id, self.my_participant.is_teacher)
 
-        return query.all()
+    def accessed_by(self) -> list[tuple[dict, int | None]]:
+        """Return users who can access my project from the lesson roster."""
 
-    def accessed_by(self) -> list[Participant, UserProject, ProjectViewer]:
-        return self._accessed_by(
-            self.course_id,
-            self.my_participant.id,
-            self.my_project.id if self.my_project else None,
-            self.my_participant.is_teacher,
-        )
+        return self.roster.accessed_by(self.my_participant.id, self.my_participant.is_teacher)
 
     def modify_project_permission(self, target_id: int, permission: int) -> None | ProjectViewer:
         """Create/Modify user's ProjectViewer record.
@@ -282,34 +235,10 @@ class ProjectController(LessonUserController):
         row.added = added
         row.removed = removed
 
-        # Invalidate cache related to the accessibility from the target user to me
-        lesson_cache.delete_memoize(
-            ProjectController._accessed_by,
-            self,
-            self.course_id,
-            self.my_participant.id,
-            self.my_project.id,
-            self.my_participant.is_teacher,
-        )
+        # Update the accessibility from the target user to me
+        self.roster.set_permission(self.my_project.id, target_id, row.permission)
 
-        # Invalidate cache related to the accessibility of the target user
-        target_ptc = self.get_ptc(target_id)
-        lesson_cache.delete_memoize(
-            ProjectController._accessible_to,
-            self,
-            self.course_id,
-            target_id,
-            target_ptc.is_teacher,
-        )
-
-        lesson_cache.delete_memoize(
-            ProjectFileController._check_permission,
-            self,  # alternative to ProjectFileController object
-            PROJ_PERM.ALL,  # ignored
-            target_ptc,
-            self.my_participant,
-            self.my_project,
-        )
+        lesson_cache.invalidate_tags(TAG_PROJECT.format(project_id=self.my_project.id))
 
         return row
 
@@ -320,7 +249,18 @@ class ProjectFileController(LessonUserController):
 
         return self.redis_ctrl.get_file_list(ptc_id=target_ptc.id, check_content=True)
 
-    @lesson_cache.memoize(timeout=60, ignore_args=["check_perm"])
+    @lesson_cache.memoize(
+        timeout=60,
+        key=lambda self, check_perm, viewer, target_ptc, target_proj: (
+            check_perm,
+            viewer.id,
+            target_ptc.id,
+            target_proj.id,
+        ),
+        tags=lambda allowed, self, check_perm, viewer, target_ptc, target_proj: [
+            TAG_PROJECT.format(project_id=target_proj.id)
+        ],
+    )
     def _check_permission(
         self,
         check_perm: PROJ_PERM,
@@ -348,7 +288,15 @@ class ProjectFileController(LessonUserController):
 
         return allowed
 
-    @lesson_cache.memoize(timeout=60)
+    @lesson_cache.memoize(
+        timeout=60,
+        stale_ttl=30,
+        key=lambda self, ptc_id: (ptc_id,),
+        tags=lambda info, self, ptc_id: [
+            TAG_PTC.format(ptc_id=ptc_id),
+            *([TAG_PROJECT.format(project_id=info[1].id)] if info[1] else []),
+        ],
+    )
     def _ptc_info(self, ptc_id: int) -> Participant:
         """Return ``ptc_id`` related ``Participant`` and its ``UserProject``"""
 
@@ -395,12 +343,86 @@ class ProjectFileController(LessonUserController):
 
         return target_ptc, target_proj
 
-    def get_dir_info(self, target_ptc_id: int) -> list[str]:
+    def get_dir_info(self, target_ptc_id: int, rev: int | None = None) -> tuple[int, list[str] | None]:
         """Return target user's file list (encoded)
 
         Args:
             target_ptc_id (int): participant ID that is the owner of the project
                                  the requester want to see.
+            rev (int | None, optional): revision of the tree the requester already has. Defaults to None.
+
+        Returns:
+            tuple[int, list[str] | None]: revision of the tree, and the file list.
+                The file list is None if ``rev`` is the current revision.
+        """
+
+        target_ptc = self._load_project(target_ptc_id)
+
+        # 파일 리스트보다 revision 을 먼저 읽는다. 그 사이에 변경되더라도, 다음 요청 시 다시 받게 된다.
+        cur_rev = self.redis_ctrl.get_tree_revision(target_ptc.id)
+        if rev == cur_rev:
+            return cur_rev, None
+
+        # 클라이언트에는 기존과 같이 인코딩된 파일명을 전달
+        project_files = self.redis_ctrl.get_file_list(ptc_id=target_ptc.id, check_content=True)
+        return cur_rev, [text_encode(name) for name in project_files]
+
+    def get_dir_tree(
+        self,
+        target_ptc_id: int,
+        path: str = "",
+        depth: int | None = None,
+        rev: int | None = None,
+    ) -> tuple[int, dict | None]:
+        """Return target user's directory tree with file sizes
+
+        Args:
+            target_ptc_id (int): participant ID that is the owner of the project
+            path (str, optional): directory to return. Defaults to "", project root.
+            depth (int | None, optional): max depth from ``path``. Deeper directories are
+                returned without their children. Defaults to None, no limit.
+            rev (int | None, optional): revision of the tree the requester already has. Defaults to None.
+
+        Raises:
+            ProjectFileException: When ``path`` does not exist
+
+        Returns:
+            tuple[int, dict | None]: revision of the tree, and the node of ``path``.
+                The node is None if ``rev`` is the current revision.
+        """
+
+        target_ptc = self._load_project(target_ptc_id)
+
+        cur_rev = self.redis_ctrl.get_tree_revision(target_ptc.id)
+        if rev == cur_rev:
+            return cur_rev, None
+
+        node = tree.find_node(self._get_dir_tree(target_ptc.id, cur_rev), path)
+        if node is None:
+            raise ProjectFileException("존재하지 않는 디렉터리입니다.")
+
+        return cur_rev, tree.limit_depth(node, depth)
+
+    @lesson_cache.memoize(timeout=600, key=lambda self, ptc_id, rev: (ptc_id, rev))
+    def _get_dir_tree(self, ptc_id: int, rev: int) -> dict:
+        """Build whole directory tree. As it is cached per revision of the tree,
+        the cache is never stale, and all subscribers of the project share it.
+        """
+
+        files = self.redis_ctrl.get_file_list_with_size(ptc_id)
+        return tree.build_tree(files, dir_mark=self.redis_ctrl.redis_key.DUMMY_DIR_MARK)
+
+    def _load_project(self, target_ptc_id: int) -> Participant:
+        """Check READ permission on target user's project, and make sure its files are in Redis.
+
+        Args:
+            target_ptc_id (int): participant ID that is the owner of the project
+
+        Raises:
+            ProjectFileException: When the saved project can not be loaded, e.g. a broken archive
+
+        Returns:
+            Participant: owner of the project
         """
 
         target_ptc, target_proj = self.get_target_info(target_ptc_id, PROJ_PERM.READ)
@@ -426,28 +448,107 @@ class ProjectFileController(LessonUserController):
             project_files = self._get_project_cached(target_ptc)
 
             if project_files:
-                return project_files
+                return target_ptc
 
             # 캐시 되어있지 않다면, S3 에서 유저의 프로젝트 다운로드
             try:
                 self.s3_ctrl.extract_to_redis(ptc_id=target_ptc.id)
-            except ProjectFileException:
-                pass  # File can non-exist.
+            except ProjectObjectNotFoundException:
+                pass  # Not saved yet. A broken archive is raised.
             self.redis_ctrl.set_total_file_size(target_ptc.id)
 
-        # 대상 프로젝트를 읽을 수 있다면, 저장소에서 가져온다.
-        return self.redis_ctrl.get_file_list(ptc_id=target_ptc.id, check_content=True)
+        return target_ptc
 
-    def get_file_content(self, owner_id: int, filename: str):
-        """Return file content from Redis.
-        When the file is in S3, download it and store into Redis before returning it.
+    def get_file_chunk(
+        self,
+        owner_id: int,
+        filename: str,
+        offset: int | None = None,
+        length: int | None = None,
+        rev: int | None = None,
+    ) -> tuple[int, dict | None]:
+        """Return a chunk of file content, read by byte range from Redis or S3.
+        Thus, memory used per read is bounded by ``length``.
+
+        If neither ``offset`` nor ``length`` is given, the whole file is returned, except that
+        bulk files stored in S3 are returned in chunks from the beginning.
+        A chunk of a text file never ends in the middle of a UTF-8 sequence, so it may be shorter than ``length``.
+        Request the next chunk at ``nextOffset``.
 
         Args:
             owner_id (int): owner ID of the file
             filename (str): filename to read
+            offset (int | None, optional): first byte position. Defaults to None.
+            length (int | None, optional): max bytes to read. Defaults to None.
+            rev (int | None, optional): revision of the file the requester already has.
+                It is only compared when reading from the beginning. Defaults to None.
+
+        Returns:
+            tuple[int, dict | None]: revision of the file, and the chunk, which is
+                {content, offset, length, total, nextOffset, binary}. nextOffset is None at the end.
+                The chunk is None if ``rev`` is the current revision.
         """
 
-        enc_filename = text_encode(filename)
+        target_ptc, enc_filename, size = self._locate_file(owner_id, filename)
+
+        cur_rev = self.redis_ctrl.get_file_revision(enc_filename, ptc_id=target_ptc.id, hashed=False)
+        if rev == cur_rev and not offset:
+            return cur_rev, None
+
+        bulk = size > SIZE_LIMIT
+        if offset is None and length is None and not bulk:
+            offset, length = 0, SIZE_LIMIT  # Whole file
+        else:
+            offset = max(0, offset or 0)
+            # 4 bytes at least, to contain one UTF-8 sequence.
+            length = max(4, min(length or FILE_READ_CHUNK, FILE_READ_MAX_CHUNK))
+        end = offset + length - 1
+
+        if bulk:
+            s3_object_key = self.redis_ctrl.get_bulk_object_key(filename=enc_filename, ptc_id=target_ptc.id, hashed=False)
+            data, total = self.s3_ctrl.get_s3_object_range(s3_object_key, offset, end)
+            file_type = self.redis_ctrl.get_file_type(filename=enc_filename, ptc_id=target_ptc.id, hashed=False)
+        else:
+            data, total, file_type = self.redis_ctrl.get_file_range(enc_filename, offset, end, ptc_id=target_ptc.id)
+
+        # 바이너리 파일은 디코딩하지 않고, 요청한 범위를 그대로 반환한다.
+        binary = file_type == RedisKey.FILE_TYPE_BINARY
+        if not binary and offset + len(data) < total:
+            data = utf8_trim(data)
+        next_offset = offset + len(data)
+
+        if binary:
+            content = data
+        else:
+            try:
+                content = data.decode()
+            except UnicodeDecodeError:  # Type is unknown
+                content, binary = data, True
+
+        return cur_rev, {
+            "content": content,
+            "offset": offset,
+            "length": len(data),
+            "total": total,
+            "nextOffset": next_offset if next_offset < total else None,
+            "binary": binary,
+        }
+
+    def _locate_file(self, owner_id: int, filename: str) -> tuple[Participant, str, int]:
+        """Check READ permission on the file, and make sure it is in Redis.
+
+        Args:
+            owner_id (int): owner ID of the file
+            filename (str): filename to read
+
+        Raises:
+            ProjectFileException: When the file does not exist, or the saved project can not be loaded
+
+        Returns:
+            tuple[Participant, str, int]: owner, encoded filename and the size in the file list
+        """
+
+        enc_filename = key_encode(filename)
         target_ptc, target_proj = self.get_target_info(owner_id, PROJ_PERM.READ)
 
         # File list 에 존재하는지 확인
@@ -455,30 +556,23 @@ class ProjectFileController(LessonUserController):
 
         # Redis 에 없는 경우
         if size is None:
-            # S3 에 유저별 코드 zip 파일이 존재하는지 확인. 없다면 에러 반환
-            s3_key = S3Key(self.course_id, self.lesson_id)
-            _user_project_key = s3_key.KEY_USER_PROJECT.format(ptc_id=target_ptc.id)
-            if not s3.is_exists(_user_project_key):
-                raise ProjectFileException("파일이 존재하지 않습니다.")
-
-            # 있다면 압축을 풀고 Redis 에 저장. 해당 UserProject 가 active 상태라면 TTL=0,
+            # S3 에서 유저별 코드 zip 파일을 받아 압축을 풀고 Redis 에 저장. 없다면 에러 반환
+            # 해당 UserProject 가 active 상태라면 TTL=0,
             # ~inactive 상태라면 TTL=3600 을 설정하여, Redis 메모리를 불필요하게 차지하지 않도록 한다.~
             #  -> 다른 유저가 수정하는 경우 activity ping 을 보내므로, S3 uploader (bg worker) 에게 맡기면 된다.
             ttl = None  # if target_proj.active else 3600
-            self.s3_ctrl.extract_to_redis(ptc_id=target_ptc.id, ttl=ttl, overwrite=False)
+            try:
+                self.s3_ctrl.extract_to_redis(ptc_id=target_ptc.id, ttl=ttl, overwrite=False)
+            except ProjectObjectNotFoundException:
+                raise ProjectFileException("파일이 존재하지 않습니다.")
 
             # 사이즈 다시 확인
             size = self.redis_ctrl.get_file_size_score(enc_filename, ptc_id=target_ptc.id, encoded=True)
 
-        # Redis 에서 반환
         if size is None or size < 0:
             raise ProjectFileException("파일이 존재하지 않습니다.")
-        elif 0 <= size < SIZE_LIMIT:  # 적당한 크기
-            return self.redis_ctrl.get_file(filename=enc_filename, ptc_id=target_ptc.id, hashed=False)
-        elif SIZE_LIMIT < size:  # Redis 임의 제한 초과
-            # AWS S3 에서 bulk file 다운로드, 반환
-            s3_object_key = self.redis_ctrl.get_file(filename=enc_filename, ptc_id=target_ptc.id, hashed=False)
-            return self.s3_ctrl.get_s3_object_content(s3_object_key).decode()
+
+        return target_ptc, enc_filename, size
 
     def create_file_or_dir(self, owner_id: int, type_: str, name: str):
         """Create file or directory at the owner's project.
@@ -545,12 +639,7 @@ class ProjectFileController(LessonUserController):
             if self.redis_ctrl.has_directory(dirname=rename, ptc_id=owner_id):
                 raise FileAlreadyExistsException("같은 이름의 폴더가 이미 존재합니다.")
 
-            enc_filenames = self.redis_ctrl.get_file_list(ptc_id=owner_id, check_content=False)
-            for enc_filename in enc_filenames:
-                filename = text_decode(enc_filename)
-                if filename.startswith(name):
-                    new_filename = filename.replace(name, rename, 1)
-                    self.redis_ctrl.rename_file(filename=filename, new_filename=new_filename, ptc_id=owner_id)
+            self.redis_ctrl.rename_directory(dirname=name, new_dirname=rename, ptc_id=owner_id)
 
             # code_references 참조 위치 변경
             for code_ref in code_refs:
@@ -592,23 +681,19 @@ class ProjectFileController(LessonUserController):
             if not self.redis_ctrl.has_directory(dirname=name, ptc_id=owner_id):
                 raise FileAlreadyExistsException("존재하지 않는 폴더입니다.")
 
-            enc_filenames = self.redis_ctrl.get_file_list(ptc_id=owner_id, check_content=False)
-            for enc_filename in enc_filenames:
-                filename = text_decode(enc_filename)
-                if filename.startswith(name):
-                    self.redis_ctrl.delete_file(filename=enc_filename, ptc_id=owner_id, encoded=True)
+            self.redis_ctrl.delete_directory(dirname=name, ptc_id=owner_id)
 
         else:  # file
             # 해당 파일 삭제
             if not self.redis_ctrl.has_file(filename=name, ptc_id=owner_id, encoded=False):
                 raise FileAlreadyExistsException("존재하지 않는 파일입니다.")
 
-            enc_filename = text_encode(name)
+            enc_filename = key_encode(name)
 
             # If bulk file, make sure to delete it from S3
             size = self.redis_ctrl.get_file_size_score(filename=name, ptc_id=owner_id, encoded=False)
             if size > SIZE_LIMIT:
-                object_key = self.redis_ctrl.get_file(filename=enc_filename, ptc_id=owner_id, hashed=False)
+                object_key = self.redis_ctrl.get_bulk_object_key(filename=enc_filename, ptc_id=owner_id, hashed=False)
                 self.s3_ctrl.delete_s3_object(object_key=object_key)
 
             # Delete file key
@@ -631,7 +716,7 @@ class ProjectFileController(LessonUserController):
             content (str): entire file content to save
         """
 
-        enc_filename = text_encode(file)
+        enc_filename = key_encode(file)
 
         # Check READ and WRITE permission. If denied, ForbiddenProjectException is raised.
         self.get_target_info(target_ptc_id=owner_id, check_perm=PROJ_PERM.READ & PROJ_PERM.WRITE)
@@ -655,10 +740,10 @@ class ProjectFileController(LessonUserController):
 
         # Save content
         if new_file_size > SIZE_LIMIT:
-            object_key = self.s3_ctrl.s3_key.KEY_BULK_FILE.format(ptc_id=owner_id, filename=enc_filename)
+            object_key = self.s3_ctrl.s3_key.KEY_BULK_FILE.format(ptc_id=owner_id, filename=text_encode(file))
 
-            # Save content in S3
-            self.s3_ctrl.put_s3_object(object_key, io.StringIO(content))
+            # Save content in S3. Encode once, and upload it in parts without copying the whole.
+            self.s3_ctrl.put_s3_object(object_key, io.BytesIO(content.encode()))
 
             # Save S3 object key in Redis
             self.redis_ctrl.store_file(filename=enc_filename, content=object_key, ptc_id=owner_id, hashed=False)
@@ -666,6 +751,5 @@ class ProjectFileController(LessonUserController):
             # Save content in Redis
             self.redis_ctrl.store_file(filename=enc_filename, content=content, ptc_id=owner_id, hashed=False)
 
-        # Update file size
+        # Update file size. Total file size is updated together.
         self.redis_ctrl.set_file_size(filename=enc_filename, size=new_file_size, ptc_id=owner_id, encoded=True)
-        self.redis_ctrl.increase_total_file_size(amount=new_file_size - prev_file_size, ptc_id=owner_id)
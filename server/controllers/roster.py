@@ -0,0 +1,193 @@
+import json
+from typing import Any
+
+from redis.client import Pipeline, StrictRedis
+from redis.cluster import ClusterPipeline, RedisCluster
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from constants.redis import ROSTER_TTL, RedisKey
+from server.helpers.redis_ import r
+from server.models.course import Participant, ProjectViewer, UserProject
+from server.utils import serializer
+
+# Update a roster hash only if the roster is already built (KEYS[1] exists).
+# Otherwise, the next read builds the whole roster from DB, including this change.
+# If ARGV[3] is "nx", the field is set only if it does not exist.
+_hset_if_built = r.register_script(
+    """
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl == -2 then
+    return 0
+end
+if ARGV[3] == 'nx' then
+    if redis.call('HSETNX', KEYS[2], ARGV[1], ARGV[2]) == 0 then
+        return 0
+    end
+else
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+end
+if ttl > 0 then
+    redis.call('PEXPIRE', KEYS[2], ttl)
+end
+return 1
+"""
+)
+
+
+class LessonRoster:
+    """Participants of a lesson with their projects and the permission edges between them.
+
+    The roster is built from DB once, stored in Redis, and updated incrementally whenever a
+    participant joins the lesson, its status changes, or a project permission changes.
+    Thus, reading it does not require any SQL.
+    """
+
+    def __init__(
+        self,
+        course_id: int,
+        lesson_id: int,
+        redis_key: RedisKey,
+        db: Session | None = None,
+        r_: StrictRedis | RedisCluster | Pipeline | ClusterPipeline = r,
+    ):
+        self.course_id = course_id
+        self.lesson_id = lesson_id
+        self.redis_key = redis_key
+        self.db = db
+        self.r = r_
+
+    @property
+    def member_key(self) -> str:
+        return self.redis_key.KEY_LESSON_ROSTER
+
+    @property
+    def perm_key(self) -> str:
+        return self.redis_key.KEY_LESSON_ROSTER_PERM
+
+    def build(self) -> tuple[dict[int, dict], dict[tuple[int, int], int]]:
+        """Build the roster from DB and store it into Redis.
+
+        Returns:
+            tuple[dict[int, dict], dict[tuple[int, int], int]]: members by participant ID,
+                and permissions by (project ID, viewer ID)
+        """
+
+        rows: list[tuple[Participant, UserProject]] = (
+            self.db.query(Participant, UserProject)
+            .filter(Participant.course_id == self.course_id)
+            .join(
+                UserProject,
+                and_(
+                    UserProject.participant_id == Participant.id,
+                    UserProject.lesson_id == self.lesson_id,
+                ),
+                isouter=True,
+            )
+            .all()
+        )
+        members = {ptc.id: serializer.roster_member(ptc, proj) for ptc, proj in rows}
+
+        perms = {}
+        project_ids = [member["project"]["id"] for member in members.values() if member["project"]]
+        if project_ids:
+            viewers: list[ProjectViewer] = (
+                self.db.query(ProjectViewer).filter(ProjectViewer.project_id.in_(project_ids)).all()
+            )
+            perms = {(pv.project_id, pv.viewer_id): pv.permission for pv in viewers}
+
+        pipe = self.r.pipeline()
+        pipe.delete(self.member_key)
+        pipe.delete(self.perm_key)
+        if perms:
+            pipe.hset(self.perm_key, mapping={f"{proj_id}:{viewer_id}": p for (proj_id, viewer_id), p in perms.items()})
+            pipe.expire(self.perm_key, ROSTER_TTL)
+        if members:
+            pipe.hset(self.member_key, mapping={ptc_id: json.dumps(m) for ptc_id, m in members.items()})
+            pipe.expire(self.member_key, ROSTER_TTL)
+        pipe.execute()
+
+        return members, perms
+
+    def load(self) -> tuple[dict[int, dict], dict[tuple[int, int], int]]:
+        """Return the roster from Redis. If not built yet, build it."""
+
+        pipe = self.r.pipeline()
+        pipe.hgetall(self.member_key)
+        pipe.hgetall(self.perm_key)
+        _members, _perms = pipe.execute()
+
+        if not _members:
+            return self.build()
+
+        members = {int(ptc_id): json.loads(m) for ptc_id, m in _members.items()}
+        perms = {}
+        for edge, p in _perms.items():
+            proj_id, viewer_id = edge.split(":")
+            perms[(int(proj_id), int(viewer_id))] = int(p)
+
+        return members, perms
+
+    def update_member(self, ptc: Participant, proj: UserProject | None):
+        """Update participant's data, such as its status or project"""
+
+        member = serializer.roster_member(ptc, proj)
+        _hset_if_built(keys=[self.member_key, self.member_key], args=[ptc.id, json.dumps(member)], client=self.r)
+
+    def add_member(self, ptc: Participant, proj: UserProject | None):
+        """Add participant if not in the roster, e.g. created outside of the server after the build"""
+
+        member = serializer.roster_member(ptc, proj)
+        _hset_if_built(keys=[self.member_key, self.member_key], args=[ptc.id, json.dumps(member), "nx"], client=self.r)
+
+    def set_permission(self, project_id: int, viewer_id: int, permission: int):
+        """Update a permission from ``viewer_id`` to ``project_id``"""
+
+        edge = f"{project_id}:{viewer_id}"
+        _hset_if_built(keys=[self.member_key, self.perm_key], args=[edge, permission], client=self.r)
+
+    def participants(self) -> list[dict[str, Any]]:
+        """Return all participants and their projects in the lesson"""
+
+        members, _ = self.load()
+        return [members[ptc_id] for ptc_id in sorted(members)]
+
+    def accessible_to(self, ptc_id: int, is_teacher: bool) -> list[tuple[dict[str, Any], int | None]]:
+        """Return members whose project ``ptc_id`` can access, with the permission if specified."""
+
+        members, perms = self.load()
+
+        result = []
+        for target_id in sorted(members):
+            member = members[target_id]
+            if target_id == ptc_id or not member["project"]:
+                continue
+
+            perm = perms.get((member["project"]["id"], ptc_id))
+            # 선생인 경우, 전체 학생. 학생인 경우, 권한이 명시된 유저와 선생.
+            if is_teacher or perm is not None or member["role"] == Participant.KEY_TEACHER:
+                result.append((member, perm))
+
+        return result
+
+    def accessed_by(self, ptc_id: int, is_teacher: bool) -> list[tuple[dict[str, Any], int | None]]:
+        """Return members who can access ``ptc_id``'s project, with the permission if specified."""
+
+        members, perms = self.load()
+
+        me = members.get(ptc_id)
+        if not me or not me["project"]:
+            return []
+
+        result = []
+        for viewer_id in sorted(members):
+            member = members[viewer_id]
+            if viewer_id == ptc_id or not member["project"]:
+                continue
+
+            perm = perms.get((me["project"]["id"], viewer_id))
+            # 선생인 경우, 전체 학생. 학생인 경우, 권한이 명시된 유저와 선생.
+            if is_teacher or perm is not None or member["role"] == Participant.KEY_TEACHER:
+                result.append((member, perm))
+
+        return result
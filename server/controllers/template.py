@@ -39,14 +39,15 @@ class LessonTemplateController(LessonBaseController):
             _hashed_name = get_hashed(enc_filename)
 
             content = self.redis_ctrl.get_file(filename=_hashed_name, hashed=True)
+            file_type = self.redis_ctrl.get_file_type(filename=_hashed_name, hashed=True)
             size = self.redis_ctrl.get_file_size_len(filename=_hashed_name, ptc_id=None, hashed=True)
 
             # 이미 동일한 파일명이 존재하는 경우, suffix 추가
             _name, _ext = os.path.splitext(enc_filename)
             dup_idx = 0
             while dup_idx < 100:  # Set max retry
-                if self.redis_ctrl.has_file(filename=enc_filename, ptc_id=ptc.id, encoded=False):
-                    enc_filename = f"{_name}_{dup_idx}.{_ext}"
+                if self.redis_ctrl.has_file(filename=enc_filename, ptc_id=ptc.id, encoded=True):
+                    enc_filename = f"{_name}_{dup_idx}{_ext}"
                     dup_idx += 1
                 else:
                     break
@@ -58,14 +59,10 @@ class LessonTemplateController(LessonBaseController):
             if dup_idx != 0:
                 _hashed_name = get_hashed(enc_filename)
 
-            # 파일명 리스트에 추가
+            # 파일명 리스트에 추가. 총 파일 사이즈도 함께 업데이트된다.
             self.redis_ctrl.append_file_list(filename=enc_filename, size=size, ptc_id=ptc.id, encoded=True)
 
-            # 기존 파일 사이즈 확인
-            old_size = self.redis_ctrl.get_file_size_len(filename=_hashed_name, ptc_id=ptc.id, hashed=True)
-
             # 파일 내용 저장
-            self.redis_ctrl.store_file(filename=_hashed_name, content=content, ptc_id=ptc.id, hashed=True)
-
-            # 총 파일 사이즈 업데이트
-            self.redis_ctrl.increase_total_file_size(amount=size - old_size, ptc_id=ptc.id)
+            self.redis_ctrl.store_file(
+                filename=_hashed_name, content=content, ptc_id=ptc.id, hashed=True, file_type=file_type
+            )
@@ -0,0 +1,309 @@
+import hashlib
+import io
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import zipfile
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, suppress
+from typing import Iterator
+
+from botocore.errorfactory import ClientError
+
+from configs import settings
+from server.helpers import s3
+
+
+class MappedFile(mmap.mmap):
+    """Read-only memory-mapped file usable as a file object of ``zipfile.ZipFile``"""
+
+    def seekable(self) -> bool:
+        return True
+
+
+def is_not_modified(e: ClientError) -> bool:
+    """Return True if the error is a response to a conditional request meaning "not modified"."""
+
+    return e.response.get("Error", {}).get("Code") in ("304", "NotModified")
+
+
+@contextmanager
+def download(object_key: str, bucket: str | None = None) -> Iterator[zipfile.ZipFile]:
+    """Download zip archive from S3, and open it.
+
+    The body is streamed in chunks. Small archives, up to ``ARCHIVE_SPOOL_MAX_BYTES``, are kept in
+    memory. Larger ones are spooled to a temporary file and memory-mapped, so that reading a member
+    holds only that member in memory.
+
+    Args:
+        object_key (str): S3 object key of the archive
+        bucket (str | None, optional): bucket name. Defaults to None.
+
+    Raises:
+        ClientError: When S3 request failed, e.g. the object does not exist
+        zipfile.BadZipFile: When the object is not a zip file
+    """
+
+    obj = s3.get_object(object_key, bucket)
+    chunks = obj["Body"].iter_chunks(chunk_size=settings.ARCHIVE_CHUNK_SIZE)
+
+    if obj["ContentLength"] <= settings.ARCHIVE_SPOOL_MAX_BYTES:
+        buf = io.BytesIO()
+        for chunk in chunks:
+            buf.write(chunk)
+
+        with zipfile.ZipFile(buf) as zip_ref:
+            yield zip_ref
+        return
+
+    with tempfile.TemporaryFile() as fp:
+        for chunk in chunks:
+            fp.write(chunk)
+        fp.flush()
+
+        with MappedFile(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm, zipfile.ZipFile(mm) as zip_ref:
+            yield zip_ref
+
+
+@contextmanager
+def _member_buffer(zip_ref: zipfile.ZipFile) -> Iterator[memoryview | None]:
+    """Yield zero-copy view of the whole archive, if it is in memory or memory-mapped."""
+
+    fp = zip_ref.fp
+    if isinstance(fp, mmap.mmap):
+        view = memoryview(fp)
+    elif isinstance(fp, io.BytesIO):
+        view = fp.getbuffer()
+    else:
+        yield None
+        return
+
+    try:
+        yield view
+    finally:
+        view.release()
+
+
+def read_member(buf: memoryview, info: zipfile.ZipInfo) -> bytes | None:
+    """Decompress a member directly from the archive buffer, without the lock of ``ZipFile``.
+    As zlib releases the GIL while decompressing, this can run in parallel threads.
+
+    Args:
+        buf (memoryview): whole archive
+        info (zipfile.ZipInfo): member to read
+
+    Raises:
+        zipfile.BadZipFile: When the member is corrupted
+
+    Returns:
+        bytes | None: content. None if the member is encrypted or its compression is not supported.
+    """
+
+    if info.flag_bits & 0x1 or info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+        return None
+
+    # Local file header has its own variable length fields.
+    offset = info.header_offset
+    header = struct.unpack(zipfile.structFileHeader, buf[offset : offset + zipfile.sizeFileHeader])
+    if header[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad magic number for file header: {info.filename}")
+    start = offset + zipfile.sizeFileHeader + header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH]
+    data = buf[start : start + info.compress_size]
+
+    if info.compress_type == zipfile.ZIP_STORED:
+        content = bytes(data)
+    else:
+        try:
+            content = zlib.decompress(data, -zlib.MAX_WBITS)
+        except zlib.error as e:
+            raise zipfile.BadZipFile(f"{e}: {info.filename}")
+
+    if zlib.crc32(content) != info.CRC:
+        raise zipfile.BadZipFile(f"Bad CRC-32 for file {info.filename}")
+
+    return content
+
+
+def iter_contents(
+    zip_ref: zipfile.ZipFile,
+    members: list[zipfile.ZipInfo],
+    max_workers: int = 1,
+    parallel_threshold: int = 0,
+) -> Iterator[tuple[zipfile.ZipInfo, bytes]]:
+    """Yield (member, content) in order. Members larger than ``parallel_threshold`` are decompressed
+    ahead in a thread pool, while the caller consumes the previous ones. At most ``max_workers * 2``
+    members are decompressed ahead, which bounds the memory.
+
+    Args:
+        zip_ref (zipfile.ZipFile): archive
+        members (list[zipfile.ZipInfo]): members to read
+        max_workers (int, optional): number of decompression threads. Defaults to 1, no thread.
+        parallel_threshold (int, optional): min compressed size to decompress in a thread. Defaults to 0.
+    """
+
+    def _read(buf: memoryview | None, info: zipfile.ZipInfo) -> bytes:
+        content = read_member(buf, info) if buf is not None else None
+        return content if content is not None else zip_ref.read(info)
+
+    with _member_buffer(zip_ref) as buf, ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        pending: deque[tuple[zipfile.ZipInfo, Future | bytes]] = deque()
+
+        for info in members:
+            if max_workers > 1 and info.compress_size >= parallel_threshold:
+                pending.append((info, pool.submit(_read, buf, info)))
+            else:
+                pending.append((info, _read(buf, info)))
+
+            while len(pending) > max_workers * 2 or (pending and not isinstance(pending[0][1], Future)):
+                done_info, result = pending.popleft()
+                yield done_info, result.result() if isinstance(result, Future) else result
+
+        while pending:
+            done_info, result = pending.popleft()
+            yield done_info, result.result() if isinstance(result, Future) else result
+
+
+class ArchiveCache:
+    """On-disk cache of zip archives in S3, keyed by the object key and its ETag.
+
+    An archive is downloaded once, and afterwards only validated by a conditional GET, which has
+    no body if the archive is not modified. Cached archives are memory-mapped, and their parsed
+    member index (``ZipFile``) is kept in memory, so reading members is a local read.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_open: int = 16):
+        """
+        Args:
+            directory (str): directory to store archives
+            max_bytes (int): max total size of stored archives. The least recently used are removed.
+            max_open (int, optional): max number of archives kept opened. Defaults to 16.
+        """
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_open = max_open
+
+        self._opened: OrderedDict[str, tuple[MappedFile, zipfile.ZipFile]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _meta_path(self, object_key: str) -> str:
+        return os.path.join(self.directory, hashlib.md5(object_key.encode()).hexdigest() + ".json")
+
+    def _read_meta(self, object_key: str) -> dict | None:
+        try:
+            with open(self._meta_path(object_key)) as fp:
+                meta = json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+        return meta if os.path.exists(meta["path"]) else None
+
+    def open(self, object_key: str, bucket: str | None = None) -> zipfile.ZipFile:
+        """Return the archive, downloading it only if it is not cached or modified.
+        The returned ``ZipFile`` is shared, so do not close it.
+
+        Args:
+            object_key (str): S3 object key of the archive
+            bucket (str | None, optional): bucket name. Defaults to None.
+
+        Raises:
+            ClientError: When S3 request failed, e.g. the object does not exist
+            zipfile.BadZipFile: When the object is not a zip file
+        """
+
+        meta = self._read_meta(object_key)
+        try:
+            obj = s3.get_object(object_key, bucket, if_none_match=meta["etag"] if meta else None)
+        except ClientError as e:
+            if not (meta and is_not_modified(e)):
+                raise
+
+            try:
+                os.utime(meta["path"])  # Mark as recently used
+                return self._open_local(meta["path"])
+            except FileNotFoundError:  # Evicted by another worker meanwhile
+                obj = s3.get_object(object_key, bucket)
+
+        path = self._store(object_key, obj)
+        return self._open_local(path)
+
+    def _store(self, object_key: str, obj: dict) -> str:
+        """Save downloaded archive into the directory, and return its path."""
+
+        etag = obj["ETag"]
+        name = hashlib.md5(f"{object_key}:{etag}".encode()).hexdigest()
+        path = os.path.join(self.directory, name + ".zip")
+
+        # Write into a temporary file, and then replace, so that other workers never see a partial file.
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                for chunk in obj["Body"].iter_chunks(chunk_size=settings.ARCHIVE_CHUNK_SIZE):
+                    fp.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        # Replace previous version
+        prev = self._read_meta(object_key)
+        meta_path = self._meta_path(object_key)
+        with open(meta_path + ".tmp", "w") as fp:
+            json.dump({"etag": etag, "path": path}, fp)
+        os.replace(meta_path + ".tmp", meta_path)
+        if prev and prev["path"] != path:
+            with suppress(FileNotFoundError):  # Removed by another worker
+                os.unlink(prev["path"])
+
+        self._evict(keep=path)
+        return path
+
+    def _open_local(self, path: str) -> zipfile.ZipFile:
+        with self._lock:
+            if path in self._opened:
+                self._opened.move_to_end(path)
+                return self._opened[path][1]
+
+            with open(path, "rb") as fp:
+                mm = MappedFile(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            zip_ref = zipfile.ZipFile(mm)  # Parse central directory once
+            self._opened[path] = (mm, zip_ref)
+
+            while len(self._opened) > self.max_open:
+                # Not closed, as other threads may be reading it. The mapping is released
+                # when no reader refers to it anymore.
+                self._opened.popitem(last=False)
+
+            return zip_ref
+
+    def _evict(self, keep: str):
+        """Remove the least recently used archives, except ``keep``, while the total size exceeds ``max_bytes``."""
+
+        archives = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".zip"):
+                stat = entry.stat()
+                archives.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in archives)
+        for _, size, path in sorted(archives):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            with suppress(FileNotFoundError):
+                os.unlink(path)  # Opened mappings remain valid until closed.
+            total -= size
+
+
+template_cache = ArchiveCache(
+    directory=settings.TEMPLATE_CACHE_DIR or os.path.join(tempfile.gettempdir(), "ide-template-cache"),
+    max_bytes=settings.TEMPLATE_CACHE_MAX_BYTES,
+)
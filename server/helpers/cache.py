@@ -1,20 +1,119 @@
+import asyncio
 import functools
 import hashlib
 import inspect
+import math
 import pickle
-from typing import Any, Callable
-
-import redis
+import random
+import time
+import uuid
+from typing import Any, Callable, Iterable, NamedTuple
 
 from configs import settings
 from server.helpers import sentry
-
-r = redis.StrictRedis.from_url(
-    settings.REDIS_URL,
-    db=settings.CACHE_REDIS_DB,
+from server.helpers.redis_ import ROLE_CACHE, get_client
+
+r = get_client(ROLE_CACHE)
+# For coroutine functions. Entries are shared with ``r``.
+ar = get_client(ROLE_CACHE, is_async=True)
+
+# Seconds between reads of an entry being computed by another caller. See ``Cache.memoize``.
+LOCK_POLL_INTERVAL = 0.02
+
+# Tags of cache entries. An entry depending on some data has its tag, and is deleted with the tag.
+TAG_KEY = "cache:tag:{tag}"  # SET: cache keys
+TAG_LESSON = "lesson:{lesson_id}"
+TAG_PTC = "ptc:{ptc_id}"
+TAG_PROJECT = "project:{project_id}"
+
+# Register a cache key to its tags. A tag lives at least as long as its entries.
+# KEYS: tag sets
+# ARGV: cache key, TTL of the entry (0 if none)
+_ADD_TO_TAGS_SCRIPT = """
+local ttl = tonumber(ARGV[2])
+for i = 1, #KEYS do
+    local created = redis.call('EXISTS', KEYS[i]) == 0
+    redis.call('SADD', KEYS[i], ARGV[1])
+    if ttl == 0 then
+        redis.call('PERSIST', KEYS[i])
+    else
+        -- A new set has no TTL yet. An existing set without TTL has an entry without TTL.
+        local cur = redis.call('TTL', KEYS[i])
+        if created or (cur ~= -1 and cur < ttl) then
+            redis.call('EXPIRE', KEYS[i], ttl)
+        end
+    end
+end
+return #KEYS
+"""
+_add_to_tags = r.register_script(_ADD_TO_TAGS_SCRIPT)
+_add_to_tags_async = ar.register_script(_ADD_TO_TAGS_SCRIPT)
+
+# Release a lock only if it is still held by the owner.
+# KEYS: lock
+# ARGV: owner token
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_release_lock = r.register_script(_RELEASE_LOCK_SCRIPT)
+_release_lock_async = ar.register_script(_RELEASE_LOCK_SCRIPT)
+
+# Delete all cache entries of the tags, and the tags themselves.
+# KEYS: tag sets
+_invalidate_tags = r.register_script(
+    """
+local deleted = 0
+for i = 1, #KEYS do
+    for _, key in ipairs(redis.call('SMEMBERS', KEYS[i])) do
+        deleted = deleted + redis.call('DEL', key)
+    end
+    redis.call('DEL', KEYS[i])
+end
+return deleted
+"""
 )
 
 
+class CacheEntry(NamedTuple):
+    """Memoized value with the metadata for early refresh"""
+
+    value: Any
+    delta: float  # seconds taken to compute the value
+    expires_at: float  # epoch seconds. After this, the value is stale.
+
+
+class KeySpec(NamedTuple):
+    """Metadata to build cache keys of a function, computed once when it is decorated"""
+
+    prefix: str  # cache:{module}:{qualname}
+    arg_names: tuple[str, ...]
+    has_self: bool
+    ignore_args: frozenset[str]
+    builder: Callable[..., Iterable[Any]] | None = None
+
+
+def should_refresh(entry: CacheEntry, beta: float = 1.0, now: float | None = None, rand: float | None = None) -> bool:
+    """Decide whether to recompute the entry before it expires (XFetch, probabilistic early expiration).
+
+    The closer to the expiration, and the longer the value takes to compute, the more likely
+    a caller refreshes it. Thus, usually one caller recomputes a hot entry before it expires,
+    instead of every caller at the moment of the expiration.
+
+    Args:
+        entry (CacheEntry): cached entry
+        beta (float, optional): > 1 refreshes earlier, < 1 later. 0 disables early refresh. Defaults to 1.0.
+        now (float | None, optional): current epoch seconds. Defaults to now.
+        rand (float | None, optional): uniform random number in (0, 1]. Defaults to a new one.
+    """
+
+    now = time.time() if now is None else now
+    rand = (1.0 - random.random()) if rand is None else rand
+    return now - entry.delta * beta * math.log(rand) >= entry.expires_at
+
+
 class Cache:
     def __init__(
         self,
@@ -29,6 +128,9 @@ class Cache:
         self.instance_attr_names = instance_attr_names
         self.log = lambda *args: print(*args) if settings.DEBUG else lambda _: _
 
+        # Calls of coroutine functions in progress, by cache key
+        self._inflight: dict[str, asyncio.Task] = {}
+
     def _dumps(self, value: Any) -> bytes:
         return pickle.dumps(value)
 
@@ -44,7 +146,7 @@ class Cache:
     def cached(self, timeout: int | None = None, key_prefix: str = ""):
         """Cache the decorated function. This method ignores the parameters passed to the function.
         Thus, all requests of the same function has same result. If parameter should be considered,
-        use ``memoized`` method instead.
+        use ``memoized`` method instead. Coroutine functions are supported too.
 
         Args:
             timeout (int | None, optional): Time to live in seconds. Defaults to None.
@@ -52,6 +154,29 @@ class Cache:
         """
 
         def wrapper(f: Callable):
+            if inspect.iscoroutinefunction(f):
+
+                @functools.wraps(f)
+                async def async_decorated(*args, **kwargs):
+                    cache_key = f"cache:{key_prefix}:{f.__module__}:{f.__qualname__}"
+                    self.log(cache_key)
+
+                    async def load():
+                        try:
+                            _result = await ar.get(cache_key)
+                            if _result is not None:
+                                return self._loads(_result)
+                        except:
+                            sentry.exc()
+
+                        _result = await f(*args, **kwargs)
+                        await ar.set(cache_key, self._dumps(_result), timeout)
+                        return _result
+
+                    return await self._coalesce(cache_key, load)
+
+                return async_decorated
+
             @functools.wraps(f)
             def decorated(*args, **kwargs):
                 cache_key = f"cache:{key_prefix}:{f.__module__}:{f.__qualname__}"
@@ -79,23 +204,38 @@ class Cache:
     def get_arg_names(f: Callable) -> list[str]:
         return [p.name for p in inspect.signature(f).parameters.values()]
 
-    def _make_param_key(self, f: Callable, ignore_args: list, *args, **kwargs):
+    def make_key_spec(
+        self,
+        f: Callable,
+        ignore_args: list | None = None,
+        key: Callable[..., Iterable[Any]] | None = None,
+    ) -> KeySpec:
+        arg_names = tuple(self.get_arg_names(f))
+        return KeySpec(
+            prefix=f"cache:{f.__module__}:{f.__qualname__}",
+            arg_names=arg_names,
+            has_self="self" in arg_names,
+            ignore_args=frozenset(ignore_args or []),
+            builder=key,
+        )
+
+    def _make_param_key(self, spec: KeySpec, *args, **kwargs) -> str:
         """Make key with parameters"""
 
-        # Remove args to ignore
-        arg_names = self.get_arg_names(f)
-        new_args = []
+        # Add instance attributes
         add = []
-        for _arg, _name in zip(args, arg_names):
-            if _name == "self":
-                # Add instance attributes
-                if self.instance_attr_names:
-                    for name in self.instance_attr_names:
-                        add.append(f"{getattr(args[0], name, None)}")
-                continue
+        if spec.has_self and args and self.instance_attr_names:
+            add = [f"{getattr(args[0], name, None)}" for name in self.instance_attr_names]
 
-            if _name not in ignore_args:
-                new_args.append(_arg)
+        # Stable parts from the key builder, such as IDs
+        if spec.builder:
+            parts = spec.builder(*args, **kwargs)
+            return ":".join([*add, *map(str, parts)])
+
+        # Remove args to ignore
+        new_args = [
+            _arg for _arg, _name in zip(args, spec.arg_names) if _name != "self" and _name not in spec.ignore_args
+        ]
 
         # Make key
         md5 = hashlib.md5()
@@ -103,45 +243,100 @@ class Cache:
 
         return md5.hexdigest()
 
+    def _build_key(self, spec: KeySpec, *args, **kwargs) -> str:
+        return f"{spec.prefix}:{self._make_param_key(spec, *args, **kwargs)}"
+
     def make_cache_key(self, f: Callable, ignore_args: list, *args, **kwargs):
-        param_key = self._make_param_key(f, ignore_args, *args, **kwargs)
-        return f"cache:{f.__module__}:{f.__qualname__}:{param_key}"
+        """Make cache key of a call. ``f`` can be either decorated or not."""
+
+        spec = getattr(f, "key_spec", None) or self.make_key_spec(f, ignore_args)
+        return self._build_key(spec, *args, **kwargs)
 
     def memoize(
         self,
         timeout: int | None = None,
         ignore_args: list | None = None,
+        tags: Callable[..., Iterable[str]] | None = None,
+        stale_ttl: int = 0,
+        beta: float = 1.0,
+        lock_timeout: int = 10,
+        key: Callable[..., Iterable[Any]] | None = None,
+        lock_wait: float = 0.2,
     ):
         """Memoize the decorated function considering its parameters
 
+        An entry is computed by one caller holding its lock at a time. It is refreshed early by one
+        caller with probability growing toward its expiration (see ``should_refresh``). While a caller
+        recomputes an entry, the others keep returning the cached value, even if it is stale for at
+        most ``stale_ttl`` seconds. If no value is cached, coroutine callers poll it for at most
+        ``lock_wait`` seconds, and then compute it themselves. Synchronous callers compute it at once,
+        as sleeping would block the event loop they run on.
+
+        Coroutine functions are memoized with the async Redis client, sharing entries with
+        synchronous callers of the same key.
+
         Args:
             timeout (int | None, optional): Time to live in seconds. Defaults to None.
-            key_prefix (str, optional): prefix of the cached key. Defaults to "".
+            ignore_args (list | None, optional): names of the parameters not considered. Defaults to None.
+            tags (Callable[..., Iterable[str]] | None, optional): function returning tags of an entry.
+                It is called with the result followed by the arguments of the decorated function,
+                e.g. ``lambda ptc, self, ptc_id: [TAG_PTC.format(ptc_id=ptc_id)]``. The entry is
+                deleted by ``invalidate_tags`` with any of its tags. Defaults to None.
+            stale_ttl (int, optional): seconds to serve the value after ``timeout`` while it is
+                being recomputed. Defaults to 0.
+            beta (float, optional): early refresh factor. 0 disables early refresh. Defaults to 1.0.
+            lock_timeout (int, optional): max seconds to hold the recompute lock. Defaults to 10.
+            key (Callable[..., Iterable[Any]] | None, optional): function returning stable parts of
+                the key, such as IDs, called with the arguments of the decorated function. If None,
+                the key is the hash of the reprs of the arguments. Defaults to None.
+            lock_wait (float, optional): max seconds for coroutine callers to wait for a missing entry
+                being computed by another caller. Defaults to 0.2.
         """
 
         def wrapper(f: Callable):
+            spec = self.make_key_spec(f, ignore_args, key)
+
+            if inspect.iscoroutinefunction(f):
+                decorated = self._memoize_async(f, spec, timeout, tags, stale_ttl, beta, lock_timeout, lock_wait)
+                decorated.ignore_args = ignore_args
+                decorated.key_spec = spec
+                return decorated
+
             @functools.wraps(f)
             def decorated(*args, **kwargs):
-                cache_key = self.make_cache_key(f, ignore_args, *args, **kwargs)
+                cache_key = self._build_key(spec, *args, **kwargs)
                 self.log(cache_key)
 
-                try:
-                    _result = r.get(cache_key)
-                    if _result is not None:
-                        self.log("# HIT")
-                        result = self._loads(_result)
-                        return result
-                except:
-                    sentry.exc()
+                entry = self._load_entry(cache_key)
+                if entry is not None:
+                    hit, value = self._check_entry(entry, timeout, beta)
+                    if hit:
+                        return value
 
-                # Note: return value ``None`` is not cached.
-                _result = f(*args, **kwargs)
-                result = self._dumps(_result)
-                r.set(cache_key, result, timeout)
+                # Compute holding the lock. If another caller is already computing, use its stale value.
+                # Without one, compute without waiting, not to block the event loop.
+                lock_token = self._acquire_lock(cache_key, lock_timeout)
+                if lock_token is None and entry is not None:
+                    self.log("# HIT (being refreshed)")
+                    return value
+
+                try:
+                    # Note: return value ``None`` is not cached.
+                    start = time.perf_counter()
+                    _result = f(*args, **kwargs)
+                    delta = time.perf_counter() - start
+
+                    self._store(cache_key, _result, timeout, delta, stale_ttl)
+                    if tags:
+                        self.add_tags(cache_key, tags(_result, *args, **kwargs), timeout and timeout + stale_ttl)
+                finally:
+                    if lock_token:
+                        _release_lock(keys=[f"{cache_key}:lock"], args=[lock_token], client=r)
 
                 return _result
-            
+
             decorated.ignore_args = ignore_args
+            decorated.key_spec = spec
 
             return decorated
 
@@ -150,6 +345,185 @@ class Cache:
 
         return wrapper
 
+    def _memoize_async(
+        self,
+        f: Callable,
+        spec: KeySpec,
+        timeout: int | None,
+        tags: Callable[..., Iterable[str]] | None,
+        stale_ttl: int,
+        beta: float,
+        lock_timeout: int,
+        lock_wait: float,
+    ) -> Callable:
+        """Coroutine version of ``memoize``. Keys and entries are the same as the sync version,
+        so both share entries. Concurrent calls of the same key in this process await one call.
+        """
+
+        @functools.wraps(f)
+        async def decorated(*args, **kwargs):
+            cache_key = self._build_key(spec, *args, **kwargs)
+            self.log(cache_key)
+
+            async def load():
+                entry = await self._load_entry_async(cache_key)
+                if entry is not None:
+                    hit, value = self._check_entry(entry, timeout, beta)
+                    if hit:
+                        return value
+
+                lock_token = await self._acquire_lock_async(cache_key, lock_timeout)
+                if lock_token is None:
+                    if entry is not None:
+                        self.log("# HIT (being refreshed)")
+                        return value
+
+                    found, value = await self._wait_for_entry_async(cache_key, lock_wait)
+                    if found:
+                        return value
+
+                try:
+                    start = time.perf_counter()
+                    _result = await f(*args, **kwargs)
+                    delta = time.perf_counter() - start
+
+                    await self._store_async(cache_key, _result, timeout, delta, stale_ttl)
+                    if tags:
+                        await self.add_tags_async(
+                            cache_key, tags(_result, *args, **kwargs), timeout and timeout + stale_ttl
+                        )
+                finally:
+                    if lock_token:
+                        await _release_lock_async(keys=[f"{cache_key}:lock"], args=[lock_token], client=ar)
+
+                return _result
+
+            return await self._coalesce(cache_key, load)
+
+        return decorated
+
+    async def _coalesce(self, cache_key: str, load: Callable) -> Any:
+        """Await ``load()``, or the call of the same key already in progress."""
+
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(load())
+            self._inflight[cache_key] = task
+
+            def _done(_):
+                if self._inflight.get(cache_key) is task:
+                    del self._inflight[cache_key]
+
+            task.add_done_callback(_done)
+
+        # A cancelled caller must not cancel the others awaiting the same call.
+        return await asyncio.shield(task)
+
+    def _load_entry(self, cache_key: str) -> Any:
+        """Return the stored entry, or None"""
+
+        try:
+            _result = r.get(cache_key)
+            if _result is not None:
+                return self._loads(_result)
+        except:
+            sentry.exc()
+        return None
+
+    async def _load_entry_async(self, cache_key: str) -> Any:
+        try:
+            _result = await ar.get(cache_key)
+            if _result is not None:
+                return self._loads(_result)
+        except:
+            sentry.exc()
+        return None
+
+    async def _wait_for_entry_async(self, cache_key: str, lock_wait: float) -> tuple[bool, Any]:
+        """Poll the entry computed by the lock holder for at most ``lock_wait`` seconds.
+
+        Returns:
+            tuple[bool, Any]: whether the entry is stored meanwhile, and its value
+        """
+
+        deadline = time.monotonic() + lock_wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            entry = await self._load_entry_async(cache_key)
+            if entry is not None:
+                self.log("# HIT (after waiting)")
+                return True, entry.value if isinstance(entry, CacheEntry) else entry
+        return False, None
+
+    def _check_entry(self, entry: Any, timeout: int | None, beta: float) -> tuple[bool, Any]:
+        """Return (whether to use the entry without refresh, cached value)"""
+
+        if not isinstance(entry, CacheEntry):  # Stored without metadata
+            self.log("# HIT")
+            return True, entry
+        if not timeout or not should_refresh(entry, beta):
+            self.log("# HIT")
+            return True, entry.value
+        return False, entry.value
+
+    def _make_entry(self, value: Any, timeout: int | None, delta: float) -> CacheEntry:
+        return CacheEntry(value, delta, time.time() + timeout if timeout else math.inf)
+
+    def _store(self, cache_key: str, value: Any, timeout: int | None, delta: float, stale_ttl: int = 0):
+        entry = self._make_entry(value, timeout, delta)
+        r.set(cache_key, self._dumps(entry), timeout and timeout + stale_ttl)
+
+    async def _store_async(self, cache_key: str, value: Any, timeout: int | None, delta: float, stale_ttl: int = 0):
+        entry = self._make_entry(value, timeout, delta)
+        await ar.set(cache_key, self._dumps(entry), timeout and timeout + stale_ttl)
+
+    def _acquire_lock(self, cache_key: str, lock_timeout: int) -> str | None:
+        """Return the owner token if the lock of the entry is acquired, or None"""
+
+        token = uuid.uuid4().hex
+        try:
+            if r.set(f"{cache_key}:lock", token, nx=True, ex=lock_timeout):
+                return token
+        except:
+            sentry.exc()
+        return None
+
+    async def _acquire_lock_async(self, cache_key: str, lock_timeout: int) -> str | None:
+        token = uuid.uuid4().hex
+        try:
+            if await ar.set(f"{cache_key}:lock", token, nx=True, ex=lock_timeout):
+                return token
+        except:
+            sentry.exc()
+        return None
+
+    def add_tags(self, cache_key: str, tags: Iterable[str], timeout: int | None = None):
+        """Register the cache entry to the tags"""
+
+        tag_keys = [TAG_KEY.format(tag=tag) for tag in tags]
+        if tag_keys:
+            _add_to_tags(keys=tag_keys, args=[cache_key, timeout or 0], client=r)
+
+    async def add_tags_async(self, cache_key: str, tags: Iterable[str], timeout: int | None = None):
+        tag_keys = [TAG_KEY.format(tag=tag) for tag in tags]
+        if tag_keys:
+            await _add_to_tags_async(keys=tag_keys, args=[cache_key, timeout or 0], client=ar)
+
+    def invalidate_tags(self, *tags: str) -> int:
+        """Delete all cache entries having any of the tags at once.
+        Entries are not needed to be known, unlike ``delete_memoize``.
+
+        Returns:
+            int: the number of deleted entries
+        """
+
+        if not tags:
+            return 0
+
+        deleted = _invalidate_tags(keys=[TAG_KEY.format(tag=tag) for tag in tags], client=r)
+        self.log("# INVALIDATE TAGS", tags, deleted)
+        return deleted
+
     def delete_memoize(self, f: Callable, *args, **kwargs):
         cache_key = self.make_cache_key(f, f.ignore_args, *args, **kwargs)
         self.log("# DELETE MEMOIZE", cache_key)
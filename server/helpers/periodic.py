@@ -0,0 +1,22 @@
+import asyncio
+from typing import Callable
+
+from server.helpers import sentry
+
+
+async def run_periodically(interval: float, func: Callable, *args, **kwargs):
+    """Call blocking ``func`` in a worker thread every ``interval`` seconds.
+    Exceptions are reported and do not stop the loop.
+
+    Args:
+        interval (float): seconds between calls
+        func (Callable): function to call
+    """
+
+    while True:
+        await asyncio.sleep(interval)
+
+        try:
+            await asyncio.to_thread(func, *args, **kwargs)
+        except Exception:
+            sentry.exc()
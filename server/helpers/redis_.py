@@ -1,16 +1,260 @@
+import time
+
 import redis
+import redis.asyncio
+from redis.client import NEVER_DECODE, Pipeline
+from redis.cluster import ClusterPipeline, RedisCluster
+from redis.exceptions import NoScriptError, RedisClusterException
 
 from configs import settings
+from server.utils import metrics
+
+# Roles of Redis clients. Each role has its own connection pool, sized by settings.
+# The data role is on Redis Cluster if REDIS_CLUSTER is set. See `constants.redis.RedisKey` for its keys.
+ROLE_DATA = "data"  # Project data, read models and locks
+ROLE_CACHE = "cache"  # Memoized results. See `server.helpers.cache`
+ROLE_PUBSUB = "pubsub"  # Message queue of Socket.IO servers. Only the asyncio client is used.
+
+
+def _role_options(role: str) -> dict:
+    """Connection options of the role"""
+
+    options = dict(health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL)
+    if role == ROLE_DATA:
+        options.update(
+            db=settings.REDIS_DB,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            decode_responses=True,
+            encoding_errors="surrogateescape",  # See `server.utils.etc.key_encode`
+        )
+    elif role == ROLE_CACHE:
+        options.update(db=settings.CACHE_REDIS_DB, max_connections=settings.CACHE_REDIS_MAX_CONNECTIONS)
+    elif role == ROLE_PUBSUB:
+        options.update(
+            db=settings.REDIS_DB,
+            max_connections=settings.PUBSUB_REDIS_MAX_CONNECTIONS,
+            socket_timeout=10,
+            socket_connect_timeout=10,
+        )
+    else:
+        raise ValueError(f"Unknown Redis role: {role}")
+    return options
+
+
+class _BlockingPool(redis.BlockingConnectionPool):
+    """Pool waiting up to ``REDIS_POOL_TIMEOUT`` for a free connection, instead of opening more.
+    Time to get a connection is recorded into ``redis.<role>.wait`` histogram."""
+
+    role = ""
+
+    def get_connection(self, command_name, *keys, **options):
+        with metrics.timed(f"redis.{self.role}.wait"):
+            return super().get_connection(command_name, *keys, **options)
+
+
+class _AsyncBlockingPool(redis.asyncio.BlockingConnectionPool):
+    """Asyncio version of ``_BlockingPool``"""
+
+    role = ""
+
+    async def get_connection(self, command_name, *keys, **options):
+        with metrics.timed(f"redis.{self.role}.wait"):
+            return await super().get_connection(command_name, *keys, **options)
+
+
+class _Pipeline(Pipeline):
+    """Records latency of a whole pipeline into ``redis.<role>.pipeline`` histogram"""
+
+    role = ""
+
+    def execute(self, raise_on_error=True):
+        with metrics.timed(f"redis.{self.role}.pipeline"):
+            return super().execute(raise_on_error)
+
+
+class InstrumentedRedis(redis.StrictRedis):
+    """Records latency of each command into ``redis.<role>.command`` histogram"""
+
+    role = ""
+
+    def execute_command(self, *args, **options):
+        with metrics.timed(f"redis.{self.role}.command"):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        pipe = _Pipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+        pipe.role = self.role
+        return pipe
+
+
+class InstrumentedAsyncRedis(redis.asyncio.StrictRedis):
+    """Asyncio version of ``InstrumentedRedis``, except pipelines"""
+
+    role = ""
+
+    async def execute_command(self, *args, **options):
+        with metrics.timed(f"redis.{self.role}.command"):
+            return await super().execute_command(*args, **options)
+
+
+class _ClusterPipeline(ClusterPipeline):
+    """Pipeline of ``InstrumentedRedisCluster``. Records latency like ``_Pipeline``, and loads
+    the registered scripts before executing, as ``ClusterPipeline`` does not load them."""
+
+    role = ""
+    client: "InstrumentedRedisCluster"
+
+    def execute(self, raise_on_error=True):
+        self.client.load_scripts()
+        try:
+            with metrics.timed(f"redis.{self.role}.pipeline"):
+                return super().execute(raise_on_error)
+        except NoScriptError:  # e.g. a node added to the cluster
+            self.client.scripts_loaded = False
+            raise
+
+
+class InstrumentedRedisCluster(RedisCluster):
+    """Redis Cluster client recording latency of each command, like ``InstrumentedRedis``.
+    Each node has its own pool of ``max_connections``, which does not wait for a free connection."""
+
+    role = ""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.scripts = []
+        self.scripts_loaded = False
+
+    def execute_command(self, *args, **kwargs):
+        with metrics.timed(f"redis.{self.role}.command"):
+            return super().execute_command(*args, **kwargs)
+
+    def register_script(self, script):
+        script = super().register_script(script)
+        self.scripts.append(script)
+        self.scripts_loaded = False
+        return script
+
+    def load_scripts(self):
+        """Load the registered scripts on all primaries, if not loaded yet."""
+
+        if self.scripts_loaded:
+            return
+        for script in self.scripts:
+            self.script_load(script.script)
+        self.scripts_loaded = True
+
+    def pipeline(self, transaction=None, shard_hint=None):
+        # Redis Cluster has no transaction across nodes, so ``transaction`` is ignored.
+        # Updates to be atomic are done by scripts, whose keys are in one slot.
+        if shard_hint:
+            raise RedisClusterException("shard_hint is deprecated in cluster mode")
+
+        pipe = _ClusterPipeline(
+            nodes_manager=self.nodes_manager,
+            commands_parser=self.commands_parser,
+            startup_nodes=self.nodes_manager.startup_nodes,
+            result_callbacks=self.result_callbacks,
+            cluster_response_callbacks=self.cluster_response_callbacks,
+            cluster_error_retry_attempts=self.cluster_error_retry_attempts,
+            read_from_replicas=self.read_from_replicas,
+            reinitialize_steps=self.reinitialize_steps,
+        )
+        pipe.role = self.role
+        pipe.client = self
+        return pipe
+
+
+_clients: dict[tuple[str, bool], InstrumentedRedis | InstrumentedAsyncRedis | InstrumentedRedisCluster] = {}
+
+
+def get_client(
+    role: str, is_async: bool = False
+) -> InstrumentedRedis | InstrumentedAsyncRedis | InstrumentedRedisCluster:
+    """Return the client of the role. Clients are created once per process, and share their pool.
+    The cluster client connects to the cluster when created, to discover its nodes.
+
+    Args:
+        role (str): one of ``ROLE_*``
+        is_async (bool, optional): whether to return the asyncio client. Defaults to False.
+            The asyncio client has a separate pool of the same size.
+
+    Raises:
+        ValueError: When the role is unknown, or the asyncio client of Redis Cluster is requested
+    """
+
+    client = _clients.get((role, is_async))
+    if client is not None:
+        return client
+
+    if role == ROLE_DATA and settings.REDIS_CLUSTER:
+        if is_async:
+            raise ValueError("Asyncio client of Redis Cluster is not supported.")
+
+        options = _role_options(role)
+        del options["db"]  # Redis Cluster has only DB 0.
+        del options["health_check_interval"]  # Not supported by RedisCluster
+        client = InstrumentedRedisCluster.from_url(settings.REDIS_URL, **options)
+        client.role = role
+        return _clients.setdefault((role, is_async), client)
+
+    pool_class, client_class = (
+        (_AsyncBlockingPool, InstrumentedAsyncRedis) if is_async else (_BlockingPool, InstrumentedRedis)
+    )
+    pool = pool_class.from_url(settings.REDIS_URL, timeout=settings.REDIS_POOL_TIMEOUT, **_role_options(role))
+    pool.role = role
+
+    client = client_class(connection_pool=pool)
+    client.role = role
+    return _clients.setdefault((role, is_async), client)
+
+
+def pool_stats() -> dict[str, dict]:
+    """Return connection usage of each pool created in this process.
+
+    - max: max connections of the pool
+    - created: connections opened so far
+    - in_use: connections taken out of the pool now
+    """
+
+    stats = {}
+    for (role, is_async), client in sorted(_clients.items()):
+        if isinstance(client, RedisCluster):  # A pool per node
+            for node in client.get_nodes():
+                if node.redis_connection is not None:
+                    stats[f"{role}:{node.name}"] = _pool_usage(node.redis_connection.connection_pool)
+        else:
+            stats[f"{role}.async" if is_async else role] = _pool_usage(client.connection_pool)
+    return stats
+
+
+def _pool_usage(pool: redis.ConnectionPool | redis.asyncio.ConnectionPool) -> dict:
+    if isinstance(pool, (redis.BlockingConnectionPool, redis.asyncio.BlockingConnectionPool)):
+        # The queue has idle connections, and None for each connection not opened yet.
+        created, in_use = len(pool._connections), pool.max_connections - pool.pool.qsize()
+    else:
+        created, in_use = pool._created_connections, len(pool._in_use_connections)
+    return {"max": pool.max_connections, "created": created, "in_use": in_use}
+
+
+def health() -> dict[str, dict]:
+    """PING each role on a sync client, and return whether it responded and the latency.
+    The pub/sub role is not included, as it has only the asyncio client of Socket.IO."""
+
+    result = {}
+    for role in (ROLE_DATA, ROLE_CACHE):
+        start = time.perf_counter()
+        try:
+            get_client(role).ping()
+        except redis.RedisError as e:
+            result[role] = {"ok": False, "error": str(e)}
+        else:
+            result[role] = {"ok": True, "latency": round((time.perf_counter() - start) * 1000, 3)}
+    return result
+
+
+r = get_client(ROLE_DATA)
 
-r = redis.StrictRedis.from_url(
-    settings.REDIS_URL,
-    db=settings.REDIS_DB,
-    decode_responses=True,
-)
-
-# :(
-r_bytes = redis.StrictRedis.from_url(
-    settings.REDIS_URL,
-    db=settings.REDIS_DB,
-    decode_responses=False,
-)
+# Options of a command to read its reply as bytes, on the same connection pool.
+# e.g. ``r.execute_command("GET", key, **RAW)``. Not applied to commands in a transaction.
+RAW = {NEVER_DECODE: []}
@@ -1,11 +1,45 @@
+import asyncio
+import functools
 from io import IOBase
+from typing import Callable
 
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.errorfactory import ClientError
 
 from configs import settings
+from server.utils import metrics
 
-_s3 = boto3.client("s3", region_name="ap-northeast-2")
+_s3 = boto3.client(
+    "s3",
+    region_name="ap-northeast-2",
+    # Local stand-in such as MinIO or moto server, e.g. http://127.0.0.1:9000
+    endpoint_url=settings.S3_ENDPOINT_URL or None,
+    config=Config(
+        # Pool is shared by the threads of AsyncS3 and multipart transfers.
+        max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+        retries={"mode": "adaptive", "max_attempts": settings.S3_MAX_ATTEMPTS},
+    ),
+)
+
+# Multipart upload. Each thread holds at most one part in memory.
+_transfer_config = TransferConfig(
+    multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+    multipart_chunksize=settings.S3_MULTIPART_CHUNKSIZE,
+    max_concurrency=settings.S3_MAX_CONCURRENCY,
+)
+
+
+def _timed(f: Callable) -> Callable:
+    """Record latency of the operation into ``s3.<function name>`` histogram"""
+
+    @functools.wraps(f)
+    def decorated(*args, **kwargs):
+        with metrics.timed(f"s3.{f.__name__}"):
+            return f(*args, **kwargs)
+
+    return decorated
 
 
 def _refine_key(key: str) -> str:
@@ -22,14 +56,40 @@ def _refine_key(key: str) -> str:
     return key.strip("/")
 
 
-def get_object(key: str, bucket: str | None = None):
+@_timed
+def get_object(
+    key: str,
+    bucket: str | None = None,
+    range: tuple[int, int] | None = None,
+    if_none_match: str | None = None,
+):
+    """Get S3 object.
+
+    Args:
+        key (str): S3 object key
+        bucket (str | None, optional): bucket name. Defaults to None.
+        range (tuple[int, int] | None, optional): (first, last) byte positions to get, inclusive.
+            Defaults to None, the whole object.
+        if_none_match (str | None, optional): ETag the caller has. If the object is not modified,
+            ClientError with code "304" is raised. Defaults to None.
+    """
+
     if not bucket:
         bucket = settings.S3_BUCKET
 
-    return _s3.get_object(Bucket=bucket, Key=_refine_key(key))
+    kwargs = {}
+    if range:
+        kwargs["Range"] = f"bytes={range[0]}-{range[1]}"
+    if if_none_match:
+        kwargs["IfNoneMatch"] = if_none_match
 
+    return _s3.get_object(Bucket=bucket, Key=_refine_key(key), **kwargs)
 
+
+@_timed
 def put_object(body: IOBase, key: str, bucket: str | None = None, acl="private"):
+    """Upload binary file object in a single request. The body is streamed, not read into memory."""
+
     if not bucket:
         bucket = settings.S3_BUCKET
 
@@ -38,10 +98,36 @@ def put_object(body: IOBase, key: str, bucket: str | None = None, acl="private")
         Bucket=bucket,
         Key=_refine_key(key),
         ACL=acl,
-        Body=body.read(),
+        Body=body,
     )
 
 
+@_timed
+def upload_stream(body: IOBase, key: str, bucket: str | None = None, acl="private"):
+    """Upload binary file object using managed transfer. Large objects are uploaded in parts
+    of ``S3_MULTIPART_CHUNKSIZE`` bytes concurrently, so memory used is bounded regardless of the size.
+    """
+
+    if not bucket:
+        bucket = settings.S3_BUCKET
+
+    body.seek(0)
+    return _s3.upload_fileobj(
+        body,
+        bucket,
+        _refine_key(key),
+        ExtraArgs={"ACL": acl},
+        Config=_transfer_config,
+    )
+
+
+def is_not_found(e: ClientError) -> bool:
+    """Return True if the error means that the object does not exist."""
+
+    return e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+
+@_timed
 def is_exists(key: str, bucket: str | None = None):
     if not bucket:
         bucket = settings.S3_BUCKET
@@ -53,8 +139,37 @@ def is_exists(key: str, bucket: str | None = None):
         return False
 
 
+@_timed
 def delete_object(key: str, bucket: str | None = None):
     if not bucket:
         bucket = settings.S3_BUCKET
 
     return _s3.delete_object(Bucket=bucket, Key=key)
+
+
+@_timed
+def read_object(key: str, bucket: str | None = None, range: tuple[int, int] | None = None) -> tuple[bytes, dict]:
+    """Get S3 object and read its whole body. Unlike ``get_object``, the latency includes the transfer.
+
+    Returns:
+        tuple[bytes, dict]: body, and the response without body
+    """
+
+    obj = get_object(key, bucket, range)
+    return obj.pop("Body").read(), obj
+
+
+class AsyncS3:
+    """Async facade of this module. Each call runs in a worker thread, sharing the pooled client,
+    so that it does not block the event loop.
+    """
+
+    @staticmethod
+    async def _run(func: Callable, *args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    async def put_object(self, body: IOBase, key: str, bucket: str | None = None, acl="private"):
+        return await self._run(put_object, body, key, bucket, acl)
+
+
+aio = AsyncS3()
@@ -69,11 +69,10 @@ class ProjectFileResp(BaseModel):
 async def get_project_file(course_id: int, lesson_id: int, ptc_id: int, db: Session = Depends(get_db_dep)):
     from server.controllers.file import RedisController
     from server.helpers.redis_ import r
-    from server.utils.etc import text_decode
 
     redis_ctrl = RedisController(course_id=course_id, lesson_id=lesson_id, r_=r)
-    enc_filenames = redis_ctrl.get_file_list(ptc_id)
+    filenames = redis_ctrl.get_file_list(ptc_id)
 
-    files = {text_decode(enc_filename): redis_ctrl.get_file(enc_filename, ptc_id, hashed=False) for enc_filename in enc_filenames}
+    files = {filename: redis_ctrl.get_file(filename, ptc_id, hashed=False) for filename in filenames}
 
     return files
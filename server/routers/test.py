@@ -8,11 +8,12 @@ from sqlalchemy.orm import Session, contains_eager, joinedload
 from configs import settings
 from server import templates
 from server.controllers.project import ProjectController
-from server.helpers import ecs
+from server.helpers import ecs, redis_
 from server.helpers.db import get_db_dep
 from server.models.course import Course, Lesson, Participant, ProjectViewer, PROJ_PERM, UserProject
 from server.models.test import TestConfig, TestContainer
 from server.models.user import User
+from server.utils import metrics
 from server.utils.etc import get_server_ident
 from server.utils.response import api_response
 
@@ -211,6 +212,10 @@ async def start_test(test_id: int, body: StartTestBody, db: Session = Depends(ge
 
     db.commit()
 
+    if test.target_ptc_id:
+        for tester in test.testers:
+            proj_ctrl.roster.set_permission(target_proj.id, tester.ptc_id, PROJ_PERM.ALL)
+
     return api_response(status_code=200)
 
 
@@ -292,3 +297,18 @@ async def stop_test(test_id: int, db: Session = Depends(get_db_dep)):
     db.commit()
 
     return api_response()
+
+
+@router.get("/metrics")
+def get_metrics():
+    """Return latency histograms of this server, such as S3 and Redis operations,
+    with usage of Redis connection pools and their health.
+    Not a coroutine, as the health check blocks on Redis."""
+
+    return api_response(
+        {
+            "server": get_server_ident(),
+            "histograms": metrics.snapshot(),
+            "redis": {"pools": redis_.pool_stats(), "health": redis_.health()},
+        }
+    )
@@ -10,8 +10,11 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session, joinedload
 
 from configs import settings
+from constants.redis import RedisKey
+from server.controllers.roster import LessonRoster
 from server.helpers import s3, sentry
 from server.helpers.db import get_db_dep
+from server.models.course import UserProject
 from server.models.test import TestConfig, TestContainer
 
 
@@ -70,6 +73,24 @@ class TestContainerResp(BaseModel):
         orm_mode = True
 
 
+def _add_to_roster(tester: TestContainer, db: Session):
+    """Add the tester's participant to the lesson roster.
+    Test accounts are created outside of the server, so they may not be in the roster yet."""
+
+    if not tester.participant:
+        return
+
+    config = tester.test_config
+    proj = (
+        db.query(UserProject)
+        .filter(UserProject.lesson_id == config.lesson_id)
+        .filter(UserProject.participant_id == tester.ptc_id)
+        .first()
+    )
+    roster = LessonRoster(config.course_id, config.lesson_id, RedisKey(config.course_id, config.lesson_id))
+    roster.add_member(tester.participant, proj)
+
+
 router = APIRouter(
     prefix="/admin/test",
 )
@@ -105,6 +126,8 @@ async def start_tester(body: StartTesterBody, db: Session = Depends(get_db_dep))
     db.add(tester)
     db.commit()
 
+    _add_to_roster(tester, db)
+
     return tester
 
 
@@ -138,8 +161,8 @@ async def end_tester(request: Request, db: Session = Depends(get_db_dep)):
 
     if body.log:
         task_id = body.task_arn.rsplit("/")[-1]
-        stream = io.StringIO(json.dumps(body.log))
-        s3.put_object(
+        stream = io.BytesIO(json.dumps(body.log).encode())
+        await s3.aio.put_object(
             stream,
             key=f"test/{tester.test_config.id}/{task_id}.json",
             bucket="together-coding-dev",
@@ -169,8 +192,8 @@ async def end_summary(body: EndSummaryBody, db: Session = Depends(get_db_dep)):
     # Upload to S3
     try:
         task_id = body.task_arn.rsplit("/")[-1]
-        stream = io.StringIO(json.dumps(body.summary))
-        s3.put_object(
+        stream = io.BytesIO(json.dumps(body.summary).encode())
+        await s3.aio.put_object(
             stream,
             key=f"test/{tester.test_config.id}/summary-{task_id}.json",
             bucket="together-coding-dev",
@@ -39,3 +39,74 @@ def text_decode(v: str | bytes) -> str:
 
 def text_decode_list(l: list[str | bytes]) -> list[str]:
     return [text_decode(item) for item in l]
+
+
+def key_encode(v: str | bytes) -> str:
+    """Encode filename to be used as a member or a part of a key in Redis.
+
+    Unlike ``text_encode``, the name is kept as it is, and stored as UTF-8 bytes. As the order of
+    UTF-8 bytes equals to the order of code points, lexical ordering of names is preserved, which
+    enables prefix and range queries such as ``ZRANGEBYLEX``. Bytes that are not valid UTF-8 are
+    mapped by ``surrogateescape``, and restored as they were when written to Redis.
+    """
+
+    if type(v) == str:
+        return v
+    elif type(v) == bytes:
+        return v.decode("utf-8", "surrogateescape")
+
+    raise TypeError("`v` must be str or bytes type.")
+
+
+def utf8_trim(data: bytes) -> bytes:
+    """Remove an incomplete UTF-8 sequence at the end of data, which is split by a byte range.
+    The removed bytes are at most 3, and they begin the next range.
+    """
+
+    for i in range(1, min(4, len(data)) + 1):
+        b = data[-i]
+        if b & 0xC0 == 0x80:  # Continuation byte
+            continue
+
+        if b >= 0xF0:
+            need = 4
+        elif b >= 0xE0:
+            need = 3
+        elif b >= 0xC0:
+            need = 2
+        else:
+            need = 1
+        return data[:-i] if need > i else data
+
+    return data
+
+
+def key_decode(v: str | bytes) -> str:
+    """Decode filename encoded by ``key_encode``"""
+
+    return key_encode(v)
+
+
+def is_binary(data: bytes | str, partial: bool = False) -> bool:
+    """Return True if data is not UTF-8 text. NUL bytes also mean binary.
+
+    Args:
+        data (bytes | str): whole content, or its beginning if ``partial``
+        partial (bool, optional): data may end in the middle of a UTF-8 sequence. Defaults to False.
+    """
+
+    if isinstance(data, str):
+        # Decoded with surrogateescape, e.g. by `key_encode`
+        data = data.encode("utf-8", "surrogateescape")
+
+    if partial:
+        data = utf8_trim(data)
+
+    if b"\x00" in data:
+        return True
+
+    try:
+        data.decode()
+    except UnicodeDecodeError:
+        return True
+    return False
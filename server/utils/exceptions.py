@@ -19,6 +19,11 @@ class ProjectFileException(BaseException):
     pass
 
 
+class ProjectObjectNotFoundException(ProjectFileException):
+    """The project archive does not exist in S3, e.g. the project has not been saved yet"""
+    pass
+
+
 class ParticipantNotFoundException(BaseException):
     pass
 
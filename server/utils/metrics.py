@@ -0,0 +1,75 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+# Upper bounds of latency buckets in milliseconds
+DEFAULT_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """In-process latency histogram. Thread-safe, as it is observed from worker threads too."""
+
+    def __init__(self, name: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # The last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Record a value in milliseconds"""
+
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> dict:
+        """Return cumulative counts per bucket, like Prometheus histogram."""
+
+        with self._lock:
+            counts = list(self.counts)
+            count, total = self.count, self.sum
+
+        cumulative = {}
+        acc = 0
+        for bound, n in zip([*self.buckets, "inf"], counts):
+            acc += n
+            cumulative[f"le_{bound}"] = acc
+
+        return {"count": count, "sum": round(total, 3), "buckets": cumulative}
+
+
+_histograms: dict[str, Histogram] = {}
+_lock = threading.Lock()
+
+
+def get_histogram(name: str) -> Histogram:
+    """Return the histogram of the name. Create one if not exists."""
+
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _lock:
+            histogram = _histograms.setdefault(name, Histogram(name))
+    return histogram
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """Observe elapsed time of the block in milliseconds, even if an exception is raised."""
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        get_histogram(name).observe((time.perf_counter() - start) * 1000)
+
+
+def snapshot() -> dict[str, dict]:
+    """Return snapshots of all histograms"""
+
+    return {name: histogram.snapshot() for name, histogram in sorted(_histograms.items())}
@@ -137,3 +137,105 @@ def comment(comment: Comment, writer_ptc: Participant | None = None) -> dict[str
         "updatedAt": iso8601(comment.updated_at),
         "deleted": comment.deleted,
     }
+
+
+def feedback_thread(fb: Feedback, acl: list[int]) -> dict[str, Any]:
+    """피드백 board 에 저장되는 피드백 스레드를 serialize. 댓글은 따로 저장된다.
+
+    Args:
+        fb (Feedback): feedback with its code reference
+        acl (list[int]): participant IDs who can see the feedback
+
+    Returns:
+        dict[str, Any]: serialized dict
+    """
+
+    ref = fb.code_reference
+    project = ref.project
+
+    _feedback = feedback(fb, None, acl)
+    _feedback["file"] = ref.file
+    _feedback["line"] = ref.line
+
+    return {
+        "owner": {
+            "ownerId": project.participant_id,
+            "ownerNickname": project.participant.nickname,
+            "projectId": project.id,
+        },
+        "ref": code_ref_simple(ref),
+        "feedback": _feedback,
+    }
+
+
+def roster_member(ptc: Participant, proj: UserProject | None) -> dict[str, Any]:
+    """수업 참여자 명단(roster)에 저장되는 데이터를 serialize
+
+    Args:
+        ptc (Participant): user's participant record
+        proj (UserProject | None): user's Project record in the lesson
+
+    Returns:
+        dict[str, Any]: serialized dict
+    """
+
+    data = {
+        "id": ptc.id,
+        "role": ptc.role,
+        "nickname": ptc.nickname,
+        "active": ptc.active,
+        "project": None,
+    }
+
+    if proj:
+        data["project"] = {
+            "id": proj.id,
+            "active": proj.active,
+            "created_at": iso8601(proj.created_at),
+        }
+
+    return data
+
+
+def roster_participant(member: dict[str, Any]) -> dict[str, Any]:
+    """Same as ``participant``, but from the roster member data"""
+
+    data = {
+        "id": member["id"],
+        "is_teacher": member["role"] == Participant.KEY_TEACHER,
+        "nickname": member["nickname"],
+        "active": member["active"],
+        "project": None,
+    }
+
+    if member["project"]:
+        data["project"] = {
+            "id": member["project"]["id"],
+            "created_at": member["project"]["created_at"],
+        }
+
+    return data
+
+
+def roster_accessible_user(
+    member: dict[str, Any],
+    perm: int | None,
+    default_perm: PROJ_PERM = 0,
+) -> dict[str, Any]:
+    """Same as ``accessible_user``, but from the roster member data
+
+    Args:
+        member (dict[str, Any]): 유저의 roster 데이터
+        perm (int | None): 유저의 타 유저 프로젝트 접근 권한
+        default_perm (PROJ_PERM): ``perm`` 값이 없을 때의 기본 권한
+    """
+
+    proj = member["project"]
+    return {
+        "userId": member["id"],  # Participant ID
+        "projectId": proj["id"] if proj else None,
+        "nickname": member["nickname"],
+        "role": member["role"],
+        "active": proj["active"] if proj else False,
+        "permission": perm if perm is not None else default_perm,
+    }
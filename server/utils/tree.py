@@ -0,0 +1,117 @@
+from typing import Any, Iterable, Iterator
+
+TYPE_FILE = "file"
+TYPE_DIR = "directory"
+
+
+def build_tree(files: Iterable[tuple[str, int]], dir_mark: str | None = None) -> dict[str, Any]:
+    """Build directory tree from flat file names and their sizes.
+
+    Each node is ``{"name", "type", "size"}``, and a directory node has ``children`` too.
+    Size of a directory is the sum of the sizes of its descendants. Children are sorted by
+    directories first, and then by name.
+
+    Args:
+        files (Iterable[tuple[str, int]]): (file path from project root, size) pairs
+        dir_mark (str | None, optional): name of dummy file marking an empty directory.
+            It makes the directory, but is not included in the tree. Defaults to None.
+
+    Returns:
+        dict[str, Any]: root directory node whose name is empty string
+    """
+
+    root = {"name": "", "type": TYPE_DIR, "size": 0, "children": {}}
+
+    for path, size in files:
+        *dirs, name = path.strip("/").split("/")
+        if name == dir_mark:
+            size = 0  # Only makes its directory
+
+        node = root
+        node["size"] += size
+        for dirname in dirs:
+            node = node["children"].setdefault(dirname, {"name": dirname, "type": TYPE_DIR, "size": 0, "children": {}})
+            node["size"] += size
+
+        if name != dir_mark:
+            node["children"][name] = {"name": name, "type": TYPE_FILE, "size": size}
+
+    return _sort(root)
+
+
+def _sort(node: dict[str, Any]) -> dict[str, Any]:
+    if node["type"] == TYPE_DIR:
+        children = sorted(node["children"].values(), key=lambda n: (n["type"] != TYPE_DIR, n["name"]))
+        node["children"] = [_sort(child) for child in children]
+    return node
+
+
+def find_node(tree: dict[str, Any], path: str) -> dict[str, Any] | None:
+    """Return the node of ``path`` in the tree, or None if not exists."""
+
+    node = tree
+    for name in filter(None, path.strip("/").split("/")):
+        if node["type"] != TYPE_DIR:
+            return None
+
+        for child in node["children"]:
+            if child["name"] == name:
+                node = child
+                break
+        else:
+            return None
+
+    return node
+
+
+def limit_depth(node: dict[str, Any], depth: int | None = None) -> dict[str, Any]:
+    """Return copy of the node whose descendants deeper than ``depth`` are cut off.
+    Directory cut off has ``children`` as None and ``count`` as the number of its children,
+    so that client can request it later.
+
+    Args:
+        node (dict[str, Any]): node to copy
+        depth (int | None, optional): max depth from the node. If None, no limit. Defaults to None.
+    """
+
+    if node["type"] == TYPE_FILE:
+        return node
+
+    result = {**node, "count": len(node["children"])}
+    if depth is not None and depth <= 0:
+        result["children"] = None
+    else:
+        result["children"] = [
+            limit_depth(child, None if depth is None else depth - 1) for child in node["children"]
+        ]
+    return result
+
+
+def flatten(node: dict[str, Any], prefix: str = "") -> Iterator[dict[str, Any]]:
+    """Yield descendants of the node as ``{"path", "type", "size"}``.
+    Parents are yielded before their children, so the tree can be rebuilt while receiving.
+    Directories cut off by ``limit_depth`` are yielded without their children.
+    """
+
+    for child in node.get("children") or []:
+        path = f"{prefix}/{child['name']}" if prefix else child["name"]
+        yield {"path": path, "type": child["type"], "size": child["size"]}
+
+        if child["type"] == TYPE_DIR:
+            yield from flatten(child, path)
+
+
+def chunks(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    """Split items into lists of at most ``size`` items. At least one list is yielded, even if empty."""
+
+    chunk = []
+    yielded = False
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            yielded = True
+            chunk = []
+
+    if chunk or not yielded:
+        yield chunk
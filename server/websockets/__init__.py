@@ -6,7 +6,7 @@ from fastapi import FastAPI
 
 from configs import settings
 from constants.ws import WS_MONITOR_EVENTS, Room, WSEvent
-from server.helpers.redis_ import r
+from server.helpers.redis_ import ROLE_PUBSUB, get_client, r
 from server.utils.etc import get_server_ident
 
 __all__ = [
@@ -21,9 +21,7 @@ __all__ = [
 
 
 def create_websocket(app: FastAPI, cors_allowed_origins: list | str):
-    message_queue = socketio.AsyncRedisManager(
-        f"{settings.REDIS_URL}/{settings.REDIS_DB}", redis_options=dict(socket_timeout=10, socket_connect_timeout=10)
-    )
+    message_queue = PubSubManager()
 
     kwargs = dict(
         cors_allowed_origins=cors_allowed_origins,
@@ -37,6 +35,19 @@ def create_websocket(app: FastAPI, cors_allowed_origins: list | str):
     return sio, socketio.ASGIApp(sio, app)
 
 
+class PubSubManager(socketio.AsyncRedisManager):
+    """``AsyncRedisManager`` on the client of the pub/sub role, instead of its own client.
+    Thus, its connections are taken from the bounded pool of the role, and counted by ``pool_stats``.
+    """
+
+    def _redis_connect(self):
+        # Called again after an error. The same PubSub reconnects its connection on the next
+        # subscribe, instead of leaving the broken one taken out of the pool.
+        self.redis = get_client(ROLE_PUBSUB, is_async=True)
+        if getattr(self, "pubsub", None) is None:
+            self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+
+
 class CompatibleAsyncServer(socketio.AsyncServer):
     """For compatibility with AsyncServerForMonitor"""
 
@@ -1,3 +1,5 @@
+import asyncio
+
 from constants.ws import Room, WSEvent
 from server import sio
 from server.controllers.project import ProjectFileController
@@ -78,7 +80,8 @@ async def file_save(sid: str, data: dict):
 
     try:
         proj_file_ctrl = await ProjectFileController.from_session(sid, get_db())
-        proj_file_ctrl.file_save(owner_id, file, content)
+        # bulk 파일은 S3 에 업로드하므로 이벤트 루프 밖에서 실행
+        await asyncio.to_thread(proj_file_ctrl.file_save, owner_id, file, content)
 
         # 해당 프로젝트 room 으로 전송
         target_room = Room.SUBS_PTC.format(
@@ -36,6 +36,9 @@ async def init_lesson(sid: str, data: dict):
 
     ptc = proj_ctrl.my_participant
 
+    # 서버 밖에서 생성된 참여자는 명단에 없을 수 있으므로 추가
+    proj_ctrl.roster.add_member(ptc, proj_ctrl.my_project)
+
     # active 상태로 변경
     await proj_ctrl.update_ptc_status(active=True)
 
@@ -61,16 +64,21 @@ async def init_lesson(sid: str, data: dict):
 
     # 자기 자신으로의 구독
     room_name = Room.SUBS_PTC.format(course_id=course_id, lesson_id=lesson_id, ptc_id=ptc.id)
-    await ws_session.enter_room(sid, room_type=WSEvent.SUBS_PARTICIPANT, new_room=room_name)
+    await ws_session.enter_room(sid, room_type=WSEvent.SUBS_PARTICIPANT, new_room=room_name, ident=ptc.id)
 
     # Read 권한이 있어서, 접근할 수 있는 유저들 구독
-    for target_ptc, _, _ in proj_ctrl.accessible_to():
+    for target, _ in proj_ctrl.accessible_to():
         room_name = Room.SUBS_PTC.format(
             course_id=course_id,
             lesson_id=lesson_id,
-            ptc_id=target_ptc.id,
+            ptc_id=target["id"],
+        )
+        await ws_session.enter_room(
+            sid,
+            room_type=WSEvent.SUBS_PARTICIPANT,
+            new_room=room_name,
+            ident=target["id"],
         )
-        await ws_session.enter_room(sid, room_type=WSEvent.SUBS_PARTICIPANT, new_room=room_name)
 
     await sio.emit(
         WSEvent.INIT_LESSON,
@@ -101,8 +109,8 @@ async def get_all_participant(sid: str, data: dict | None = None):
         db=get_db(),
     )
 
-    ptc_data = lesson_ctrl.get_all_participant()
-    resp = [serializer.participant(ptc, proj) for ptc, proj in ptc_data]
+    members = lesson_ctrl.roster.participants()
+    resp = [serializer.roster_participant(member) for member in members]
 
     if data.get("uuid"):
         resp = {"participants": resp}
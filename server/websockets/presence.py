@@ -0,0 +1,71 @@
+import asyncio
+from typing import Any
+
+from constants.ws import WSEvent
+from server import sio
+
+PRESENCE_WINDOW = 0.5  # seconds without a new change in the room before broadcasting the changes
+PRESENCE_MAX_DELAY = 2.0  # seconds to broadcast the changes at the latest, even if changes keep coming
+
+
+class PresenceAggregator:
+    """Coalesce participant status changes per room before broadcasting them.
+
+    Changes are sent once no change is pushed to the room for ``window`` seconds, or at the
+    latest ``max_delay`` seconds after the first one. Only the latest status of each participant
+    is sent, as a ``PARTICIPANT_STATUS`` event of its own. If a participant goes back to its
+    original status in the meantime (ex. flapping network), nothing is sent for it.
+    """
+
+    def __init__(self, window: float = PRESENCE_WINDOW, max_delay: float = PRESENCE_MAX_DELAY):
+        self.window = window
+        self.max_delay = max_delay
+
+        # room -> ptc_id -> (status before the first change, latest participant data)
+        self._pending: dict[str, dict[int, tuple[bool, dict[str, Any]]]] = {}
+        # room -> event loop time of the first pending change
+        self._started: dict[str, float] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def push(self, room: str, prev_active: bool, data: dict[str, Any]):
+        """Queue participant's status change
+
+        Args:
+            room (str): room to broadcast the change
+            prev_active (bool): participant's status before the change
+            data (dict[str, Any]): serialized participant data after the change
+        """
+
+        pending = self._pending.setdefault(room, {})
+        if data["id"] in pending:
+            prev_active = pending[data["id"]][0]
+        pending[data["id"]] = (prev_active, data)
+
+        # Restart the timer, but not later than ``max_delay`` from the first change
+        now = asyncio.get_running_loop().time()
+        started = self._started.setdefault(room, now)
+        delay = max(0.0, min(self.window, started + self.max_delay - now))
+
+        task = self._tasks.pop(room, None)
+        if task:
+            task.cancel()
+        self._tasks[room] = asyncio.create_task(self._flush_later(room, delay))
+
+    async def _flush_later(self, room: str, delay: float):
+        await asyncio.sleep(delay)
+        await self.flush(room)
+
+    async def flush(self, room: str):
+        """Broadcast the pending changes of the room"""
+
+        self._tasks.pop(room, None)
+        self._started.pop(room, None)
+        pending = self._pending.pop(room, {})
+
+        for prev_active, data in pending.values():
+            if data["active"] == prev_active:
+                continue
+            await sio.emit(WSEvent.PARTICIPANT_STATUS, data=data, room=room, uuid=f"ptc-{data['id']}")
+
+
+presence = PresenceAggregator()
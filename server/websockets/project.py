@@ -1,10 +1,12 @@
-from constants.ws import ROOM_TYPE, Room, WSEvent
+import asyncio
+
+from constants.ws import DIR_INFO_MAX_CHUNK, ROOM_TYPE, Room, WSEvent
 from server import sio
 from server.controllers.project import PingController, ProjectController, ProjectFileController
 from server.helpers import sentry
 from server.helpers.db import get_db
 from server.models.course import PROJ_PERM
-from server.utils import serializer
+from server.utils import serializer, tree
 from server.utils.exceptions import BaseException
 from server.utils.response import ws_error_response
 from server.websockets import session as ws_session
@@ -16,16 +18,11 @@ from server.websockets.decorators import in_lesson, requires
 async def get_ptc_subs_list(sid: str, data: None = None):
     """Return participants data that I am subscribing."""
 
-    rooms = await ws_session.get_room_list(sid, room_type=WSEvent.SUBS_PARTICIPANT)
-
-    subs_ptc_ids = []
-    for room in rooms:
-        ptc_id = room.rsplit(":", 1)[-1]
-        subs_ptc_ids.append(ptc_id)
+    subs_ptc_ids = await ws_session.get_room_idents(sid, room_type=WSEvent.SUBS_PARTICIPANT)
 
     await sio.emit(
         WSEvent.SUBS_PARTICIPANT_LIST,
-        {"participant_id": sorted(subs_ptc_ids)},
+        {"participant_id": sorted(str(ptc_id) for ptc_id in subs_ptc_ids)},
         to=sid,
         uuid=data.get("uuid"),
     )
@@ -60,7 +57,7 @@ async def subscribe_participant(sid: str, data: dict):
             proj_file_ctrl.get_target_info(target_ptc_id=ptc_id, check_perm=PROJ_PERM.READ)
 
             # Enter subs room
-            await ws_session.enter_room(sid, room_type=WSEvent.SUBS_PARTICIPANT, new_room=room_name)
+            await ws_session.enter_room(sid, room_type=WSEvent.SUBS_PARTICIPANT, new_room=room_name, ident=ptc_id)
             success_id.append(ptc_id)
         except BaseException as e:
             fail_reason[ptc_id] = e.error
@@ -149,12 +146,8 @@ async def project_accessible(sid: str, data=None):
     from_users = proj_ctrl.accessed_by()
 
     resp = {
-        "accessible_to": [
-            serializer.accessible_user(part, proj, perm, PROJ_PERM.READ) for part, proj, perm in to_users
-        ],
-        "accessed_by": [
-            serializer.accessible_user(part, proj, perm, PROJ_PERM.READ) for part, proj, perm in from_users
-        ],
+        "accessible_to": [serializer.roster_accessible_user(member, perm, PROJ_PERM.READ) for member, perm in to_users],
+        "accessed_by": [serializer.roster_accessible_user(member, perm, PROJ_PERM.READ) for member, perm in from_users],
     }
     await sio.emit(WSEvent.PROJECT_ACCESSIBLE, resp, to=sid, uuid=data.get("uuid"))
 
@@ -215,18 +208,65 @@ async def modify_project_permission(sid: str, data=None):
 @in_lesson
 async def get_dir_info(sid: str, data: dict | None = None):
     """``targetId` 에 해당하는 Participant 의 directory, file 리스트를 반환한다.
+    ``tree`` 가 true 인 경우, 파일 크기를 포함한 트리를 반환한다.
 
     data: {
         targetId: (int) target user's participant ID
+        tree: (bool, optional) return directory tree instead of encoded file list
+        path: (str, optional) directory to return. Defaults to project root.
+        depth: (int, optional) max depth from ``path``. Deeper directories have ``children`` as null.
+        chunkSize: (int, optional) stream the tree as flat entries in multiple messages
+        rev: (int, optional) revision of the tree the requester already has
+    }
+
+    response: {file: [...], rev}
+    response (not modified): {targetId, path, rev, notModified: true}
+    response (tree): {
+        targetId, path, rev,
+        tree: {name, type, size, count, children: [...]}
+    }
+    response (tree, chunked): {
+        targetId, path, rev, seq, last,
+        entries: [{path, type, size}, ...]  (parents first)
     }
     """
     target_id = data.get("targetId")
 
     try:
         proj_file_ctrl = await ProjectFileController.from_session(sid=sid, db=get_db())
-        files = proj_file_ctrl.get_dir_info(target_id)
 
-        await sio.emit(WSEvent.DIR_INFO, {"file": files}, to=sid, uuid=data.get("uuid"))
+        path = data.get("path", "").strip("/")
+        known_rev = data.get("rev")
+
+        if not data.get("tree"):
+            # S3 에서 프로젝트를 불러올 수 있으므로 이벤트 루프 밖에서 실행
+            rev, files = await asyncio.to_thread(proj_file_ctrl.get_dir_info, target_id, rev=known_rev)
+            if files is None:
+                resp = {"targetId": target_id, "path": path, "rev": rev, "notModified": True}
+            else:
+                resp = {"file": files, "rev": rev}
+            return await sio.emit(WSEvent.DIR_INFO, resp, to=sid, uuid=data.get("uuid"))
+
+        rev, node = await asyncio.to_thread(
+            proj_file_ctrl.get_dir_tree, target_id, path=path, depth=data.get("depth"), rev=known_rev
+        )
+        resp = {"targetId": target_id, "path": path, "rev": rev}
+        if node is None:
+            return await sio.emit(WSEvent.DIR_INFO, {**resp, "notModified": True}, to=sid, uuid=data.get("uuid"))
+
+        chunk_size = data.get("chunkSize")
+        if not chunk_size:
+            return await sio.emit(WSEvent.DIR_INFO, {**resp, "tree": node}, to=sid, uuid=data.get("uuid"))
+
+        chunk_size = max(1, min(int(chunk_size), DIR_INFO_MAX_CHUNK))
+        entry_chunks = list(tree.chunks(tree.flatten(node, path), chunk_size))
+        for seq, entries in enumerate(entry_chunks):
+            await sio.emit(
+                WSEvent.DIR_INFO,
+                {**resp, "seq": seq, "last": seq == len(entry_chunks) - 1, "entries": entries},
+                to=sid,
+                uuid=data.get("uuid"),
+            )
     except BaseException as e:
         return await sio.emit(WSEvent.DIR_INFO, ws_error_response(e.error), to=sid, uuid=data.get("uuid"))
     except Exception as e:
@@ -245,20 +285,39 @@ async def file_read(sid: str, data: dict):
     data: {
         ownerId: (int) owner user's participant ID
         file: (str) file name to read
+        rev: (int, optional) revision of the file the requester already has
+        offset: (int, optional) first byte position to read
+        length: (int, optional) max bytes to read
     }
+
+    Without ``offset`` and ``length``, the whole file is returned, but a bulk file is returned
+    in chunks. When ``nextOffset`` is not null, request the rest from ``nextOffset`` with the same
+    ``rev``. If ``rev`` of a chunk differs, the file has been modified while reading.
+
+    response: {ownerId, file, rev, content, offset, length, total, nextOffset}
+    response (not modified): {ownerId, file, rev, notModified: true}
     """
     owner_id = data.get("ownerId")
     file = data.get("file", "").strip("/")
 
     try:
         proj_file_ctrl = await ProjectFileController.from_session(sid=sid, db=get_db())
-        content = proj_file_ctrl.get_file_content(owner_id, file)
-        await sio.emit(
-            WSEvent.FILE_READ,
-            {"ownerId": owner_id, "file": file, "content": content},
-            to=sid,
-            uuid=data.get("uuid"),
+        # bulk 파일은 S3 에서 읽으므로 이벤트 루프 밖에서 실행
+        rev, chunk = await asyncio.to_thread(
+            proj_file_ctrl.get_file_chunk,
+            owner_id,
+            file,
+            offset=data.get("offset"),
+            length=data.get("length"),
+            rev=data.get("rev"),
         )
+
+        resp = {"ownerId": owner_id, "file": file, "rev": rev}
+        if chunk is None:
+            resp["notModified"] = True
+        else:
+            resp.update(chunk)
+        await sio.emit(WSEvent.FILE_READ, resp, to=sid, uuid=data.get("uuid"))
     except BaseException as e:
         return await sio.emit(WSEvent.FILE_READ, ws_error_response(e.error), to=sid, uuid=data.get("uuid"))
 
@@ -70,29 +70,45 @@ def get_ptc_sid(course_id: int, lesson_id: int, ptc_id: int) -> str | None:
     return list(sids.keys())[0] if sids else None
 
 
-async def enter_room(sid: str, room_type: str, new_room: str, limit: int | None = None):
-    """``room_type``별 최대 limit 개의 room 에 접속한다."""
+async def enter_room(
+    sid: str,
+    room_type: str,
+    new_room: str,
+    limit: int | None = None,
+    ident: Any = None,
+):
+    """``room_type``별 최대 limit 개의 room 에 접속한다.
+
+    Rooms are kept in an insertion-ordered dict (``room -> ident``) which works as an ordered set,
+    so that membership check and eviction of the oldest room are O(1).
+
+    Args:
+        sid (str): websocket session id
+        room_type (str): kind of room. Rooms are grouped by this value.
+        new_room (str): room name to enter
+        limit (int | None, optional): max number of rooms of ``room_type``. Defaults to None.
+        ident (Any, optional): identifier stored with the room (ex. subscribed participant ID). Defaults to None.
+    """
 
     # 기존에 접속한 room 을 가져온다.
     room_key = ROOM_TYPE.format(type=room_type)
-    rooms: list = await get(sid, room_key) or []
+    rooms: dict = await get(sid, room_key) or {}
 
     # If already enterred, do nothing.
     if new_room in rooms:
         return
 
-    # ``limit`` 을 초과한 경우, 개수를 조정해준다.
-    rooms_to_exit = []
-    if limit and len(rooms) >= limit:
-        rooms_to_exit.extend(rooms[-limit:])
-
-    for room in rooms_to_exit:
-        await exit_room(sid, room_type, room)
+    # ``limit`` 을 초과한 경우, 오래된 room 부터 나간다.
+    if limit:
+        while len(rooms) >= limit:
+            oldest = next(iter(rooms))
+            sio.leave_room(sid, oldest)
+            del rooms[oldest]
 
     # Enter new room
     sio.enter_room(sid, new_room)
 
-    rooms.append(new_room)
+    rooms[new_room] = ident
     await update(sid, {room_key: rooms})
 
 
@@ -100,8 +116,8 @@ async def exit_room(sid: str, room_type: str, room: str):
     """room 을 떠나고, ``room_type``에서 해당 room 을 제거한다."""
 
     # 기존에 접속한 room 을 가져온다.
-    room_key = f"room-{room_type}"
-    rooms: list = await get(sid, room_key) or []
+    room_key = ROOM_TYPE.format(type=room_type)
+    rooms: dict = await get(sid, room_key) or {}
 
     # If not enterred, do nothing.
     if room not in rooms:
@@ -110,10 +126,18 @@ async def exit_room(sid: str, room_type: str, room: str):
     # Exit room
     sio.leave_room(sid, room)
 
-    rooms.remove(room)
+    del rooms[room]
     await update(sid, {room_key: rooms})
 
 
 async def get_room_list(sid: str, room_type: str) -> list[str]:
-    room_type = ROOM_TYPE.format(type=room_type)
-    return (await get(sid, key=room_type)) or []
+    room_key = ROOM_TYPE.format(type=room_type)
+    return list((await get(sid, key=room_key)) or {})
+
+
+async def get_room_idents(sid: str, room_type: str) -> list[Any]:
+    """Return identifiers stored with the rooms of ``room_type`` by ``enter_room``"""
+
+    room_key = ROOM_TYPE.format(type=room_type)
+    rooms: dict = (await get(sid, key=room_key)) or {}
+    return [ident for ident in rooms.values() if ident is not None]
@@ -0,0 +1,51 @@
+import boto3
+import fakeredis
+import fakeredis.aioredis
+import pytest
+from moto import mock_s3
+
+from server.helpers import cache, s3
+
+BUCKET = "test-bucket"
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    """Bucket on moto, the in-memory stand-in of S3"""
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    # Recent botocore sends checksums in aws-chunked bodies by default, which moto does not decode
+    monkeypatch.setenv("AWS_REQUEST_CHECKSUM_CALCULATION", "when_required")
+
+    with mock_s3():
+        # The module client is created on import, before the mock. Use a client on the mock instead.
+        client = boto3.client("s3", region_name="ap-northeast-2")
+        client.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": "ap-northeast-2"})
+        monkeypatch.setattr(s3, "_s3", client)
+        yield BUCKET
+
+
+@pytest.fixture
+def cache_redis(monkeypatch):
+    """Redis of ``server.helpers.cache`` on fakeredis. Sync and asyncio clients share the data."""
+
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeStrictRedis(server=server)
+    monkeypatch.setattr(cache, "r", client)
+    monkeypatch.setattr(cache, "ar", fakeredis.aioredis.FakeRedis(server=server))
+    return client
+
+
+@pytest.fixture
+def file_redis(monkeypatch):
+    """Redis of ``server.controllers.file`` on fakeredis"""
+
+    from server.controllers import file
+
+    client = fakeredis.FakeStrictRedis()
+    monkeypatch.setattr(file, "r", client)
+    # fakeredis has no redis.replicate_commands, which newer Redis does not need either
+    script = file._bump_revision.script.replace("redis.replicate_commands()", "")
+    monkeypatch.setattr(file, "_bump_revision", client.register_script(script))
+    return client
@@ -0,0 +1,63 @@
+import io
+import os
+import zipfile
+
+from server.helpers import s3
+from server.helpers.archive import ArchiveCache
+
+
+def _put_zip(bucket: str, key: str, files: dict[str, bytes]):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zip_ref:
+        for name, content in files.items():
+            zip_ref.writestr(name, content)
+    s3.put_object(buf, key=key, bucket=bucket)
+
+
+def test_archive_cache(bucket, tmp_path, monkeypatch):
+    cache = ArchiveCache(str(tmp_path), max_bytes=1024 * 1024)
+    _put_zip(bucket, "tmpl.zip", {"main.py": b"v1"})
+
+    zip_ref = cache.open("tmpl.zip", bucket)
+    assert zip_ref.read("main.py") == b"v1"
+
+    # Not modified: no body is downloaded, and the parsed archive is reused
+    get_object = s3.get_object
+    responses = []
+    monkeypatch.setattr(s3, "get_object", lambda *a, **kw: responses.append(kw) or get_object(*a, **kw))
+    assert cache.open("tmpl.zip", bucket) is zip_ref
+    assert responses[-1]["if_none_match"]
+
+    # Modified
+    _put_zip(bucket, "tmpl.zip", {"main.py": b"v2"})
+    assert cache.open("tmpl.zip", bucket).read("main.py") == b"v2"
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".zip")]) == 1
+
+
+def test_archive_cache_removed(bucket, tmp_path):
+    cache = ArchiveCache(str(tmp_path), max_bytes=1024 * 1024)
+    _put_zip(bucket, "tmpl.zip", {"main.py": b"v1"})
+    cache.open("tmpl.zip", bucket)
+
+    # Another worker removed the archive after this one read its metadata
+    meta = cache._read_meta("tmpl.zip")
+    cache._opened.clear()
+    cache._read_meta = lambda object_key: meta
+    os.unlink(meta["path"])
+
+    assert cache.open("tmpl.zip", bucket).read("main.py") == b"v1"
+    assert os.path.exists(meta["path"])
+
+
+def test_archive_cache_max_open(bucket, tmp_path):
+    cache = ArchiveCache(str(tmp_path), max_bytes=1024 * 1024, max_open=1)
+    _put_zip(bucket, "a.zip", {"a.py": b"a"})
+    _put_zip(bucket, "b.zip", {"b.py": b"b"})
+
+    zip_a = cache.open("a.zip", bucket)
+    zip_b = cache.open("b.zip", bucket)
+
+    # Evicted from the opened archives, but still readable by whoever holds it
+    assert list(cache._opened) == [cache._read_meta("b.zip")["path"]]
+    assert zip_a.read("a.py") == b"a"
+    assert zip_b.read("b.py") == b"b"
@@ -0,0 +1,179 @@
+import asyncio
+import math
+import time
+
+from server.helpers.cache import TAG_KEY, Cache, CacheEntry, should_refresh
+
+
+def test_should_refresh():
+    entry = CacheEntry(value=1, delta=0.1, expires_at=100.0)
+
+    # Far from the expiration
+    assert not should_refresh(entry, now=50.0, rand=0.5)
+    # Expired
+    assert should_refresh(entry, now=100.0, rand=1.0)
+
+    # Right before the expiration, depending on the random number
+    assert should_refresh(entry, now=99.9, rand=0.01)
+    assert not should_refresh(entry, now=99.9, rand=0.99)
+
+    # Disabled
+    assert not should_refresh(entry, beta=0, now=99.99, rand=0.01)
+
+    # Never expires
+    assert not should_refresh(CacheEntry(value=1, delta=10, expires_at=math.inf), now=1e12, rand=1e-9)
+
+
+class _Controller:
+    course_id = 1
+    lesson_id = 2
+
+    def method(self, a, b=None):
+        pass
+
+
+def test_make_cache_key():
+    cache = Cache(instance_attr_names=["course_id", "lesson_id"])
+    ctrl = _Controller()
+
+    # Same arguments, same key. Instance attributes are considered.
+    spec = cache.make_key_spec(_Controller.method)
+    assert cache._build_key(spec, ctrl, 3) == cache._build_key(spec, ctrl, 3)
+    assert cache._build_key(spec, ctrl, 3) != cache._build_key(spec, ctrl, 4)
+    assert cache._build_key(spec, ctrl, 3).startswith(f"cache:{__name__}:_Controller.method:")
+
+    # Ignored arguments
+    spec = cache.make_key_spec(_Controller.method, ignore_args=["b"])
+    assert cache._build_key(spec, ctrl, 3, 5) == cache._build_key(spec, ctrl, 3, 6)
+
+    # Explicit key builder
+    spec = cache.make_key_spec(_Controller.method, key=lambda self, a, b=None: (a,))
+    assert cache._build_key(spec, ctrl, 3, 5) == f"cache:{__name__}:_Controller.method:1:2:3"
+
+
+def test_tag_ttl(cache_redis):
+    cache = Cache()
+
+    @cache.memoize(timeout=60, stale_ttl=30, tags=lambda result, a: [f"t:{a}"])
+    def func(a):
+        return a
+
+    # A tag lives at least as long as its entries
+    func(1)
+    entry_ttl = cache_redis.ttl(cache.make_cache_key(func, [], 1))
+    assert cache_redis.ttl(TAG_KEY.format(tag="t:1")) >= entry_ttl > 0
+
+    # Extended by a longer entry, but not shortened
+    cache.add_tags("k1", ["t:1"], 300)
+    cache.add_tags("k2", ["t:1"], 10)
+    assert cache_redis.ttl(TAG_KEY.format(tag="t:1")) > 90
+
+    # An entry without TTL keeps the tag forever
+    cache.add_tags("k3", ["t:1"])
+    cache.add_tags("k4", ["t:1"], 10)
+    assert cache_redis.ttl(TAG_KEY.format(tag="t:1")) == -1
+
+    assert cache.invalidate_tags("t:1") == 1
+    assert not cache_redis.exists(TAG_KEY.format(tag="t:1"))
+
+
+def test_memoize_lock_on_miss(cache_redis):
+    cache = Cache()
+    calls = []
+
+    @cache.memoize(timeout=60, lock_wait=0.3)
+    def func(a):
+        calls.append(a)
+        return a * 2
+
+    cache_key = cache.make_cache_key(func, [], 1)
+
+    # Another caller holds the lock of the missing entry. Synchronous callers do not wait for it.
+    cache_redis.set(f"{cache_key}:lock", "other")
+    start = time.monotonic()
+    assert func(1) == 2
+    assert time.monotonic() - start < 0.1
+    assert calls == [1]
+    assert cache_redis.get(f"{cache_key}:lock") == b"other"
+
+    # Without contention, the lock is released after computing
+    cache_redis.delete(cache_key, f"{cache_key}:lock")
+    assert func(1) == 2
+    assert not cache_redis.exists(f"{cache_key}:lock")
+
+
+def test_memoize_async_lock_on_miss(cache_redis):
+    cache = Cache()
+    calls = []
+
+    @cache.memoize(timeout=60, lock_wait=0.3)
+    async def func(a):
+        calls.append(a)
+        return a * 2
+
+    cache_key = cache.make_cache_key(func, [], 1)
+
+    async def main():
+        # Another caller holds the lock of the missing entry, and stores it meanwhile
+        cache_redis.set(f"{cache_key}:lock", "other")
+        asyncio.get_running_loop().call_later(0.05, lambda: cache._store(cache_key, "stored", 60, 0.0))
+        assert await func(1) == "stored"
+        assert calls == []
+
+        # The holder does not store it in time
+        cache_redis.delete(cache_key)
+        assert await func(1) == 2
+        assert calls == [1]
+
+    asyncio.run(main())
+
+
+def test_memoize_async(cache_redis):
+    cache = Cache()
+    calls = []
+
+    @cache.memoize(timeout=60, tags=lambda result, a: [f"t:{a}"])
+    async def func(a):
+        calls.append(a)
+        await asyncio.sleep(0.05)
+        return a * 2
+
+    async def main():
+        # Concurrent calls of the same key await one call
+        assert await asyncio.gather(func(1), func(1), func(1)) == [2, 2, 2]
+        assert calls == [1]
+
+        # A cancelled caller does not cancel the others
+        first, second = asyncio.ensure_future(func(2)), asyncio.ensure_future(func(2))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == 4
+        assert first.cancelled()
+        assert calls == [1, 2]
+
+        # Stored with its tag and without the lock
+        key = cache.make_cache_key(func, [], 2)
+        assert cache._load_entry(key).value == 4
+        assert cache_redis.ttl(TAG_KEY.format(tag="t:2")) > 0
+        assert not cache_redis.exists(f"{key}:lock")
+
+    asyncio.run(main())
+
+
+def test_memoize_sync_async_shared(cache_redis):
+    cache = Cache()
+
+    @cache.memoize(timeout=60)
+    async def func(a):
+        return a * 2
+
+    async def main():
+        # Stored by a sync caller, read by the coroutine function
+        cache._store(cache.make_cache_key(func, [], 1), "from sync", 60, 0.0)
+        assert await func(1) == "from sync"
+
+        # Stored by the coroutine function, read by a sync caller
+        assert await func(2) == 4
+        assert cache._load_entry(cache.make_cache_key(func, [], 2)).value == 4
+
+    asyncio.run(main())
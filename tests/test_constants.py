@@ -1,5 +1,6 @@
 from uuid import uuid4
 
+from constants.base import partial_format
 from constants.redis import RedisKey
 from constants.s3 import S3Key
 
@@ -23,26 +24,47 @@ def test_redis_key():
     ).format(course_id=course_id, lesson_id=lesson_id, hash=name)
 
     ptc_id = 99
-    assert redis_key.KEY_USER_CUR_SIZE.format(ptc_id=ptc_id) == (RedisKey.PREFIX + RedisKey.KEY_USER_CUR_SIZE).format(
-        course_id=course_id, lesson_id=lesson_id, ptc_id=ptc_id
-    )
+    assert redis_key.KEY_USER_CUR_SIZE.format(ptc_id=ptc_id) == (
+        RedisKey.USER_PREFIX + RedisKey.KEY_USER_CUR_SIZE
+    ).format(course_id=course_id, lesson_id=lesson_id, ptc_id=ptc_id)
 
     ptc_id = 1
     assert redis_key.KEY_USER_PREV_CURSOR.format(ptc_id=ptc_id) == (
-        RedisKey.PREFIX + RedisKey.KEY_USER_PREV_CURSOR
+        RedisKey.USER_PREFIX + RedisKey.KEY_USER_PREV_CURSOR
     ).format(course_id=course_id, lesson_id=lesson_id, ptc_id=ptc_id)
 
     ptc_id = 123
-    assert redis_key.KEY_USER_FILE_LIST.format(ptc_id=ptc_id) == (RedisKey.PREFIX + RedisKey.KEY_USER_FILE_LIST).format(
-        course_id=course_id, lesson_id=lesson_id, ptc_id=ptc_id
-    )
+    assert redis_key.KEY_USER_FILE_LIST.format(ptc_id=ptc_id) == (
+        RedisKey.USER_PREFIX + RedisKey.KEY_USER_FILE_LIST
+    ).format(course_id=course_id, lesson_id=lesson_id, ptc_id=ptc_id)
 
     ptc_id = 19
     name = rand_str()
     assert redis_key.KEY_USER_FILE_CONTENT.format(ptc_id=ptc_id, hash=name) == (
-        RedisKey.PREFIX + RedisKey.KEY_USER_FILE_CONTENT
+        RedisKey.USER_PREFIX + RedisKey.KEY_USER_FILE_CONTENT
     ).format(course_id=course_id, lesson_id=lesson_id, ptc_id=ptc_id, hash=name)
 
+    assert redis_key.KEY_USER_FILE_TYPE.format(ptc_id=ptc_id) == (
+        RedisKey.USER_PREFIX + RedisKey.KEY_USER_FILE_TYPE
+    ).format(course_id=course_id, lesson_id=lesson_id, ptc_id=ptc_id)
+
+
+def test_redis_key_hash_tag():
+    redis_key = RedisKey(123, 456)
+
+    # Lesson keys share a tag per lesson, and user keys per participant.
+    assert redis_key.KEY_LESSON_ROSTER == "{crs:123:456}:roster"
+    assert redis_key.KEY_TEMPLATE_FILE_CONTENT.format(hash="h") == "{crs:123:456}:template:files:h"
+    assert redis_key.KEY_LESSON_FEEDBACK_VIEWER.format(ptc_id=7) == "{crs:123:456}:feedback:viewer:7"
+    assert redis_key.KEY_USER_FILE_LIST.format(ptc_id=7) == "{crs:123:456:7}:files"
+    assert redis_key.KEY_USER_FILE_CONTENT.format(ptc_id=7, hash="h") == "{crs:123:456:7}:files:h"
+
+
+def test_partial_format():
+    assert partial_format("{{crs:{course_id}:{ptc_id}}}:{hash}", course_id=1) == "{{crs:1:{ptc_id}}}:{hash}"
+    assert partial_format("{{crs:{course_id}}}", course_id=1) == "{{crs:1}}"
+    assert partial_format("{a:>3}-{b}", a=1) == "  1-{b}"
+
 
 def test_s3_key():
     course_id = 123
@@ -1,4 +1,13 @@
-from server.utils.etc import get_hashed, text_decode, text_decode_list, text_encode
+from server.utils.etc import (
+    get_hashed,
+    is_binary,
+    key_decode,
+    key_encode,
+    text_decode,
+    text_decode_list,
+    text_encode,
+    utf8_trim,
+)
 
 
 def test_get_hashed():
@@ -28,3 +37,44 @@ def test_text_decode_list():
     expected = ["asdf", "한글", "한글asdf1234", "asdf", "asdf1234"]
 
     assert expected == text_decode_list(l)
+
+
+def test_key_encode():
+    assert key_encode("asdf") == "asdf"
+    assert key_encode("한글/asdf1234") == "한글/asdf1234"
+    assert key_encode("한글".encode()) == "한글"
+    assert key_encode(b"\xff.bin").encode("utf-8", "surrogateescape") == b"\xff.bin"
+    assert key_decode(key_encode("dir/file.py")) == "dir/file.py"
+
+    # Lexical order is preserved
+    names = ["b/c.py", "a/b.py", "a.py", "한글.py", "a/_", "B.py"]
+    assert sorted(key_encode(n).encode("utf-8", "surrogateescape") for n in names) == [
+        n.encode() for n in sorted(names)
+    ]
+
+
+def test_utf8_trim():
+    data = "a한글".encode()  # 1 + 3 + 3 bytes
+
+    assert utf8_trim(data) == data
+    assert utf8_trim(data[:6]) == "a한".encode()
+    assert utf8_trim(data[:5]) == "a한".encode()
+    assert utf8_trim(data[:4]) == "a한".encode()
+    assert utf8_trim(data[:2]) == b"a"
+    assert utf8_trim(b"") == b""
+    assert utf8_trim("😀".encode()[:3]) == b""
+    assert utf8_trim(b"\x80\x80\x80\x80") == b"\x80\x80\x80\x80"  # Not UTF-8
+
+
+def test_is_binary():
+    assert not is_binary(b"print('hello')\n")
+    assert not is_binary("한글".encode())
+    assert not is_binary("한글")
+    assert not is_binary(b"")
+    assert is_binary(b"\x89PNG\r\n\x1a\n")
+    assert is_binary(b"abc\x00def")
+    assert is_binary(b"\xff.bin".decode("utf-8", "surrogateescape"))
+
+    # Beginning of text, split in the middle of a sequence
+    assert is_binary("a한".encode()[:3])
+    assert not is_binary("a한".encode()[:3], partial=True)
@@ -0,0 +1,39 @@
+from configs import settings
+from constants.redis import RedisKey
+from server.controllers import file
+from server.controllers.file import RedisController, S3Controller
+from server.utils.etc import get_hashed, key_encode
+from tests.test_archive import _put_zip
+
+
+def test_extract_user_project(bucket, file_redis, monkeypatch):
+    monkeypatch.setattr(settings, "S3_BUCKET", bucket)
+    redis_key = RedisKey(1, 2)
+    s3_ctrl = S3Controller(1, 2, redis_key)
+    files = {"main.py": b"print(1)\n", "src/app.py": b"app = 1\n", "src/empty.txt": b""}
+    _put_zip(bucket, s3_ctrl.s3_key.KEY_USER_PROJECT.format(ptc_id=3), files)
+
+    s3_ctrl.extract_to_redis(ptc_id=3)
+
+    redis_ctrl = RedisController(redis_key=redis_key, r_=file_redis)
+    names = sorted(key_encode(name) for name in files)
+    assert sorted(name.decode() for name in redis_ctrl.get_file_list(ptc_id=3)) == names
+    index = file_redis.zrange(redis_key.KEY_USER_DIR_INDEX.format(ptc_id=3), 0, -1)
+    assert [name.decode() for name in index] == names
+    assert redis_ctrl.get_total_file_size(3) == sum(len(content) for content in files.values())
+    assert redis_ctrl.get_tree_revision(3) > 0
+
+
+def test_get_file_range(file_redis):
+    redis_key = RedisKey(1, 2)
+    redis_ctrl = RedisController(redis_key=redis_key, r_=file_redis)
+    hashed = get_hashed(key_encode("main.py"))
+    file_key, type_key = redis_ctrl._file_keys(hashed, 3)
+    file_redis.set(file_key, b"\xff\x00binary")
+    file_redis.hset(type_key, hashed, redis_key.FILE_TYPE_BINARY)
+
+    # The script is loaded by the first call, and run by its SHA after
+    for _ in range(2):
+        data, total, file_type = redis_ctrl.get_file_range("main.py", 0, 3, ptc_id=3)
+        assert (data, total, file_type) == (b"\xff\x00bi", 8, redis_key.FILE_TYPE_BINARY)
+    assert file_redis.script_exists(file._read_range.sha) == [True]
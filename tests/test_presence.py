@@ -0,0 +1,65 @@
+import asyncio
+
+from constants.ws import WSEvent
+from server.websockets import presence as presence_module
+from server.websockets.presence import PresenceAggregator
+
+
+class _Sio:
+    def __init__(self):
+        self.emitted = []
+
+    async def emit(self, event, data=None, room=None, **kwargs):
+        self.emitted.append((event, data, room, kwargs.get("uuid")))
+
+
+def _ptc(ptc_id: int, active: bool) -> dict:
+    return {"id": ptc_id, "nickname": f"user{ptc_id}", "active": active}
+
+
+def test_presence_coalesce(monkeypatch):
+    sio = _Sio()
+    monkeypatch.setattr(presence_module, "sio", sio)
+
+    async def main():
+        agg = PresenceAggregator(window=0.05, max_delay=1)
+
+        agg.push("room", prev_active=False, data=_ptc(1, True))
+        agg.push("room", prev_active=False, data=_ptc(2, True))
+        # Flapping network: back to the original status
+        agg.push("room", prev_active=True, data=_ptc(2, False))
+        # The timer restarts on every change
+        await asyncio.sleep(0.03)
+        agg.push("room", prev_active=True, data=_ptc(3, False))
+        await asyncio.sleep(0.03)
+        assert sio.emitted == []
+
+        await asyncio.sleep(0.05)
+
+    asyncio.run(main())
+
+    # Each participant in the previous shape of PARTICIPANT_STATUS
+    assert sio.emitted == [
+        (WSEvent.PARTICIPANT_STATUS, _ptc(1, True), "room", "ptc-1"),
+        (WSEvent.PARTICIPANT_STATUS, _ptc(3, False), "room", "ptc-3"),
+    ]
+
+
+def test_presence_max_delay(monkeypatch):
+    sio = _Sio()
+    monkeypatch.setattr(presence_module, "sio", sio)
+
+    async def main():
+        agg = PresenceAggregator(window=0.05, max_delay=0.1)
+
+        # Changes keep coming faster than the window
+        for i in range(8):
+            agg.push("room", prev_active=False, data=_ptc(i, True))
+            await asyncio.sleep(0.02)
+        assert sio.emitted
+
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+
+    assert sorted(data["id"] for _, data, _, _ in sio.emitted) == list(range(8))
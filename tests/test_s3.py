@@ -0,0 +1,52 @@
+import io
+
+import pytest
+from boto3.s3.transfer import TransferConfig
+from botocore.errorfactory import ClientError
+
+from server.helpers import s3
+
+
+def test_get_object_range(bucket):
+    s3.put_object(io.BytesIO(b"0123456789"), key="/range/file.txt", bucket=bucket)
+
+    content, obj = s3.read_object("range/file.txt", bucket, range=(2, 5))
+    assert content == b"2345"
+    assert obj["ContentRange"] == "bytes 2-5/10"
+
+    # The last byte position is clamped to the size
+    content, _ = s3.read_object("range/file.txt", bucket, range=(8, 100))
+    assert content == b"89"
+
+
+def test_get_object_if_none_match(bucket):
+    s3.put_object(io.BytesIO(b"content"), key="etag.txt", bucket=bucket)
+    etag = s3.get_object("etag.txt", bucket)["ETag"]
+
+    with pytest.raises(ClientError) as e:
+        s3.get_object("etag.txt", bucket, if_none_match=etag)
+    assert e.value.response["Error"]["Code"] == "304"
+
+    # Modified
+    s3.put_object(io.BytesIO(b"modified"), key="etag.txt", bucket=bucket)
+    assert s3.get_object("etag.txt", bucket, if_none_match=etag)["Body"].read() == b"modified"
+
+
+def test_upload_stream(bucket, monkeypatch):
+    # Multipart, as S3 requires parts of at least 5MB except the last one
+    chunksize = 5 * 1024 * 1024
+    monkeypatch.setattr(
+        s3, "_transfer_config", TransferConfig(multipart_threshold=chunksize, multipart_chunksize=chunksize)
+    )
+
+    body = io.BytesIO(b"x" * (2 * chunksize + 1))
+    body.seek(100)  # Uploaded from the start, regardless of the position
+    s3.upload_stream(body, key="stream.bin", bucket=bucket)
+
+    obj = s3.get_object("stream.bin", bucket)
+    assert obj["ContentLength"] == 2 * chunksize + 1
+    assert obj["ETag"].endswith('-3"')  # Uploaded in 3 parts
+
+    # A small object in a single request
+    s3.upload_stream(io.BytesIO(b"small"), key="small.bin", bucket=bucket)
+    assert s3.read_object("small.bin", bucket)[0] == b"small"
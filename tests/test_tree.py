@@ -0,0 +1,70 @@
+from server.utils.tree import build_tree, chunks, find_node, flatten, limit_depth
+
+
+def get_tree():
+    files = [
+        ("main.py", 10),
+        ("src/b.py", 20),
+        ("src/a.py", 30),
+        ("src/util/c.py", 40),
+        ("empty/_", 1),
+        ("README.md", 5),
+    ]
+    return build_tree(files, dir_mark="_")
+
+
+def test_build_tree():
+    tree = get_tree()
+
+    assert tree["size"] == 105
+    assert [child["name"] for child in tree["children"]] == ["empty", "src", "README.md", "main.py"]
+
+    empty = tree["children"][0]
+    assert empty == {"name": "empty", "type": "directory", "size": 0, "children": []}
+
+    src = tree["children"][1]
+    assert src["size"] == 90
+    assert [child["name"] for child in src["children"]] == ["util", "a.py", "b.py"]
+    assert src["children"][0]["children"] == [{"name": "c.py", "type": "file", "size": 40}]
+
+
+def test_find_node():
+    tree = get_tree()
+
+    assert find_node(tree, "") is tree
+    assert find_node(tree, "/src/util/")["size"] == 40
+    assert find_node(tree, "src/a.py")["type"] == "file"
+    assert find_node(tree, "src/a.py/x") is None
+    assert find_node(tree, "nothing") is None
+
+
+def test_limit_depth():
+    tree = get_tree()
+
+    root = limit_depth(tree, 1)
+    assert root["count"] == 4
+    assert root["children"][1]["children"] is None
+    assert root["children"][1]["count"] == 3
+
+    src = limit_depth(tree, 2)["children"][1]
+    assert src["children"][0]["children"] is None
+    assert src["children"][0]["count"] == 1
+
+    assert limit_depth(tree, 0)["children"] is None
+    assert limit_depth(tree)["children"][1]["children"][0]["children"][0]["name"] == "c.py"
+
+    # Original tree is not modified
+    assert tree["children"][1]["children"][0]["children"]
+
+
+def test_flatten():
+    src = find_node(get_tree(), "src")
+
+    assert [entry["path"] for entry in flatten(src, "src")] == ["src/util", "src/util/c.py", "src/a.py", "src/b.py"]
+    assert [entry["path"] for entry in flatten(limit_depth(src, 0), "src")] == []
+
+
+def test_chunks():
+    assert list(chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(chunks(range(4), 2)) == [[0, 1], [2, 3]]
+    assert list(chunks([], 2)) == [[]]